@@ -0,0 +1,202 @@
+"Parses every .dy file of a source tree across a pool of worker processes"
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional
+
+from lark import Lark, Tree
+from lark.exceptions import LarkError, UnexpectedInput
+
+from .parser import load_parser
+from .parse_cache import ParseCache
+from .profiling import FORMATS, get_profiling_parser, write_profile, output_path
+
+SOURCE_SUFFIX = ".dy"
+
+
+class ParseFailure():
+    "A parse error reduced to plain data so it can cross process boundaries"
+    kind : str
+    message : str
+    line : Optional[int]
+    column : Optional[int]
+
+    def __init__(self, kind:str, message:str, line:Optional[int], column:Optional[int])->None:
+        self.kind = kind
+        self.message = message
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def from_exception(cls, e:Exception)->"ParseFailure":
+        line = getattr(e, "line", None) if isinstance(e, UnexpectedInput) else None
+        column = getattr(e, "column", None) if isinstance(e, UnexpectedInput) else None
+        return cls(type(e).__name__, str(e), line, column)
+
+    def __str__(self):
+        where = f"{self.line}:{self.column}: " if self.line is not None else ""
+        return f"{where}{self.kind}: {self.message.splitlines()[0] if self.message else ''}"
+
+
+class FileResult():
+    path : str
+    seconds : float
+    tree : Optional[Tree]
+    error : Optional[ParseFailure]
+    # the tree came from the parse cache
+    cached : bool
+
+    def __init__(self, path:str, seconds:float, tree:Optional[Tree], error:Optional[ParseFailure],
+            cached:bool=False)->None:
+        self.path = path
+        self.seconds = seconds
+        self.tree = tree
+        self.error = error
+        self.cached = cached
+
+    @property
+    def ok(self)->bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else "error"
+        return f"FileResult({self.path}, {status}, seconds={self.seconds:.4f})"
+
+
+class BatchSummary():
+    files : int
+    failed : int
+    cached : int
+    seconds : float
+    slowest : List[FileResult]
+
+    def __init__(self, results:List[FileResult], seconds:float, slowest:int=5)->None:
+        self.files = len(results)
+        self.failed = sum(1 for result in results if not result.ok)
+        self.cached = sum(1 for result in results if result.cached)
+        self.seconds = seconds
+        self.slowest = sorted(results, key=lambda result: result.seconds, reverse=True)[:slowest]
+
+    @property
+    def files_per_second(self)->float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"{self.files} files ({self.failed} failed, {self.cached} cached) in {self.seconds:.2f} s, {self.files_per_second:.1f} files/s"]
+        if self.slowest:
+            lines.append("slowest:")
+            lines.extend(f"  {result.seconds*1000:9.2f} ms  {result.path}" for result in self.slowest)
+        return "\n".join(lines)
+
+
+def find_sources(root:str)->List[str]:
+    "Every .dy file under `root`, in a stable order"
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        found.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith(SOURCE_SUFFIX))
+    return found
+
+
+# the parser of the current worker process, built once by `_init_worker`
+_parser : Optional[Lark] = None
+_keep_trees = True
+_tree_cache : Optional[ParseCache] = None
+
+
+def _init_worker(cache_dir:Optional[str], keep_trees:bool, tree_cache:bool=False)->None:
+    global _parser, _keep_trees, _tree_cache
+    _parser, _ = load_parser(cache_dir=cache_dir)
+    _keep_trees = keep_trees
+    _tree_cache = ParseCache(cache_dir) if tree_cache else None
+
+
+def parse_file(path:str, parser:Optional[Lark]=None, keep_tree:Optional[bool]=None)->FileResult:
+    "Parses one file, by default with the parser of the current worker"
+    if parser is None:
+        if _parser is None:
+            _init_worker(None, True)
+        parser = _parser
+    if keep_tree is None:
+        keep_tree = _keep_trees
+    assert parser is not None
+    # the worker's parse cache only when it parses with the worker's parser
+    cache = _tree_cache if parser is _parser else None
+    start = time.perf_counter()
+    cached = False
+    try:
+        with open(path, encoding="utf8") as f:
+            text = f.read()
+        if cache is not None:
+            hits = cache.stats.hits
+            tree = cache.parse(text)
+            cached = cache.stats.hits > hits
+        else:
+            tree = parser.parse(text)
+        error = None
+    except (LarkError, OSError, UnicodeDecodeError) as e:
+        tree = None
+        error = ParseFailure.from_exception(e)
+    seconds = time.perf_counter() - start
+    return FileResult(path, seconds, tree if keep_tree else None, error, cached)
+
+
+def parse_tree(root:str, workers:Optional[int]=None, cache_dir:Optional[str]=None,
+        keep_trees:bool=True, tree_cache:bool=False)->Iterator[FileResult]:
+    """Parses the sources under `root` and yields their results in completion order.
+
+    Each worker loads the parser once (from the table cache when possible)
+    and reuses it for all the files it gets. With `tree_cache` unchanged
+    files are loaded from the `ParseCache` of `cache_dir` instead."""
+    paths = find_sources(root)
+    if not paths:
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+            initargs=(cache_dir, keep_trees, tree_cache)) as pool:
+        # warm the table cache in this process, so workers only load it
+        load_parser(cache_dir=cache_dir)
+        futures = [pool.submit(parse_file, path) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv:List[str])->None:
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.batch", description=__doc__)
+    arg_parser.add_argument("root", help="directory (or file) with the .dy sources")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, default one per core")
+    arg_parser.add_argument("--slowest", type=int, default=5, help="number of slowest files to report")
+    arg_parser.add_argument("--cache-dir", default=None, help="parse table cache directory")
+    arg_parser.add_argument("--tree-cache", action="store_true", help="reuse the trees of unchanged files")
+    arg_parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    arg_parser.add_argument("--profile", choices=FORMATS, default=None,
+        help="write the phase profile of each file that parsed, see `profiling`")
+    arg_parser.add_argument("--profile-dir", default=None, help="where the profiles go, default next to the files")
+    args = arg_parser.parse_args(argv[1:])
+
+    start = time.perf_counter()
+    results = []
+    for result in parse_tree(args.root, args.jobs, args.cache_dir, keep_trees=False, tree_cache=args.tree_cache):
+        results.append(result)
+        if not args.quiet or not result.ok:
+            print(f"{result.path}: {'ok' if result.ok else result.error}")
+    summary = BatchSummary(results, time.perf_counter() - start, args.slowest)
+    print(summary)
+    if args.profile is not None:
+        # in this process, one file after the other, so the timings don't compete
+        parser = get_profiling_parser(cache_dir=args.cache_dir)
+        if args.profile_dir is not None:
+            os.makedirs(args.profile_dir, exist_ok=True)
+        for result in results:
+            if result.ok:
+                write_profile(result.path, output_path(result.path, args.profile, args.profile_dir), args.profile, parser)
+    if summary.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
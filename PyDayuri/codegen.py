@@ -0,0 +1,737 @@
+"""Backend lowering a module to Python `ast` and compiling it to a code object.
+
+Every function becomes a `def` of its parameters trying its clauses in
+order, a clause being an `if` over the tags of the parameters (see
+`runtime` for the values). Expressions are lowered to statements followed
+by an expression: `let` bindings become assignments and `match` an
+`if`/`elif` chain, so each is only evaluated where the source evaluates it.
+Calls to the function itself in tail position reassign the parameters and
+loop, so they don't grow the Python stack.
+
+Dayuri names are given a prefix for their kind (`f_` functions, `c_`
+constructors, `u_` curried functions, `v_` variables), which keeps them
+apart from each other, from Python keywords and from the helpers of
+`runtime` the module is run with.
+
+With `peano` (the default) the Peano shaped types of `peano` are ints and
+the functions recognised as their addition and multiplication are `+` and
+`*`. With `decision_trees` (the default) clauses and match cases are
+compiled by `decision` to nested `if`s that look at each position once,
+falling back to trying them in order when the tree would copy too many
+bodies. With `hash_consing` constructor values are built through the
+`HashCons` of `sharing` the module is run with. `CompiledModule` can
+memoize chosen functions, see `sharing`.
+
+`load_file` caches the marshalled code object next to the source
+(`Nat.dy` -> `Nat.dyc`), keyed by the hash of the source, the options, the
+grammar and the Python version, so running a program again skips parsing
+and code generation."""
+
+import os
+import sys
+import ast
+import time
+import marshal
+import hashlib
+import argparse
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from lark import Lark
+
+from .syntax import (Module, Path, PatternHole, PatternList, PatternTuple, PatternGroup,
+    PatternApplication, PatternBind, Number, ExpTuple, ExpGroup, ExpList, Annotated, Let,
+    Match, Application, application_spine, get_syntax_parser)
+from .parser import read_grammar, _atomic_write
+from .runtime import MatchError, ProgramError, Program, curry, apply, nat, nat_value
+from .peano import Peano, ADD
+from .sharing import HashCons, Memo
+from .decision import (MatchCompiler, Node, Leaf, Fail, Switch, Head, Occurrence, PREDECESSOR,
+    TUPLE, LIST, ZERO, SUCCESSOR, within_limit)
+
+CODEGEN_VERSION = 4
+MAGIC = b"DYC\x00"
+CACHE_SUFFIX = "c"
+
+FUNCTION = "f_"
+CONSTRUCTOR = "c_"
+CURRIED = "u_"
+VARIABLE = "v_"
+# table of the functions of a module, `name: (function, arity)`
+EXPORTS = "__dayuri__"
+# set by modules building their values with `cons`
+HASH_CONSING = "__hash_consing__"
+
+# a pattern subject, a variable and the indexes (or PREDECESSOR) into it
+Subject = Tuple[str, Tuple[Union[int, str], ...]]
+Scope = Dict[str, str]
+
+
+def _load(name:str)->ast.Name:
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _store(name:str)->ast.Name:
+    return ast.Name(id=name, ctx=ast.Store())
+
+
+def _assign(name:str, value:ast.expr)->ast.stmt:
+    return ast.Assign(targets=[_store(name)], value=value)
+
+
+def _call(function:ast.expr, args:List[ast.expr])->ast.Call:
+    return ast.Call(func=function, args=args, keywords=[])
+
+
+def _access(subject:Subject)->ast.expr:
+    name, steps = subject
+    node : ast.expr = _load(name)
+    predecessors = 0
+    for step in steps:
+        if step == PREDECESSOR:
+            predecessors += 1
+        else:
+            node = ast.Subscript(value=node, slice=ast.Constant(step), ctx=ast.Load())
+    if predecessors:
+        node = ast.BinOp(left=node, op=ast.Sub(), right=ast.Constant(predecessors))
+    return node
+
+
+def _successor(value:ast.expr)->ast.expr:
+    "`value + 1`, folded into an addition of a constant"
+    if type(value) is ast.BinOp and type(value.op) is ast.Add and type(value.right) is ast.Constant:
+        return ast.BinOp(left=value.left, op=ast.Add(), right=ast.Constant(value.right.value + 1))
+    return ast.BinOp(left=value, op=ast.Add(), right=ast.Constant(1))
+
+
+def _number(subject:Subject)->Tuple[ast.expr, int]:
+    "A Peano number and how many predecessors of it `subject` is"
+    variable, steps = subject
+    depth = 0
+    while depth < len(steps) and steps[len(steps) - 1 - depth] == PREDECESSOR:
+        depth += 1
+    return _access((variable, steps[:len(steps) - depth])), depth
+
+
+def _arithmetic(operation:str, left:ast.expr, right:ast.expr)->ast.expr:
+    return ast.BinOp(left=left, op=ast.Add() if operation == ADD else ast.Mult(), right=right)
+
+
+def _raise(description:str)->ast.stmt:
+    return ast.Raise(exc=_call(_load("MatchError"), [ast.Constant(description)]), cause=None)
+
+
+def _all(tests:List[ast.expr])->ast.expr:
+    if len(tests) == 1:
+        return tests[0]
+    return ast.BoolOp(op=ast.And(), values=tests)
+
+
+def _at(node:Any, line:int)->Any:
+    node.lineno = node.end_lineno = line
+    node.col_offset = node.end_col_offset = 0
+    return node
+
+
+def _function_def(name:str, parameters:List[str], body:List[ast.stmt])->ast.FunctionDef:
+    fields : Dict[str, Any] = {}
+    if sys.version_info >= (3, 12):
+        fields["type_params"] = []
+    return ast.FunctionDef(name=name,
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=p) for p in parameters],
+            kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=body, decorator_list=[], returns=None, **fields)
+
+
+class _FunctionCompiler():
+    "Lowers the clauses of one function"
+    program : Program
+    peano : Optional[Peano]
+    # compiles clauses to decision trees, None to try them in order
+    matcher : Optional[MatchCompiler]
+    name : str
+    arity : int
+    parameters : List[str]
+    hash_consing : bool
+    # whether a tail call to the function itself was made a loop
+    loops : bool
+
+    def __init__(self, program:Program, name:str, peano:Optional[Peano]=None,
+            matcher:Optional[MatchCompiler]=None, hash_consing:bool=False)->None:
+        self.program = program
+        self.peano = peano
+        self.matcher = matcher
+        self.hash_consing = hash_consing
+        self.name = name
+        self.arity = program.arities[name]
+        self.parameters = [f"_p{i}" for i in range(self.arity)]
+        self.loops = False
+        self._used : Dict[str, int] = {}
+        self._temporaries = 0
+
+    def variable(self, name:str)->str:
+        "A Python name for a new binding of `name`, shadowing never reuses one"
+        count = self._used.get(name, 0)
+        self._used[name] = count + 1
+        return VARIABLE + name if count == 0 else f"{VARIABLE}{name}_{count}"
+
+    def temporary(self)->str:
+        self._temporaries += 1
+        return f"_t{self._temporaries}"
+
+    def function(self)->ast.FunctionDef:
+        body : List[ast.stmt] = []
+        line = self.program.functions[self.name][0].name.line
+        operation = self.peano.arithmetic.get(self.name) if self.peano is not None else None
+        if operation is not None:
+            body.append(_at(ast.Return(value=_arithmetic(operation, *map(_load, self.parameters))), line))
+            return _at(_function_def(FUNCTION + self.name, self.parameters, body), line)
+        clauses = self.program.functions[self.name]
+        tree = self.tree([clause.parameters for clause in clauses])
+        if tree is not None:
+
+            def leaf(action:int, scope:Scope)->List[ast.stmt]:
+                line = clauses[action].name.line
+                return [_at(statement, line) for statement in self.tail(clauses[action].body, scope)]
+
+            body = self.decision(tree, self.parameters, leaf, {}, self.name)
+        else:
+            body = self.in_order(clauses)
+        if self.loops:
+            body = [_at(ast.While(test=ast.Constant(True), body=body, orelse=[]), line)]
+        return _at(_function_def(FUNCTION + self.name, self.parameters, body), line)
+
+    def in_order(self, clauses:List[Any])->List[ast.stmt]:
+        "Tries the clauses one after the other"
+        body : List[ast.stmt] = []
+        for clause in clauses:
+            tests : List[ast.expr] = []
+            binds : List[ast.stmt] = []
+            scope : Scope = {}
+            for parameter, pattern in zip(self.parameters, clause.parameters):
+                self.pattern(pattern, (parameter, ()), tests, binds, scope)
+            statements = binds + self.tail(clause.body, scope)
+            line = clause.name.line
+            if not tests:
+                body.extend(_at(statement, line) for statement in statements)
+                return body
+            body.append(_at(ast.If(test=_all(tests), body=statements, orelse=[]), line))
+        body.append(_at(_raise(self.name), line))
+        return body
+
+    def tree(self, clauses:List[Any])->Optional[Node]:
+        "The decision tree of the patterns of `clauses`, None to try them in order"
+        if self.matcher is None:
+            return None
+        tree = self.matcher.compile(clauses)
+        return tree if within_limit(tree, len(clauses)) else None
+
+    def decision(self, node:Node, roots:List[str], leaf:Callable[[int, Scope], List[ast.stmt]],
+            scope:Scope, description:str)->List[ast.stmt]:
+        "The statements of a decision tree over the values in `roots`, `leaf` lowers the clause bodies"
+        kind = type(node)
+        if kind is Leaf:
+            scope = dict(scope)
+            statements = []
+            for name, occurrence in node.bindings:
+                scope[name] = variable = self.variable(name)
+                statements.append(_assign(variable, _access(self._subject(occurrence, roots))))
+            return statements + leaf(node.action, scope)
+        if kind is Fail:
+            return [_raise(description)]
+        assert kind is Switch
+        cases = node.cases
+        subject = self._subject(node.occurrence, roots)
+        first = cases[0][0]
+        if first.kind == TUPLE:
+            # tuples have one shape, their type was checked
+            return self.decision(cases[0][1], roots, leaf, scope, description)
+        statements : List[ast.stmt] = []
+        if first.kind == ZERO or first.kind == SUCCESSOR:
+            tested, depth = _number(subject)
+        elif first.kind == LIST:
+            tested, depth = _call(_load("len"), [_access(subject)]), 0
+        else:
+            variable, steps = subject
+            tested, depth = _access((variable, steps + (0,))), 0
+        tests = len(cases) - (node.default is None)
+        if tests > 1 and type(tested) is not ast.Name:
+            # the tag is read once, whatever the number of cases
+            temporary = self.temporary()
+            statements.append(_assign(temporary, tested))
+            tested = _load(temporary)
+        chain = statements
+        for i, (head, child) in enumerate(cases):
+            body = self.decision(child, roots, leaf, scope, description)
+            if i == tests:
+                # every other head was tested, this one needs no test
+                chain.extend(body)
+                break
+            test = ast.Compare(left=tested, ops=[ast.Gt() if head.kind == SUCCESSOR else ast.Eq()],
+                comparators=[ast.Constant(depth if head.kind in (ZERO, SUCCESSOR) else
+                    len(head.steps) if head.kind == LIST else head.name)])
+            branch = ast.If(test=test, body=body, orelse=[])
+            chain.append(branch)
+            chain = branch.orelse
+        else:
+            assert node.default is not None
+            chain.extend(self.decision(node.default, roots, leaf, scope, description))
+        return statements
+
+    def _subject(self, occurrence:Occurrence, roots:List[str])->Subject:
+        return (roots[occurrence[0]], occurrence[1:])
+
+    def pattern(self, pattern:Any, subject:Subject, tests:List[ast.expr], binds:List[ast.stmt], scope:Scope)->None:
+        "Adds the tests `subject` must pass to match `pattern` and the bindings it makes"
+        kind = type(pattern)
+        if kind is Path:
+            name = pattern.name
+            if name in self.program.constructors:
+                self._tag(name, subject, tests)
+            else:
+                scope[name] = variable = self.variable(name)
+                binds.append(_assign(variable, _access(subject)))
+        elif kind is PatternApplication:
+            name = pattern.head.name
+            self._tag(name, subject, tests)
+            variable, indexes = subject
+            if self.peano is not None and name in self.peano.successors:
+                self.pattern(pattern.args[0], (variable, indexes + (PREDECESSOR,)), tests, binds, scope)
+                return
+            for i, argument in enumerate(pattern.args, 1):
+                self.pattern(argument, (variable, indexes + (i,)), tests, binds, scope)
+        elif kind is PatternGroup:
+            self.pattern(pattern.pattern, subject, tests, binds, scope)
+        elif kind is PatternTuple or kind is PatternList:
+            if kind is PatternList:
+                tests.append(ast.Compare(left=_call(_load("len"), [_access(subject)]),
+                    ops=[ast.Eq()], comparators=[ast.Constant(len(pattern.items))]))
+            variable, indexes = subject
+            for i, item in enumerate(pattern.items):
+                self.pattern(item, (variable, indexes + (i,)), tests, binds, scope)
+        elif kind is PatternBind:
+            name = pattern.name.name
+            scope[name] = variable = self.variable(name)
+            binds.append(_assign(variable, _access(subject)))
+            self.pattern(pattern.pattern, subject, tests, binds, scope)
+        elif kind is not PatternHole:
+            raise ProgramError(f"unknown pattern {pattern!r}")
+
+    def _tag(self, name:str, subject:Subject, tests:List[ast.expr])->None:
+        variable, indexes = subject
+        peano = self.peano
+        if peano is not None and (name in peano.zeros or name in peano.successors):
+            # `S (S n)` tests `v > 1` and not `v > 0 and v - 1 > 0`
+            number, depth = _number(subject)
+            tests.append(ast.Compare(left=number, ops=[ast.Eq() if name in peano.zeros else ast.Gt()],
+                comparators=[ast.Constant(depth)]))
+            return
+        tests.append(ast.Compare(left=_access((variable, indexes + (0,))),
+            ops=[ast.Eq()], comparators=[ast.Constant(name)]))
+
+    def tail(self, exp:Any, scope:Scope)->List[ast.stmt]:
+        "Statements returning the value of `exp`"
+        kind = type(exp)
+        if kind is ExpGroup or kind is Annotated:
+            return self.tail(exp.exp, scope)
+        if kind is Let:
+            statements, scope = self.let(exp, scope)
+            return statements + self.tail(exp.body, scope)
+        if kind is Match:
+            return self.match(exp, scope, self.tail)
+        if kind is Application and self.arity > 0:
+            head, args = application_spine(exp)
+            if type(head) is Path and head.name == self.name and head.name not in scope and len(args) == self.arity:
+                statements, values = self.expressions(args, scope)
+                self.loops = True
+                if self.arity == 1:
+                    statements.append(_assign(self.parameters[0], values[0]))
+                else:
+                    statements.append(ast.Assign(
+                        targets=[ast.Tuple(elts=[_store(p) for p in self.parameters], ctx=ast.Store())],
+                        value=ast.Tuple(elts=values, ctx=ast.Load())))
+                statements.append(ast.Continue())
+                return statements
+        statements, value = self.expression(exp, scope)
+        statements.append(ast.Return(value=value))
+        return statements
+
+    def expression(self, exp:Any, scope:Scope)->Tuple[List[ast.stmt], ast.expr]:
+        "The statements to run before the value of `exp` and the value"
+        kind = type(exp)
+        if kind is Path:
+            return [], self.path(exp, scope)
+        if kind is Application:
+            return self.application(exp, scope)
+        if kind is Number:
+            return [], ast.Constant(exp.value)
+        if kind is ExpGroup or kind is Annotated:
+            return self.expression(exp.exp, scope)
+        if kind is ExpTuple:
+            statements, values = self.expressions(exp.items, scope)
+            return statements, ast.Tuple(elts=values, ctx=ast.Load())
+        if kind is ExpList:
+            statements, values = self.expressions(exp.items, scope)
+            return statements, ast.List(elts=values, ctx=ast.Load())
+        if kind is Let:
+            statements, scope = self.let(exp, scope)
+            body_statements, value = self.expression(exp.body, scope)
+            return statements + body_statements, value
+        if kind is Match:
+            result = self.temporary()
+
+            def branch(body:Any, scope:Scope)->List[ast.stmt]:
+                statements, value = self.expression(body, scope)
+                statements.append(_assign(result, value))
+                return statements
+
+            return self.match(exp, scope, branch), _load(result)
+        raise ProgramError(f"unknown expression {exp!r}")
+
+    def expressions(self, exps:Any, scope:Scope)->Tuple[List[ast.stmt], List[ast.expr]]:
+        statements : List[ast.stmt] = []
+        values = []
+        for exp in exps:
+            before, value = self.expression(exp, scope)
+            statements.extend(before)
+            values.append(value)
+        return statements, values
+
+    def path(self, path:Path, scope:Scope)->ast.expr:
+        name = path.name
+        variable = scope.get(name)
+        if variable is not None:
+            return _load(variable)
+        if name in self.program.constructors:
+            if self.peano is not None and name in self.peano.zeros:
+                return ast.Constant(0)
+            # the value of a nullary constructor, the constructor function otherwise
+            return _load(CONSTRUCTOR + name)
+        arity = self.program.arities.get(name)
+        if arity is None:
+            token = path.parts[0]
+            raise ProgramError(f"{token.line}:{token.column}: unknown name `{name}`")
+        if arity == 0:
+            return _call(_load(FUNCTION + name), [])
+        return _load(CURRIED + name)
+
+    def application(self, exp:Application, scope:Scope)->Tuple[List[ast.stmt], ast.expr]:
+        head, args = application_spine(exp)
+        statements, values = self.expressions(args, scope)
+        if type(head) is Path and head.name not in scope:
+            name = head.name
+            peano = self.peano
+            if peano is not None:
+                if name in peano.successors and len(values) == 1:
+                    return statements, _successor(values[0])
+                operation = peano.arithmetic.get(name)
+                if operation is not None and len(values) >= 2:
+                    return statements, _apply(_arithmetic(operation, values[0], values[1]), values[2:])
+            if self.program.constructors.get(name) == len(values):
+                return statements, _constructor(name, values, self.hash_consing)
+            arity = self.program.arities.get(name, 0)
+            if 0 < arity <= len(values):
+                call = _call(_load(FUNCTION + name), values[:arity])
+                return statements, _apply(call, values[arity:])
+        head_statements, function = self.expression(head, scope)
+        return head_statements + statements, _apply(function, values)
+
+    def let(self, exp:Let, scope:Scope)->Tuple[List[ast.stmt], Scope]:
+        statements : List[ast.stmt] = []
+        scope = dict(scope)
+        for binding in exp.bindings:
+            before, value = self.expression(binding.value, scope)
+            statements.extend(before)
+            pattern = binding.pattern
+            while type(pattern) is PatternGroup:
+                pattern = pattern.pattern
+            if type(pattern) is Path and pattern.name not in self.program.constructors:
+                # a plain variable, the common case
+                variable = self.variable(pattern.name)
+                statements.append(_assign(variable, value))
+                scope[pattern.name] = variable
+                continue
+            if type(value) is ast.Name:
+                subject = value.id
+            else:
+                subject = self.temporary()
+                statements.append(_assign(subject, value))
+            tests : List[ast.expr] = []
+            binds : List[ast.stmt] = []
+            self.pattern(pattern, (subject, ()), tests, binds, scope)
+            if tests:
+                statements.append(ast.If(test=ast.UnaryOp(op=ast.Not(), operand=_all(tests)),
+                    body=[_raise(f"let in {self.name}")], orelse=[]))
+            statements.extend(binds)
+        return statements, scope
+
+    def match(self, exp:Match, scope:Scope, branch:Callable[[Any, Scope], List[ast.stmt]])->List[ast.stmt]:
+        "The `if` chain over the cases of `exp`, `branch` lowers their bodies"
+        statements, value = self.expression(exp.scrutinee, scope)
+        if type(value) is ast.Name:
+            subject = value.id
+        else:
+            subject = self.temporary()
+            statements.append(_assign(subject, value))
+        description = f"match in {self.name}"
+        tree = self.tree([[case.pattern] for case in exp.cases])
+        if tree is not None:
+            leaf = lambda action, scope: branch(exp.cases[action].body, scope)
+            return statements + self.decision(tree, [subject], leaf, scope, description)
+        chain : List[ast.stmt] = []
+        # where the next case goes, the `else` of the previous one
+        tail = chain
+        for case in exp.cases:
+            tests : List[ast.expr] = []
+            binds : List[ast.stmt] = []
+            case_scope = dict(scope)
+            self.pattern(case.pattern, (subject, ()), tests, binds, case_scope)
+            body = binds + branch(case.body, case_scope)
+            if not tests:
+                tail.extend(body)
+                break
+            node = ast.If(test=_all(tests), body=body, orelse=[])
+            tail.append(node)
+            tail = node.orelse
+        else:
+            tail.append(_raise(description))
+        return statements + chain
+
+
+def _apply(function:ast.expr, values:List[ast.expr])->ast.expr:
+    if not values:
+        return function
+    if len(values) == 1:
+        return _call(function, values)
+    return _call(_load("apply"), [function] + values)
+
+
+def _constructor(name:str, values:List[ast.expr], hash_consing:bool)->ast.expr:
+    value = ast.Tuple(elts=[ast.Constant(name)] + values, ctx=ast.Load())
+    return _call(_load("cons"), [value]) if hash_consing else value
+
+
+def lower(module:Module, peano:bool=True, decision_trees:bool=True, hash_consing:bool=False)->ast.Module:
+    "The Python module of a Dayuri module"
+    program = Program(module)
+    numbers = Peano(program) if peano else None
+    matcher = MatchCompiler(program, numbers) if decision_trees else None
+    body : List[ast.stmt] = []
+    if hash_consing:
+        body.append(_assign(HASH_CONSING, ast.Constant(True)))
+    for name, arity in program.constructors.items():
+        if numbers is not None and name in numbers.zeros:
+            body.append(_assign(CONSTRUCTOR + name, ast.Constant(0)))
+            continue
+        if numbers is not None and name in numbers.successors:
+            body.append(_function_def(CONSTRUCTOR + name, ["_p0"], [ast.Return(value=_successor(_load("_p0")))]))
+            continue
+        if arity == 0:
+            body.append(_assign(CONSTRUCTOR + name, _constructor(name, [], hash_consing)))
+            continue
+        parameters = [f"_p{i}" for i in range(arity)]
+        value = _constructor(name, [_load(p) for p in parameters], hash_consing)
+        body.append(_function_def(CONSTRUCTOR + name, parameters, [ast.Return(value=value)]))
+        if arity > 1:
+            body.append(_assign(CONSTRUCTOR + name, _call(_load("curry"),
+                [_load(CONSTRUCTOR + name), ast.Constant(arity)])))
+    for node in body:
+        _at(node, 1)
+    exports_keys : List[Optional[ast.expr]] = []
+    exports_values : List[ast.expr] = []
+    for name in program.functions:
+        compiler = _FunctionCompiler(program, name, numbers, matcher, hash_consing)
+        function = compiler.function()
+        body.append(function)
+        if compiler.arity == 1:
+            body.append(_at(_assign(CURRIED + name, _load(function.name)), function.lineno))
+        elif compiler.arity > 1:
+            body.append(_at(_assign(CURRIED + name, _call(_load("curry"),
+                [_load(function.name), ast.Constant(compiler.arity)])), function.lineno))
+        exports_keys.append(ast.Constant(name))
+        exports_values.append(ast.Tuple(elts=[_load(function.name), ast.Constant(compiler.arity)], ctx=ast.Load()))
+    body.append(_at(_assign(EXPORTS, ast.Dict(keys=exports_keys, values=exports_values)), 1))
+    return ast.fix_missing_locations(ast.Module(body=body, type_ignores=[]))
+
+
+def compile_module(module:Module, filename:str="<dayuri>", **options)->CodeType:
+    "The code of `module`, `options` are those of `lower`"
+    return compile(lower(module, **options), filename, "exec")
+
+
+def compile_source(text:str, filename:str="<dayuri>", parser:Optional[Lark]=None, **options)->CodeType:
+    if parser is None:
+        parser = get_syntax_parser()
+    return compile_module(parser.parse(text), filename, **options)
+
+
+class CompiledModule():
+    """A compiled module run in its own namespace, the functions named in
+    `memoize` remember their last `cache_size` calls (a call of a function
+    to itself in tail position is a loop and doesn't look at the table)"""
+    filename : str
+    namespace : Dict[str, Any]
+    functions : Dict[str, Tuple[Callable[..., Any], int]]
+    # whether the code came from the cache
+    cached : bool
+    # the table of the constructor values if the code was lowered with `hash_consing`
+    values : Optional[HashCons]
+    memos : Dict[str, Memo]
+
+    def __init__(self, code:CodeType, filename:str="<dayuri>", cached:bool=False,
+            memoize:Sequence[str]=(), cache_size:int=1024)->None:
+        self.filename = filename
+        self.cached = cached
+        values = HashCons()
+        self.namespace = {"__name__": filename, "__builtins__": __builtins__,
+            "MatchError": MatchError, "apply": apply, "curry": curry, "cons": values.cons}
+        exec(code, self.namespace)
+        self.values = values if self.namespace.get(HASH_CONSING) else None
+        self.functions = dict(self.namespace[EXPORTS])
+        self.memos = {}
+        for name in memoize:
+            function, arity = self.functions[name]
+            memo = self.memos[name] = Memo(function, cache_size)
+            # calls between functions look the name up when they run
+            self.namespace[FUNCTION + name] = memo
+            self.namespace[CURRIED + name] = memo if arity == 1 else curry(memo, arity)
+            self.functions[name] = (memo, arity)
+
+    def intern(self, value:Any)->Any:
+        "`value` built like those of the module"
+        return self.values.intern(value) if self.values is not None else value
+
+    def constructor(self, name:str, *args:Any)->Any:
+        value = self.namespace[CONSTRUCTOR + name]
+        return apply(value, *args) if args else value
+
+    def call(self, name:str, *args:Any)->Any:
+        """The value of function `name` applied to `args`, deep recursion
+        needs a higher `sys.setrecursionlimit`"""
+        function, arity = self.functions[name]
+        if self.values is not None:
+            args = tuple([self.values.intern(arg) for arg in args])
+        if len(args) == arity:
+            return function(*args)
+        if arity == 0:
+            return apply(function(), *args)
+        return apply(self.namespace[CURRIED + name], *args)
+
+
+def load_source(text:str, filename:str="<dayuri>", parser:Optional[Lark]=None, **options)->CompiledModule:
+    return CompiledModule(compile_source(text, filename, parser, **options), filename)
+
+
+def source_key(text:str, options:Optional[Dict[str, Any]]=None)->bytes:
+    "What the code of `text` depends on, the code generator and grammar included"
+    h = hashlib.sha256(MAGIC)
+    h.update(f"{CODEGEN_VERSION}\0{sys.implementation.cache_tag}\0".encode("ascii"))
+    h.update(repr(sorted((options or {}).items())).encode("utf8"))
+    h.update(read_grammar().encode("utf8"))
+    h.update(b"\0")
+    h.update(text.encode("utf8", "surrogatepass"))
+    return h.digest()
+
+
+def cache_path(path:str)->str:
+    return path + CACHE_SUFFIX
+
+
+def read_cached(path:str, key:bytes)->Optional[CodeType]:
+    "The code cached at `path` if it was compiled from the source of `key`"
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = len(MAGIC) + len(key)
+    if data[:len(MAGIC)] != MAGIC or data[len(MAGIC):header] != key:
+        return None
+    try:
+        code = marshal.loads(data[header:])
+    except (ValueError, TypeError, EOFError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def load_file(path:str, parser:Optional[Lark]=None, use_cache:bool=True, **options)->CompiledModule:
+    """The compiled module of the file at `path`, from its cache file when
+    the source (and `options`) didn't change"""
+    with open(path, encoding="utf8") as f:
+        text = f.read()
+    if not use_cache:
+        return load_source(text, path, parser, **options)
+    key = source_key(text, options)
+    code = read_cached(cache_path(path), key)
+    if code is not None:
+        return CompiledModule(code, path, cached=True)
+    code = compile_source(text, path, parser, **options)
+    try:
+        _atomic_write(cache_path(path), MAGIC + key + marshal.dumps(code))
+    except OSError:
+        # a read only directory must not stop us from running
+        pass
+    return CompiledModule(code, path)
+
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples", "Nat.dy")
+
+
+def main(argv:List[str])->None:
+    """Times `add` and `mul` of a module over Peano numbers in the tree walking
+    interpreter and in compiled code, and loading it with and without the cache"""
+    import shutil
+    import tempfile
+    from bench.harness import measure
+    from .interpreter import Interpreter
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.codegen", description=main.__doc__)
+    arg_parser.add_argument("file", nargs="?", default=EXAMPLE)
+    arg_parser.add_argument("-n", type=int, default=60, help="size of the operands")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--dump", action="store_true", help="print the generated Python instead")
+    args = arg_parser.parse_args(argv[1:])
+
+    with open(args.file, encoding="utf8") as f:
+        text = f.read()
+    parser = get_syntax_parser()
+    module = parser.parse(text)
+    if args.dump:
+        print(ast.unparse(lower(module)))
+        return
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.n * args.n + 1000))
+
+    def best(function:Callable[[], Any])->Tuple[float, Any]:
+        "The best time of `function` and its result"
+        return min(measure(function, args.repeat)), function()
+
+    interpreter = Interpreter(module)
+    # the same values as the interpreter, see `python -m PyDayuri.peano` for ints
+    compiled = CompiledModule(compile_module(module, args.file, peano=False), args.file)
+    a, b = nat(args.n), nat(args.n // 2)
+    print(f"{os.path.basename(args.file)}, n = {args.n}")
+    for name in ("add", "mul"):
+        walk_time, walk_result = best(lambda: interpreter.call(name, a, b))
+        compiled_time, compiled_result = best(lambda: compiled.call(name, a, b))
+        assert walk_result == compiled_result
+        print(f"{name} {args.n} {args.n // 2} = {nat_value(compiled_result)}")
+        print(f"  tree walking : {walk_time*1000:9.3f} ms")
+        print(f"  compiled     : {compiled_time*1000:9.3f} ms  {walk_time / compiled_time:5.1f}x")
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, os.path.basename(args.file))
+        shutil.copy(args.file, path)
+        start = time.perf_counter()
+        load_file(path, parser)
+        cold = time.perf_counter() - start
+        warm, loaded = best(lambda: load_file(path, parser))
+        assert loaded.cached
+        print(f"load, parse and compile : {cold*1000:9.3f} ms")
+        print(f"load from {CACHE_SUFFIX!r} cache    : {warm*1000:9.3f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,294 @@
+"""Compiles the clauses of a function, or the cases of a match, to a decision tree.
+
+Trying clauses one at a time tests the same constructor of the same
+argument again for every clause. The tree is built from the matrix of the
+patterns of the clauses (rows) over the positions of the values they look
+at (columns): it switches on the column the first row needs, splitting the
+rows by the constructor they expect there (rows with a variable go to every
+branch), and goes on with the fields of that constructor as new columns. On
+every path from the root a position is tested at most once, so the cost of
+dispatch depends on the depth of the patterns and not on how many clauses
+there are.
+
+A position is an `Occurrence`: the index of the value (argument or
+scrutinee) followed by the steps into it, field indexes (1 and up for
+constructors, 0 and up for tuples and lists) or `PREDECESSOR` into a Peano
+number. Leaves say which clause runs and where its variables are.
+
+A row with a variable where another has a constructor is copied into every
+branch, so a clause body can appear in more than one leaf; `size` lets
+backends fall back to trying clauses in order when a tree grows too large."""
+
+import sys
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .syntax import Path, PatternHole, PatternList, PatternTuple, PatternGroup, PatternApplication, PatternBind
+from .runtime import Program, ProgramError
+from .peano import Peano
+
+PREDECESSOR = "-"
+
+Occurrence = Tuple[Any, ...]
+Binding = Tuple[str, Occurrence]
+
+# kinds of heads
+CONSTRUCTOR = "constructor"
+TUPLE = "tuple"
+LIST = "list"
+ZERO = "zero"
+SUCCESSOR = "successor"
+
+
+class Head():
+    "What a switch tests, a constructor or the shape of a tuple or list"
+    kind : str
+    name : Optional[str]
+    # steps from the switched position to the fields
+    steps : Tuple[Union[int, str], ...]
+
+    def __init__(self, kind:str, name:Optional[str], steps:Tuple[Union[int, str], ...])->None:
+        self.kind = kind
+        self.name = name
+        self.steps = steps
+
+    @property
+    def key(self)->Tuple[str, Any]:
+        return (self.kind, self.name if self.kind != LIST else len(self.steps))
+
+    def __repr__(self):
+        return f"Head({self.kind!r}, {self.name!r}, {self.steps!r})"
+
+
+class Leaf():
+    "Runs clause `action` with its variables bound to `bindings`"
+    action : int
+    bindings : Tuple[Binding, ...]
+
+    def __init__(self, action:int, bindings:Tuple[Binding, ...])->None:
+        self.action = action
+        self.bindings = bindings
+
+    def __repr__(self):
+        return f"Leaf({self.action}, {self.bindings!r})"
+
+
+class Fail():
+    "No clause matches"
+
+    def __repr__(self):
+        return "Fail()"
+
+
+class Switch():
+    """Tests the value at `occurrence` against the heads of `cases`, in
+    order, `default` is taken when none is there. A switch without default
+    has every head of its type, so the last case needs no test"""
+    occurrence : Occurrence
+    cases : List[Tuple[Head, "Node"]]
+    default : Optional["Node"]
+
+    def __init__(self, occurrence:Occurrence, cases:List[Tuple[Head, "Node"]], default:Optional["Node"])->None:
+        self.occurrence = occurrence
+        self.cases = cases
+        self.default = default
+
+    def __repr__(self):
+        return f"Switch({self.occurrence!r}, {self.cases!r}, {self.default!r})"
+
+
+Node = Union[Leaf, Fail, Switch]
+# a column of a row, None is a variable (already bound) or a hole
+Column = Optional[Tuple[Head, Tuple[Any, ...]]]
+Row = Tuple[List[Column], Tuple[Binding, ...], int]
+
+
+class MatchCompiler():
+    program : Program
+    peano : Optional[Peano]
+    # the constructors of the data type of each constructor
+    siblings : Dict[str, frozenset]
+
+    def __init__(self, program:Program, peano:Optional[Peano]=None)->None:
+        self.program = program
+        self.peano = peano
+        self.siblings = {}
+        for data in program.data.values():
+            names = frozenset(str(constructor.name) for constructor in data.constructors)
+            for name in names:
+                self.siblings[name] = names
+
+    def compile(self, clauses:Sequence[Sequence[Any]])->Node:
+        "The tree matching the values against the patterns of each clause, in order"
+        width = len(clauses[0]) if clauses else 0
+        occurrences = [(i,) for i in range(width)]
+        rows = []
+        for action, patterns in enumerate(clauses):
+            columns, bindings = self._columns(patterns, occurrences, ())
+            rows.append((columns, bindings, action))
+        return self._compile(occurrences, rows)
+
+    def _head(self, name:str, arity:int)->Head:
+        peano = self.peano
+        if peano is not None:
+            if name in peano.zeros:
+                return Head(ZERO, name, ())
+            if name in peano.successors:
+                return Head(SUCCESSOR, name, (PREDECESSOR,))
+        if name not in self.program.constructors:
+            raise ProgramError(f"unknown constructor `{name}`")
+        return Head(CONSTRUCTOR, name, tuple(range(1, arity + 1)))
+
+    def _columns(self, patterns:Sequence[Any], occurrences:Sequence[Occurrence],
+            bindings:Tuple[Binding, ...])->Tuple[List[Column], Tuple[Binding, ...]]:
+        "The columns of `patterns` at `occurrences`, binding their variables"
+        columns : List[Column] = []
+        for pattern, occurrence in zip(patterns, occurrences):
+            while True:
+                kind = type(pattern)
+                if kind is PatternGroup:
+                    pattern = pattern.pattern
+                elif kind is PatternBind:
+                    bindings += ((pattern.name.name, occurrence),)
+                    pattern = pattern.pattern
+                else:
+                    break
+            if kind is Path:
+                if pattern.name in self.program.constructors:
+                    columns.append((self._head(pattern.name, 0), ()))
+                else:
+                    bindings += ((pattern.name, occurrence),)
+                    columns.append(None)
+            elif kind is PatternHole:
+                columns.append(None)
+            elif kind is PatternApplication:
+                columns.append((self._head(pattern.head.name, len(pattern.args)), pattern.args))
+            elif kind is PatternTuple:
+                columns.append((Head(TUPLE, None, tuple(range(len(pattern.items)))), pattern.items))
+            elif kind is PatternList:
+                columns.append((Head(LIST, None, tuple(range(len(pattern.items)))), pattern.items))
+            else:
+                raise ProgramError(f"unknown pattern {pattern!r}")
+        return columns, bindings
+
+    def _complete(self, heads:List[Head])->bool:
+        "Whether the heads cover every value of their type"
+        kind = heads[0].kind
+        if kind == TUPLE:
+            return True
+        if kind == LIST:
+            return False
+        if kind == ZERO or kind == SUCCESSOR:
+            return len(heads) == 2
+        names = set(head.name for head in heads)
+        return names == self.siblings.get(heads[0].name or "", frozenset())
+
+    def _compile(self, occurrences:List[Occurrence], rows:List[Row])->Node:
+        if not rows:
+            return Fail()
+        columns, bindings, action = rows[0]
+        column = next((i for i, c in enumerate(columns) if c is not None), None)
+        if column is None:
+            return Leaf(action, bindings)
+        occurrence = occurrences[column]
+        heads : Dict[Any, Head] = {}
+        for row_columns, _, _ in rows:
+            entry = row_columns[column]
+            if entry is not None:
+                heads.setdefault(entry[0].key, entry[0])
+        cases = []
+        for key, head in heads.items():
+            fields = [occurrence + (step,) for step in head.steps]
+            branch_occurrences = occurrences[:column] + fields + occurrences[column + 1:]
+            branch_rows = []
+            for row_columns, row_bindings, row_action in rows:
+                entry = row_columns[column]
+                if entry is None:
+                    inner : List[Column] = [None] * len(fields)
+                elif entry[0].key == key:
+                    inner, row_bindings = self._columns(entry[1], fields, row_bindings)
+                else:
+                    continue
+                branch_rows.append((row_columns[:column] + inner + row_columns[column + 1:], row_bindings, row_action))
+            cases.append((head, self._compile(branch_occurrences, branch_rows)))
+        default = None
+        if not self._complete(list(heads.values())):
+            default_rows = [(row_columns[:column] + row_columns[column + 1:], row_bindings, row_action)
+                for row_columns, row_bindings, row_action in rows if row_columns[column] is None]
+            default = self._compile(occurrences[:column] + occurrences[column + 1:], default_rows)
+        return Switch(occurrence, cases, default)
+
+
+def size(node:Node)->int:
+    "The number of leaves of the tree, what backends duplicate"
+    if type(node) is Switch:
+        total = sum(size(child) for _, child in node.cases)
+        return total + (size(node.default) if node.default is not None else 0)
+    return 1
+
+
+def within_limit(node:Node, clauses:int)->bool:
+    "Whether the tree duplicates few enough clause bodies to be used"
+    return size(node) <= 2 * clauses + 8
+
+
+def generate(constructors:int, clauses:int)->str:
+    """A module with a data type of `constructors` constructors and a
+    function `pick` of `clauses` clauses over pairs of them, the last one
+    a catch all"""
+    lines = ["data color ="]
+    lines.extend(f"  C{i}" for i in range(constructors))
+    lines.append("")
+    lines.append("data pair =")
+    lines.append("  P color color")
+    lines.append("")
+    for i in range(clauses - 1):
+        first, second = i % constructors, (i * 7 + 3) % constructors
+        lines.append(f"pick P C{first} C{second} = {i + 1}")
+    lines.append(f"pick p = {clauses}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv:List[str])->None:
+    """Times functions of growing numbers of clauses with the clauses tried in
+    order and compiled to decision trees, in compiled code and in the evaluator"""
+    from .syntax import get_syntax_parser
+    from .codegen import CompiledModule, compile_module
+    from .evaluator import Evaluator
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.decision", description=main.__doc__)
+    arg_parser.add_argument("--clauses", type=int, nargs="*", default=[4, 16, 32, 64, 128])
+    arg_parser.add_argument("--constructors", type=int, default=24)
+    arg_parser.add_argument("--calls", type=int, default=20000)
+    args = arg_parser.parse_args(argv[1:])
+
+    parser = get_syntax_parser()
+    print(f"{args.calls} calls over every pair of {args.constructors} constructors, microseconds per call")
+    print(f"{'clauses':>7} {'leaves':>6} {'compiled':>17} {'evaluator':>17}")
+    for clauses in args.clauses:
+        module = parser.parse(generate(args.constructors, clauses))
+        backends = []
+        for trees in (False, True):
+            backends.append(CompiledModule(compile_module(module, decision_trees=trees)))
+            backends.append(Evaluator(module, decision_trees=trees))
+        values = [("P", (f"C{i}",), (f"C{j}",)) for i in range(args.constructors) for j in range(args.constructors)]
+        values = (values * (args.calls // len(values) + 1))[:args.calls]
+        program = Program(module)
+        tree = MatchCompiler(program).compile([clause.parameters for clause in program.functions["pick"]])
+        times = []
+        results = []
+        for backend in backends:
+            pick = lambda value: backend.call("pick", value)
+            start = time.perf_counter()
+            results.append([pick(value) for value in values])
+            times.append((time.perf_counter() - start) / len(values) * 1e6)
+        assert all(result == results[0] for result in results)
+        in_order_compiled, in_order_evaluator, tree_compiled, tree_evaluator = times
+        print(f"{clauses:7} {size(tree):6} {in_order_compiled:7.2f} -> {tree_compiled:6.2f} "
+            f"{in_order_evaluator:7.2f} -> {tree_evaluator:6.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
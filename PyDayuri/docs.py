@@ -0,0 +1,471 @@
+"""Extracts the documentation of Dayuri sources from their tokens.
+
+A `-- |` comment documents what follows it: the signature or the `data`
+after it at the top level, or the constructor after it inside a `data`.
+`@arg:name` in a doc refers to the argument the signature names `name`,
+as in `add : n@nat -> m@nat -> nat`.
+
+Nothing is parsed: the grammar has no comments, so they are cut from each
+line (keeping the lines where they are) and the rest only goes through the
+`Scanner` and the `TreeIndenter`. The headers are then read from the lines
+of tokens at the top level and, for constructors, one level in; the bodies
+are only lexed. As the grammar isn't run either, signatures naming their
+arguments are taken even though the parser doesn't take them yet.
+
+`extract_tree` extracts every file of a source tree across a pool of
+worker processes, `python -m PyDayuri.docs` writes the result as JSON or
+Markdown."""
+
+import io
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from lark import Token
+from lark.exceptions import LarkError
+
+from .parser import TreeIndenter, load_parser
+from .scanner import Scanner, IDENTIFIER
+from .batch import ParseFailure, find_sources
+
+DOC_PREFIX = "-- |"
+COMMENT_PREFIX = "--"
+FORMATS = ("json", "markdown")
+
+_REFERENCE = re.compile(r"@arg:(\w+)")
+
+
+class Parameter():
+    "An argument of a signature, `name` is None unless the signature names it"
+    name : Optional[str]
+    type : str
+
+    def __init__(self, name:Optional[str], type:str)->None:
+        self.name = name
+        self.type = type
+
+    def to_json(self)->Dict[str, Any]:
+        return {"name": self.name, "type": self.type}
+
+
+class Reference():
+    "An `@arg:name` of a doc and the index of the parameter it names, None if none does"
+    name : str
+    line : int
+    parameter : Optional[int]
+
+    def __init__(self, name:str, line:int, parameter:Optional[int])->None:
+        self.name = name
+        self.line = line
+        self.parameter = parameter
+
+    def to_json(self)->Dict[str, Any]:
+        return {"name": self.name, "line": self.line, "parameter": self.parameter}
+
+
+class Constructor():
+    name : str
+    # the source of its arguments
+    args : str
+    line : int
+    doc : Optional[str]
+
+    def __init__(self, name:str, args:str, line:int, doc:Optional[str])->None:
+        self.name = name
+        self.args = args
+        self.line = line
+        self.doc = doc
+
+    def to_json(self)->Dict[str, Any]:
+        return {"name": self.name, "args": self.args, "line": self.line, "doc": self.doc}
+
+
+class Entry():
+    "A documented (or not) signature or data type"
+    kind : str
+    name : str
+    line : int
+    # the source of the header, `add : n@nat -> nat` or `data nat =`
+    header : str
+    doc : Optional[str]
+    parameters : List[Parameter]
+    result : Optional[str]
+    constructors : List[Constructor]
+    references : List[Reference]
+
+    def __init__(self, kind:str, name:str, line:int, header:str, doc:Optional[str])->None:
+        self.kind = kind
+        self.name = name
+        self.line = line
+        self.header = header
+        self.doc = doc
+        self.parameters = []
+        self.result = None
+        self.constructors = []
+        self.references = []
+
+    def resolve(self, doc_lines:List[Tuple[int, str]])->None:
+        "Finds the parameter of each `@arg:` of the doc made of `doc_lines`"
+        names = {parameter.name: i for i, parameter in enumerate(self.parameters) if parameter.name is not None}
+        for line, text in doc_lines:
+            for match in _REFERENCE.finditer(text):
+                name = match.group(1)
+                self.references.append(Reference(name, line, names.get(name)))
+
+    @property
+    def unresolved(self)->List[Reference]:
+        return [reference for reference in self.references if reference.parameter is None]
+
+    def to_json(self)->Dict[str, Any]:
+        data : Dict[str, Any] = {"kind": self.kind, "name": self.name, "line": self.line,
+            "header": self.header, "doc": self.doc}
+        if self.kind == "function":
+            data["parameters"] = [parameter.to_json() for parameter in self.parameters]
+            data["result"] = self.result
+            data["references"] = [reference.to_json() for reference in self.references]
+        else:
+            data["constructors"] = [constructor.to_json() for constructor in self.constructors]
+        return data
+
+
+class FileDocs():
+    path : str
+    seconds : float
+    entries : List[Entry]
+    # docs followed by something they can't document, as (line, doc)
+    unattached : List[Tuple[int, str]]
+    error : Optional[ParseFailure]
+
+    def __init__(self, path:str, seconds:float, entries:List[Entry], unattached:List[Tuple[int, str]],
+            error:Optional[ParseFailure]=None)->None:
+        self.path = path
+        self.seconds = seconds
+        self.entries = entries
+        self.unattached = unattached
+        self.error = error
+
+    @property
+    def ok(self)->bool:
+        return self.error is None
+
+    def to_json(self)->Dict[str, Any]:
+        return {
+            "path": self.path,
+            "entries": [entry.to_json() for entry in self.entries],
+            "unattached": [{"line": line, "doc": doc} for line, doc in self.unattached],
+            "error": str(self.error) if self.error is not None else None,
+        }
+
+    def __repr__(self):
+        status = "ok" if self.ok else "error"
+        return f"FileDocs({self.path}, {status}, entries={len(self.entries)})"
+
+
+def split_comments(text:str)->Tuple[str, List[Tuple[int, str]]]:
+    """`text` without its comments, each line in its place, and the lines of
+    the `-- |` comments taking a whole line, as (line, text after `-- |`)"""
+    if COMMENT_PREFIX not in text:
+        return text, []
+    lines = text.split("\n")
+    docs = []
+    for i, line in enumerate(lines):
+        start = line.find(COMMENT_PREFIX)
+        if start == -1:
+            continue
+        comment = line[start:]
+        code = line[:start]
+        if comment.startswith(DOC_PREFIX) and not code.strip():
+            doc = comment[len(DOC_PREFIX):].rstrip("\r")
+            docs.append((i + 1, doc[1:] if doc.startswith(" ") else doc))
+        lines[i] = code
+    return "\n".join(lines), docs
+
+
+class _Lines():
+    "The code of a source and its doc lines, handed out to the line of code after them"
+    code : str
+    docs : List[Tuple[int, str]]
+    next_doc : int
+
+    def __init__(self, code:str, docs:List[Tuple[int, str]])->None:
+        self.code = code
+        self.docs = docs
+        self.next_doc = 0
+
+    def docs_before(self, line:int)->Tuple[List[Tuple[int, str]], List[List[Tuple[int, str]]]]:
+        """The doc lines right before `line`, the last block of them, and the
+        blocks before that one that no line of code took"""
+        start = self.next_doc
+        end = start
+        docs = self.docs
+        while end < len(docs) and docs[end][0] < line:
+            end += 1
+        self.next_doc = end
+        blocks : List[List[Tuple[int, str]]] = []
+        for i in range(start, end):
+            if i == start or docs[i][0] != docs[i - 1][0] + 1:
+                blocks.append([])
+            blocks[-1].append(docs[i])
+        if not blocks:
+            return [], []
+        return blocks[-1], blocks[:-1]
+
+    def source(self, tokens:List[Token])->str:
+        return self.code[tokens[0].start_pos:tokens[-1].end_pos]
+
+
+def _split_arrows(tokens:List[Token])->List[List[Token]]:
+    "The types between the `->` of a type, outside parentheses"
+    parts : List[List[Token]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token.type != IDENTIFIER:
+            value = token.value
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            elif value == "->" and depth == 0:
+                parts.append([])
+                continue
+        parts[-1].append(token)
+    return parts
+
+
+def _function(lines:_Lines, tokens:List[Token], doc:Optional[str])->Entry:
+    entry = Entry("function", tokens[0].value, tokens[0].line, lines.source(tokens), doc)
+    type_tokens = tokens[2:]
+    if type_tokens and type_tokens[0].value in ("forall", "∀"):
+        comma = next((i for i, token in enumerate(type_tokens) if token.value == ","), len(type_tokens) - 1)
+        type_tokens = type_tokens[comma + 1:]
+    parts = _split_arrows(type_tokens)
+    for part in parts[:-1]:
+        if len(part) > 2 and part[0].type == IDENTIFIER and part[1].value == "@":
+            entry.parameters.append(Parameter(part[0].value, lines.source(part[2:])))
+        elif part:
+            entry.parameters.append(Parameter(None, lines.source(part)))
+    if parts[-1]:
+        entry.result = lines.source(parts[-1])
+    return entry
+
+
+def _doc_text(doc_lines:List[Tuple[int, str]])->Optional[str]:
+    return "\n".join(text for _, text in doc_lines) if doc_lines else None
+
+
+def extract_source(text:str, scanner:Scanner, path:str="<string>")->FileDocs:
+    "The documentation of `text`, lexed by `scanner`"
+    start = time.perf_counter()
+    code, docs = split_comments(text)
+    lines = _Lines(code, docs)
+    entries : List[Entry] = []
+    unattached : List[Tuple[int, str]] = []
+    # the data type the constructor lines belong to, None outside one
+    data : Optional[Entry] = None
+
+    def line_done(tokens:List[Token], depth:int)->None:
+        nonlocal data
+        doc_lines, earlier = lines.docs_before(tokens[0].line)
+        unattached.extend((block[0][0], _doc_text(block)) for block in earlier)
+        first = tokens[0]
+        if depth == 0:
+            data = None
+            if first.type == IDENTIFIER and len(tokens) > 1 and tokens[1].value == ":":
+                entry = _function(lines, tokens, _doc_text(doc_lines))
+                entry.resolve(doc_lines)
+                entries.append(entry)
+                return
+            if first.value == "data" and first.type != IDENTIFIER and len(tokens) > 1:
+                data = Entry("data", tokens[1].value, first.line, lines.source(tokens), _doc_text(doc_lines))
+                entries.append(data)
+                return
+        elif depth == 1 and data is not None and first.type == IDENTIFIER:
+            data.constructors.append(Constructor(first.value, lines.source(tokens[1:]) if len(tokens) > 1 else "",
+                first.line, _doc_text(doc_lines)))
+            return
+        if doc_lines:
+            unattached.append((doc_lines[0][0], _doc_text(doc_lines)))
+
+    indenter = TreeIndenter()
+    nl_type = indenter.NL_type
+    indent_type = indenter.INDENT_type
+    dedent_type = indenter.DEDENT_type
+    depth = 0
+    line_depth = 0
+    current : List[Token] = []
+    try:
+        for token in indenter.process(scanner.scan(code)):
+            kind = token.type
+            if kind == nl_type or kind == indent_type or kind == dedent_type:
+                if current:
+                    line_done(current, line_depth)
+                    current = []
+                if kind == indent_type:
+                    depth += 1
+                elif kind == dedent_type:
+                    depth -= 1
+                continue
+            if not current:
+                line_depth = depth
+            current.append(token)
+        if current:
+            line_done(current, line_depth)
+        error = None
+    except LarkError as e:
+        error = ParseFailure.from_exception(e)
+    # docs after the last line of code
+    last, earlier = lines.docs_before(sys.maxsize)
+    unattached.extend((block[0][0], _doc_text(block)) for block in earlier + [last] if block)
+    return FileDocs(path, time.perf_counter() - start, entries, unattached, error)
+
+
+def get_scanner(cache_dir:Optional[str]=None)->Scanner:
+    "A scanner of the terminals of the grammar, whose tables come from the cache when possible"
+    parser, _ = load_parser(cache_dir=cache_dir, postlex=None)
+    return Scanner(parser.terminals)
+
+
+# set in each process of the `extract_tree` pool, `extract_file` uses it
+_scanner : Optional[Scanner] = None
+
+
+def _init_worker(cache_dir:Optional[str])->None:
+    global _scanner
+    _scanner = get_scanner(cache_dir)
+
+
+def extract_file(path:str, scanner:Optional[Scanner]=None)->FileDocs:
+    "The documentation of one file, by default with the scanner of the current worker"
+    if scanner is None:
+        if _scanner is None:
+            _init_worker(None)
+        scanner = _scanner
+    assert scanner is not None
+    try:
+        with open(path, encoding="utf8") as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return FileDocs(path, 0.0, [], [], ParseFailure.from_exception(e))
+    return extract_source(text, scanner, path)
+
+
+def extract_tree(root:str, workers:Optional[int]=None, cache_dir:Optional[str]=None)->List[FileDocs]:
+    "The documentation of the sources under `root`, in the order of `find_sources`"
+    paths = find_sources(root)
+    if workers == 1 or len(paths) <= 1:
+        scanner = get_scanner(cache_dir)
+        return [extract_file(path, scanner) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        load_parser(cache_dir=cache_dir, postlex=None)
+        return list(pool.map(extract_file, paths, chunksize=max(1, len(paths) // 64)))
+
+
+def to_markdown(results:List[FileDocs])->str:
+    out = io.StringIO()
+    for result in results:
+        out.write(f"# {result.path}\n\n")
+        if result.error is not None:
+            out.write(f"Not extracted: {result.error}\n\n")
+        for entry in result.entries:
+            title = f"data {entry.name}" if entry.kind == "data" else entry.name
+            out.write(f"## `{title}`\n\n```\n{entry.header}\n```\n\n")
+            if entry.doc:
+                out.write(_REFERENCE.sub(r"`\1`", entry.doc) + "\n\n")
+            named = [parameter for parameter in entry.parameters if parameter.name is not None]
+            for parameter in named:
+                out.write(f"- `{parameter.name}` : `{parameter.type}`\n")
+            for constructor in entry.constructors:
+                args = f" {constructor.args}" if constructor.args else ""
+                doc = f" — {constructor.doc}" if constructor.doc else ""
+                out.write(f"- `{constructor.name}{args}`{doc}\n")
+            if named or entry.constructors:
+                out.write("\n")
+    return out.getvalue()
+
+
+def to_json(results:List[FileDocs])->str:
+    return json.dumps({"files": [result.to_json() for result in results]}, indent=2, ensure_ascii=False) + "\n"
+
+
+def main(argv:List[str])->None:
+    """Extracts the documentation of the .dy files under each path, reporting
+    the `@arg:` that name no argument. With `--bench` it times it against
+    parsing a generated corpus instead"""
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.docs", description=main.__doc__)
+    arg_parser.add_argument("paths", nargs="*")
+    arg_parser.add_argument("--format", choices=FORMATS, default="json")
+    arg_parser.add_argument("-o", "--output", default=None, help="output file, default stdout")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, default one per core")
+    arg_parser.add_argument("--cache-dir", default=None, help="parse table cache directory")
+    arg_parser.add_argument("--bench", type=int, metavar="DECLARATIONS", default=None)
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs of each side of --bench")
+    args = arg_parser.parse_args(argv[1:])
+    if args.bench is not None:
+        _bench(args.bench, args.repeat)
+        return
+
+    results : List[FileDocs] = []
+    for root in args.paths:
+        results.extend(extract_tree(root, args.jobs, args.cache_dir))
+    failed = False
+    for result in results:
+        if result.error is not None:
+            failed = True
+            print(f"{result.path}: {result.error}", file=sys.stderr)
+        for entry in result.entries:
+            for reference in entry.unresolved:
+                print(f"{result.path}:{reference.line}: `{entry.name}` has no argument `{reference.name}`",
+                    file=sys.stderr)
+    text = to_markdown(results) if args.format == "markdown" else to_json(results)
+    if args.output is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.output, "w", encoding="utf8") as f:
+            f.write(text)
+    if failed:
+        sys.exit(1)
+
+
+def _documented(text:str)->str:
+    "A generated corpus with a doc before every signature and constructor, naming the arguments"
+    out = []
+    for line in text.split("\n"):
+        if line.startswith("f") and " : " in line:
+            name, _, signature = line.partition(" : ")
+            data, number, result = signature.split(" -> ")
+            out.append(f"-- | `{name}` of @arg:x and @arg:y")
+            line = f"{name} : x@{data} -> y@{number} -> {result}"
+        elif line.startswith("data "):
+            out.append(f"-- | The type {line.split()[1]}")
+        elif line.startswith("  C") and "_" in line:
+            out.append(f"  -- | The constructor {line.split()[0]}")
+        out.append(line)
+    return "\n".join(out)
+
+
+def _bench(declarations:int, repeat:int)->None:
+    from bench import corpus
+    from bench.harness import measure
+    from .parser import get_parser
+
+    text = corpus.generate(corpus.CorpusConfig(declarations))
+    documented = _documented(text)
+    parser = get_parser()
+    scanner = get_scanner()
+
+    result = extract_source(documented, scanner)
+    assert result.ok and not result.unattached
+    assert all(not entry.unresolved for entry in result.entries)
+    parsed = min(measure(lambda: parser.parse(text), repeat))
+    extracted = min(measure(lambda: extract_source(documented, scanner), repeat))
+    print(f"{declarations} declarations, {len(documented) / (1 << 20):.2f} MB, {len(result.entries)} entries")
+    print(f"parse   : {parsed:8.2f} s")
+    print(f"extract : {extracted:8.2f} s  {parsed / extracted:5.1f}x faster")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
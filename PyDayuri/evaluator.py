@@ -0,0 +1,575 @@
+"""Evaluator compiling every expression to a Python closure once, at load time.
+
+Where `interpreter` dispatches on the type of each node every time it is
+evaluated, `Evaluator` does it once: an expression becomes a function of
+the frame of the running call, and running a program is calls between
+these closures. Variables are resolved to slots of the frame while
+compiling, so a lookup is an index and not a dictionary access, and calls
+to known functions are closures specialised for their number of arguments.
+
+Dayuri has no lambdas, so frames are never captured: each call allocates
+one list the size of its largest clause. Values are those of `runtime`,
+with `peano` (the default) those of Peano shaped types are ints as in
+`codegen`. With `decision_trees` (the default) clauses and match cases go
+through the trees of `decision`, a switch on a constructor being a lookup
+in a dictionary of its branches. `hash_consing` and `memoize` are those of
+`sharing`, every call of a memoized function goes through its table."""
+
+import sys
+import time
+import argparse
+from operator import itemgetter, add, mul
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .syntax import (Module, Path, PatternHole, PatternList, PatternTuple, PatternGroup,
+    PatternApplication, PatternBind, Number, ExpTuple, ExpGroup, ExpList, Annotated, Let,
+    Match, Application, application_spine)
+from .runtime import MatchError, ProgramError, Program, curry, apply, nat, nat_value
+from .peano import Peano, ADD
+from .sharing import HashCons, Memo
+from .decision import (MatchCompiler, Node, Leaf, Fail, Switch, Occurrence, PREDECESSOR,
+    TUPLE, LIST, ZERO, SUCCESSOR, within_limit)
+
+Frame = List[Any]
+Code = Callable[[Frame], Any]
+# stores the variables of a pattern in the frame if the value matches
+Matcher = Callable[[Any, Frame], bool]
+Scope = Dict[str, int]
+Values = Tuple[Any, ...]
+# a decision tree over the values of the arguments (or the scrutinee)
+Dispatch = Callable[[Values, Frame], Any]
+
+
+def _constant(value:Any)->Code:
+    return lambda frame: value
+
+
+def _bind(slot:int)->Matcher:
+    def matcher(value:Any, frame:Frame)->bool:
+        frame[slot] = value
+        return True
+    return matcher
+
+
+def _any(value:Any, frame:Frame)->bool:
+    return True
+
+
+def _tag(name:str)->Matcher:
+    return lambda value, frame: value[0] == name
+
+
+def _items(matchers:List[Matcher], first:int)->Matcher:
+    "Matches the items of a tuple from `first` on"
+    def matcher(value:Any, frame:Frame)->bool:
+        i = first
+        for item in matchers:
+            if not item(value[i], frame):
+                return False
+            i += 1
+        return True
+    return matcher
+
+
+def _constructor(name:str, arguments:List[Matcher])->Matcher:
+    if not arguments:
+        return _tag(name)
+    if len(arguments) == 1:
+        argument = arguments[0]
+        return lambda value, frame: value[0] == name and argument(value[1], frame)
+    items = _items(arguments, 1)
+    return lambda value, frame: value[0] == name and items(value, frame)
+
+
+def _zero(value:Any, frame:Frame)->bool:
+    return value == 0
+
+
+def _positive(argument:Matcher)->Matcher:
+    "Matches `S p`, `p` against the predecessor"
+    return lambda value, frame: value > 0 and argument(value - 1, frame)
+
+
+def _accessor(occurrence:Occurrence)->Tuple[Callable[[Values], Any], int]:
+    """Reads the value at `occurrence`, except for its trailing predecessor
+    steps whose count is returned"""
+    root = occurrence[0]
+    steps = list(occurrence[1:])
+    depth = 0
+    while steps and steps[-1] == PREDECESSOR:
+        steps.pop()
+        depth += 1
+    operations : List[Tuple[bool, int]] = []
+    for step in steps:
+        if step == PREDECESSOR:
+            if operations and operations[-1][0]:
+                operations[-1] = (True, operations[-1][1] + 1)
+            else:
+                operations.append((True, 1))
+        else:
+            operations.append((False, step))
+    if not operations:
+        return itemgetter(root), depth
+    if len(operations) == 1 and not operations[0][0]:
+        index = operations[0][1]
+        return (lambda values: values[root][index]), depth
+
+    def get(values:Values)->Any:
+        value = values[root]
+        for predecessor, n in operations:
+            value = value - n if predecessor else value[n]
+        return value
+
+    return get, depth
+
+
+def _read(occurrence:Occurrence)->Callable[[Values], Any]:
+    get, depth = _accessor(occurrence)
+    if not depth:
+        return get
+    return lambda values: get(values) - depth
+
+
+def _call(function:Callable[..., Any], args:List[Code])->Code:
+    if len(args) == 1:
+        a, = args
+        return lambda frame: function(a(frame))
+    if len(args) == 2:
+        a, b = args
+        return lambda frame: function(a(frame), b(frame))
+    if len(args) == 3:
+        a, b, c = args
+        return lambda frame: function(a(frame), b(frame), c(frame))
+    return lambda frame: function(*[arg(frame) for arg in args])
+
+
+def _build(name:str, args:List[Code], values:Optional[HashCons])->Code:
+    if values is not None:
+        cons = values.cons
+        if len(args) == 1:
+            a, = args
+            return lambda frame: cons((name, a(frame)))
+        return lambda frame: cons((name,) + tuple([arg(frame) for arg in args]))
+    if len(args) == 1:
+        a, = args
+        return lambda frame: (name, a(frame))
+    if len(args) == 2:
+        a, b = args
+        return lambda frame: (name, a(frame), b(frame))
+    return lambda frame: (name,) + tuple([arg(frame) for arg in args])
+
+
+def _apply(function:Code, args:List[Code])->Code:
+    if len(args) == 1:
+        a, = args
+        return lambda frame: function(frame)(a(frame))
+    return lambda frame: apply(function(frame), *[arg(frame) for arg in args])
+
+
+class _Function():
+    """A function of the program, `run` exists before the clauses are compiled
+    so recursive calls can refer to it"""
+    name : str
+    arity : int
+    size : int
+    clauses : List[Tuple[List[Matcher], Code]]
+    # the decision tree of the clauses, None to try them in order
+    tree : Optional[Dispatch]
+    run : Callable[..., Any]
+    curried : Any
+
+    def __init__(self, name:str, arity:int)->None:
+        self.name = name
+        self.arity = arity
+        self.size = arity
+        self.clauses = []
+        self.tree = None
+        clauses = self.clauses
+        function = self
+
+        # the usual arities don't loop over the parameters
+        if arity == 1:
+            def run(a:Any)->Any:
+                frame = [None] * function.size
+                tree = function.tree
+                if tree is not None:
+                    return tree((a,), frame)
+                for (first,), body in clauses:
+                    if first(a, frame):
+                        return body(frame)
+                raise MatchError(name)
+        elif arity == 2:
+            def run(a:Any, b:Any)->Any:
+                frame = [None] * function.size
+                tree = function.tree
+                if tree is not None:
+                    return tree((a, b), frame)
+                for (first, second), body in clauses:
+                    if first(a, frame) and second(b, frame):
+                        return body(frame)
+                raise MatchError(name)
+        else:
+            def run(*args:Any)->Any:
+                frame = [None] * function.size
+                tree = function.tree
+                if tree is not None:
+                    return tree(args, frame)
+                for matchers, body in clauses:
+                    for matcher, value in zip(matchers, args):
+                        if not matcher(value, frame):
+                            break
+                    else:
+                        return body(frame)
+                raise MatchError(name)
+
+        self.run = run
+        self.curried = run if arity == 1 else curry(run, arity)
+
+
+class _ClauseCompiler():
+    "Compiles one clause, allocating a frame slot for each variable"
+    evaluator : "Evaluator"
+    function : _Function
+    slots : int
+
+    def __init__(self, evaluator:"Evaluator", function:_Function)->None:
+        self.evaluator = evaluator
+        self.function = function
+        self.slots = 0
+
+    def slot(self)->int:
+        self.slots += 1
+        if self.slots > self.function.size:
+            self.function.size = self.slots
+        return self.slots - 1
+
+    def decision(self, node:Node, leaf:Callable[[int, Scope], Code], scope:Scope, description:str)->Dispatch:
+        "The closure of a decision tree, `leaf` compiles the clause bodies"
+        kind = type(node)
+        if kind is Leaf:
+            # the paths to leaves are disjoint, so are the lifetimes of their slots
+            base = self.slots
+            scope = dict(scope)
+            binds = []
+            for name, occurrence in node.bindings:
+                scope[name] = slot = self.slot()
+                binds.append((slot, _read(occurrence)))
+            body = leaf(node.action, scope)
+            self.slots = base
+            if not binds:
+                return lambda values, frame: body(frame)
+            if len(binds) == 1:
+                (slot, get), = binds
+
+                def bind_one(values:Values, frame:Frame)->Any:
+                    frame[slot] = get(values)
+                    return body(frame)
+
+                return bind_one
+
+            def bind(values:Values, frame:Frame)->Any:
+                for slot, get in binds:
+                    frame[slot] = get(values)
+                return body(frame)
+
+            return bind
+        if kind is Fail:
+            def fail(values:Values, frame:Frame)->Any:
+                raise MatchError(description)
+            return fail
+        assert kind is Switch
+        head = node.cases[0][0]
+        children = [(head, self.decision(child, leaf, scope, description)) for head, child in node.cases]
+        default = self.decision(node.default, leaf, scope, description) if node.default is not None else None
+        if head.kind == TUPLE or (len(children) == 1 and default is None):
+            # one shape, the type was checked
+            return children[0][1]
+        if head.kind == ZERO or head.kind == SUCCESSOR:
+            number, depth = _accessor(node.occurrence)
+            branches = {head.kind: child for head, child in children}
+            zero = branches.get(ZERO, default)
+            positive = branches.get(SUCCESSOR, default)
+            # on this path the number is at least `depth`
+            return lambda values, frame: (zero if number(values) == depth else positive)(values, frame)
+        get = _read(node.occurrence)
+        if head.kind == LIST:
+            table = {len(head.steps): child for head, child in children}
+            key = lambda values: len(get(values))
+        else:
+            table = {head.name: child for head, child in children}
+            key = lambda values: get(values)[0]
+        if default is None:
+            return lambda values, frame: table[key(values)](values, frame)
+        otherwise = default
+        return lambda values, frame: table.get(key(values), otherwise)(values, frame)
+
+    def pattern(self, pattern:Any, scope:Scope)->Matcher:
+        kind = type(pattern)
+        peano = self.evaluator.peano
+        if kind is Path:
+            name = pattern.name
+            if name in self.evaluator.program.constructors:
+                if peano is not None and name in peano.zeros:
+                    return _zero
+                return _tag(name)
+            scope[name] = slot = self.slot()
+            return _bind(slot)
+        if kind is PatternApplication:
+            arguments = [self.pattern(arg, scope) for arg in pattern.args]
+            if peano is not None and pattern.head.name in peano.successors:
+                return _positive(arguments[0])
+            return _constructor(pattern.head.name, arguments)
+        if kind is PatternGroup:
+            return self.pattern(pattern.pattern, scope)
+        if kind is PatternTuple:
+            return _items([self.pattern(item, scope) for item in pattern.items], 0)
+        if kind is PatternList:
+            count = len(pattern.items)
+            items = _items([self.pattern(item, scope) for item in pattern.items], 0)
+            return lambda value, frame: len(value) == count and items(value, frame)
+        if kind is PatternBind:
+            scope[pattern.name.name] = slot = self.slot()
+            inner = self.pattern(pattern.pattern, scope)
+
+            def bind(value:Any, frame:Frame)->bool:
+                frame[slot] = value
+                return inner(value, frame)
+
+            return bind
+        if kind is PatternHole:
+            return _any
+        raise ProgramError(f"unknown pattern {pattern!r}")
+
+    def expression(self, exp:Any, scope:Scope)->Code:
+        kind = type(exp)
+        if kind is Path:
+            return self.path(exp, scope)
+        if kind is Application:
+            return self.application(exp, scope)
+        if kind is Number:
+            return _constant(exp.value)
+        if kind is ExpGroup or kind is Annotated:
+            return self.expression(exp.exp, scope)
+        if kind is Let:
+            return self.let(exp, scope)
+        if kind is Match:
+            return self.match(exp, scope)
+        if kind is ExpTuple or kind is ExpList:
+            items = [self.expression(item, scope) for item in exp.items]
+            if kind is ExpList:
+                return lambda frame: [item(frame) for item in items]
+            if len(items) == 2:
+                a, b = items
+                return lambda frame: (a(frame), b(frame))
+            return lambda frame: tuple([item(frame) for item in items])
+        raise ProgramError(f"unknown expression {exp!r}")
+
+    def path(self, path:Path, scope:Scope)->Code:
+        name = path.name
+        slot = scope.get(name)
+        if slot is not None:
+            return itemgetter(slot)
+        program = self.evaluator.program
+        peano = self.evaluator.peano
+        arity = program.constructors.get(name)
+        if arity is not None:
+            if peano is not None and name in peano.zeros:
+                return _constant(0)
+            if peano is not None and name in peano.successors:
+                return _constant(lambda n: n + 1)
+            values = self.evaluator.values
+            if values is not None:
+                cons = values.cons
+                if arity == 0:
+                    return _constant(cons((name,)))
+                return _constant(curry(lambda *args: cons((name,) + args), arity))
+            if arity == 0:
+                return _constant((name,))
+            return _constant(curry(lambda *args: (name,) + args, arity))
+        function = self.evaluator.functions.get(name)
+        if function is None:
+            token = path.parts[0]
+            raise ProgramError(f"{token.line}:{token.column}: unknown name `{name}`")
+        if function.arity == 0:
+            run = function.run
+            return lambda frame: run()
+        return _constant(function.curried)
+
+    def application(self, exp:Application, scope:Scope)->Code:
+        head, args = application_spine(exp)
+        codes = [self.expression(arg, scope) for arg in args]
+        if type(head) is Path and head.name not in scope:
+            name = head.name
+            peano = self.evaluator.peano
+            if peano is not None and name in peano.successors and len(codes) == 1:
+                a, = codes
+                return lambda frame: a(frame) + 1
+            if self.evaluator.program.constructors.get(name) == len(codes):
+                return _build(name, codes, self.evaluator.values)
+            function = self.evaluator.functions.get(name)
+            if function is not None and function.arity == len(codes):
+                return _call(function.run, codes)
+        return _apply(self.expression(head, scope), codes)
+
+    def let(self, exp:Let, scope:Scope)->Code:
+        scope = dict(scope)
+        bindings = []
+        for binding in exp.bindings:
+            value = self.expression(binding.value, scope)
+            bindings.append((value, self.pattern(binding.pattern, scope)))
+        body = self.expression(exp.body, scope)
+        description = f"let in {self.function.name}"
+        if len(bindings) == 1:
+            (value, matcher), = bindings
+
+            def let_one(frame:Frame)->Any:
+                if not matcher(value(frame), frame):
+                    raise MatchError(description)
+                return body(frame)
+
+            return let_one
+
+        def let(frame:Frame)->Any:
+            for value, matcher in bindings:
+                if not matcher(value(frame), frame):
+                    raise MatchError(description)
+            return body(frame)
+
+        return let
+
+    def match(self, exp:Match, scope:Scope)->Code:
+        scrutinee = self.expression(exp.scrutinee, scope)
+        name = self.function.name
+        tree = self.evaluator.tree([[case.pattern] for case in exp.cases])
+        if tree is not None:
+            leaf = lambda action, scope: self.expression(exp.cases[action].body, scope)
+            dispatch = self.decision(tree, leaf, scope, f"match in {name}")
+            return lambda frame: dispatch((scrutinee(frame),), frame)
+        cases = []
+        for case in exp.cases:
+            case_scope = dict(scope)
+            matcher = self.pattern(case.pattern, case_scope)
+            cases.append((matcher, self.expression(case.body, case_scope)))
+
+        def match(frame:Frame)->Any:
+            value = scrutinee(frame)
+            for matcher, body in cases:
+                if matcher(value, frame):
+                    return body(frame)
+            raise MatchError(f"match in {name}")
+
+        return match
+
+
+class Evaluator():
+    program : Program
+    peano : Optional[Peano]
+    matcher : Optional[MatchCompiler]
+    # the table of the constructor values, None without hash-consing
+    values : Optional[HashCons]
+    functions : Dict[str, _Function]
+    memos : Dict[str, Memo]
+
+    def __init__(self, module:Module, peano:bool=True, decision_trees:bool=True, hash_consing:bool=False,
+            memoize:Sequence[str]=(), cache_size:int=1024)->None:
+        self.program = Program(module)
+        self.peano = Peano(self.program) if peano else None
+        self.matcher = MatchCompiler(self.program, self.peano) if decision_trees else None
+        self.values = HashCons() if hash_consing else None
+        self.functions = {name: _Function(name, arity) for name, arity in self.program.arities.items()}
+        arithmetic = self.peano.arithmetic if self.peano is not None else {}
+        for name, operation in arithmetic.items():
+            function = self.functions[name]
+            function.run = add if operation == ADD else mul
+            function.curried = curry(function.run, 2)
+        self.memos = {}
+        for name in memoize:
+            # before the clauses are compiled, so that calls capture the table
+            function = self.functions[name]
+            function.run = self.memos[name] = Memo(function.run, cache_size)
+            function.curried = function.run if function.arity == 1 else curry(function.run, function.arity)
+        for name, clauses in self.program.functions.items():
+            if name in arithmetic:
+                continue
+            function = self.functions[name]
+            tree = self.tree([clause.parameters for clause in clauses])
+            if tree is not None:
+                compiler = _ClauseCompiler(self, function)
+                leaf = lambda action, scope: compiler.expression(clauses[action].body, scope)
+                function.tree = compiler.decision(tree, leaf, {}, name)
+                continue
+            for clause in clauses:
+                compiler = _ClauseCompiler(self, function)
+                scope : Scope = {}
+                matchers = [compiler.pattern(parameter, scope) for parameter in clause.parameters]
+                function.clauses.append((matchers, compiler.expression(clause.body, scope)))
+
+    def tree(self, clauses:List[Any])->Optional[Node]:
+        "The decision tree of the patterns of `clauses`, None to try them in order"
+        if self.matcher is None:
+            return None
+        tree = self.matcher.compile(clauses)
+        return tree if within_limit(tree, len(clauses)) else None
+
+    def intern(self, value:Any)->Any:
+        "`value` built like those of the program"
+        return self.values.intern(value) if self.values is not None else value
+
+    def call(self, name:str, *args:Any)->Any:
+        "The value of function `name` applied to `args`"
+        function = self.functions[name]
+        if self.values is not None:
+            args = tuple([self.values.intern(arg) for arg in args])
+        if len(args) == function.arity:
+            return function.run(*args)
+        if function.arity == 0:
+            return apply(function.run(), *args)
+        return apply(function.curried, *args)
+
+
+def main(argv:List[str])->None:
+    """Times `add` and `mul` of a module over Peano numbers in the tree walking
+    interpreter, the closure evaluator and compiled code"""
+    from bench.harness import measure
+    from .syntax import get_syntax_parser
+    from .interpreter import Interpreter
+    from .codegen import EXAMPLE, CompiledModule, compile_module
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.evaluator", description=main.__doc__)
+    arg_parser.add_argument("file", nargs="?", default=EXAMPLE)
+    arg_parser.add_argument("-n", type=int, default=60, help="size of the operands")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args(argv[1:])
+
+    with open(args.file, encoding="utf8") as f:
+        text = f.read()
+    module = get_syntax_parser().parse(text)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.n * args.n + 1000))
+
+    start = time.perf_counter()
+    # the same values as the interpreter, see `python -m PyDayuri.peano` for ints
+    evaluator = Evaluator(module, peano=False)
+    load_time = time.perf_counter() - start
+    backends = [("tree walking", Interpreter(module)), ("closures", evaluator),
+        ("compiled", CompiledModule(compile_module(module, args.file, peano=False), args.file))]
+
+    def best(function:Callable[[], Any])->Tuple[float, Any]:
+        "The best time of `function` and its result"
+        return min(measure(function, args.repeat)), function()
+
+    a, b = nat(args.n), nat(args.n // 2)
+    print(f"{args.file}, n = {args.n}, closures built in {load_time*1000:.3f} ms")
+    for name in ("add", "mul"):
+        baseline : Optional[float] = None
+        expected = None
+        for label, backend in backends:
+            elapsed, result = best(lambda: backend.call(name, a, b))
+            if baseline is None:
+                baseline, expected = elapsed, result
+            assert result == expected
+            print(f"{name} {label:12} : {elapsed*1000:9.3f} ms  {baseline / elapsed:5.1f}x")
+        print(f"{name} {args.n} {args.n // 2} = {nat_value(expected)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,569 @@
+"""Formats Dayuri sources from their syntax tree.
+
+Each declaration is turned into a document, a list of Oppen's tokens:
+strings, `LINE` (a space, or a line break if its group doesn't fit),
+`HARDLINE`, and the brackets `GROUP`...`END_GROUP` and `NEST`/`ANCHOR`...
+`DEDENT`. Every newline is an `_NL` for the indenter, even between
+parentheses, so the only places a line can break are the ones the grammar
+takes a block: after the `=` of a definition, around the bindings of a
+`let` and before its `in`, before each case of a `match` and each
+constructor of a `data`. The indentation of those blocks counts from the
+line they start on (`NEST` is that plus `indent`, `ANCHOR` that line's), so
+what closes a block (`in`, and the `)`, `,`, `of`... after a `match`) goes
+back to it and the indenter dedents exactly to a level it has seen.
+
+`Printer` lays a document out in one pass, remembering only the tokens of
+the groups not decided yet: a group is flat once its end is reached within
+the width left on its line, and broken as soon as the tokens after its
+start overflow it, so the lookahead never goes past one line. Output is
+written to a stream after each declaration, and `check_source` compares
+it with the source as it is written, stopping at the first difference."""
+
+import io
+import sys
+import time
+import argparse
+from collections import deque
+from typing import Any, Deque, IO, Iterable, Iterator, List, Optional, Tuple
+
+from lark import Lark
+from lark.exceptions import LarkError
+
+from .parser import get_parser
+from .streaming import parse_declarations, read_lines
+from .syntax import (Node, Path, Import, PatternHole, PatternList, PatternTuple, PatternGroup,
+    PatternApplication, PatternBind, Pattern, TypeBasic, TypeParen, TypeApplication, TypeTuple,
+    TypeArrow, TypeScheme, Number, ExpTuple, ExpGroup, ExpList, Annotated, LetBinding, Let,
+    Match, Application, Exp, ConstructorArg, DataType, FunctionDeclaration,
+    FunctionDefinition, Module, SyntaxBuilder, get_syntax_parser)
+
+DEFAULT_WIDTH = 80
+DEFAULT_INDENT = 2
+
+# document tokens, everything else in a document is a string
+LINE = 0
+HARDLINE = 1
+GROUP = 2
+END_GROUP = 3
+NEST = 4
+ANCHOR = 5
+DEDENT = 6
+
+
+class Printer():
+    """Lays out the documents fed to it in `width` columns, writing them to
+    `output` on each `flush`"""
+    output : IO[str]
+    width : int
+    indent : int
+    # where the printed text is: column, indentation of its line, and the
+    # indentation still to write before the next string
+    column : int
+    line_indent : int
+    pending : int
+    indents : List[int]
+    # whether each enclosing group (of those printed) is flat
+    modes : List[bool]
+    pieces : List[str]
+    # the tokens not printed yet, from the start of the oldest undecided
+    # group, and the undecided groups as [width before them, flat]
+    buffer : Deque[Any]
+    undecided : Deque[List[Any]]
+    open_groups : List[List[Any]]
+    scanned : int
+
+    def __init__(self, output:IO[str], width:int=DEFAULT_WIDTH, indent:int=DEFAULT_INDENT)->None:
+        self.output = output
+        self.width = width
+        self.indent = indent
+        self.column = 0
+        self.line_indent = 0
+        self.pending = 0
+        self.indents = [0]
+        self.modes = []
+        self.pieces = []
+        self.buffer = deque()
+        self.undecided = deque()
+        self.open_groups = []
+        self.scanned = 0
+
+    def feed(self, document:Iterable[Any])->None:
+        buffer = self.buffer
+        undecided = self.undecided
+        for token in document:
+            if type(token) is str:
+                if not undecided:
+                    self._print(token)
+                    continue
+                buffer.append(token)
+                self.scanned += len(token)
+                self._overflow()
+            elif token == LINE:
+                if not undecided:
+                    self._print(token)
+                    continue
+                buffer.append(token)
+                self.scanned += 1
+                self._overflow()
+            elif token == GROUP:
+                group = [self.scanned, None]
+                self.open_groups.append(group)
+                undecided.append(group)
+                buffer.append(group)
+            elif token == END_GROUP:
+                group = self.open_groups.pop()
+                if group[1] is None:
+                    # the newest undecided group, and it fits
+                    undecided.pop()
+                    group[1] = True
+                    if not undecided:
+                        buffer.append(token)
+                        self._flush_buffer()
+                        continue
+                if undecided:
+                    buffer.append(token)
+                else:
+                    self._print(token)
+            elif token == HARDLINE:
+                # no group around it can be flat
+                while undecided:
+                    undecided.popleft()[1] = False
+                self._flush_buffer()
+                self._print(token)
+            elif undecided:
+                buffer.append(token)
+            else:
+                self._print(token)
+
+    def _overflow(self)->None:
+        "Breaks the oldest undecided groups while what follows their start doesn't fit"
+        undecided = self.undecided
+        while undecided and self.scanned - undecided[0][0] > self.width - self.column:
+            undecided.popleft()[1] = False
+            self._flush_buffer()
+
+    def _flush_buffer(self)->None:
+        "Prints the buffer up to the start of the oldest group still undecided"
+        buffer = self.buffer
+        stop = self.undecided[0] if self.undecided else None
+        while buffer and buffer[0] is not stop:
+            self._print(buffer.popleft())
+
+    def _print(self, token:Any)->None:
+        if type(token) is str:
+            if self.pending:
+                self.pieces.append(" " * self.pending)
+                self.pending = 0
+            self.pieces.append(token)
+            self.column += len(token)
+        elif type(token) is list:
+            self.modes.append(token[1])
+        elif token == LINE and self.modes and self.modes[-1]:
+            self.pieces.append(" ")
+            self.column += 1
+        elif token == LINE or token == HARDLINE:
+            self.pieces.append("\n")
+            self.line_indent = self.pending = self.column = self.indents[-1]
+        elif token == END_GROUP:
+            self.modes.pop()
+        elif token == NEST:
+            self.indents.append(self.line_indent + self.indent)
+        elif token == ANCHOR:
+            self.indents.append(self.line_indent)
+        elif token == DEDENT:
+            self.indents.pop()
+
+    def flush(self)->None:
+        "Writes what has been laid out, a document is only laid out up to its undecided groups"
+        if self.pieces:
+            self.output.write("".join(self.pieces))
+            self.pieces.clear()
+
+
+def ends_in_block(exp:Exp)->bool:
+    """Whether `exp` ends with the cases of a `match`, so the token after it
+    goes on a new line at the indentation the `match` started from"""
+    while True:
+        kind = type(exp)
+        if kind is Match:
+            return True
+        if kind is Application:
+            exp = exp.argument
+        elif kind is Let:
+            exp = exp.body
+        else:
+            return False
+
+
+def pattern_text(pattern:Pattern)->str:
+    kind = type(pattern)
+    if kind is Path:
+        return ".".join(pattern.parts)
+    if kind is PatternHole:
+        return pattern.token
+    if kind is PatternApplication:
+        return " ".join([pattern_text(pattern.head)] + [pattern_text(arg) for arg in pattern.args])
+    if kind is PatternBind:
+        return f"{pattern_text(pattern.name)}@{pattern_text(pattern.pattern)}"
+    if kind is PatternGroup:
+        return f"({pattern_text(pattern.pattern)})"
+    if kind is PatternTuple:
+        return f"({', '.join(pattern_text(item) for item in pattern.items)})"
+    if kind is PatternList:
+        return f"[{', '.join(pattern_text(item) for item in pattern.items)}]"
+    raise TypeError(f"not a pattern: {pattern!r}")
+
+
+def type_text(type_:Any)->str:
+    kind = type(type_)
+    if kind is Path:
+        return ".".join(type_.parts)
+    if kind is TypeBasic:
+        return type_.token
+    if kind is TypeArrow:
+        return f"{type_text(type_.argument)} -> {type_text(type_.result)}"
+    if kind is TypeApplication:
+        return " ".join([type_text(type_.head)] + [type_text(arg) for arg in type_.args])
+    if kind is TypeTuple:
+        return " * ".join(type_text(item) for item in type_.items)
+    if kind is TypeParen:
+        return f"({type_text(type_.type)})"
+    if kind is TypeScheme:
+        if type_.variables is None:
+            return type_text(type_.type)
+        return f"{prenex_text(type_.variables)} {type_text(type_.type)}"
+    raise TypeError(f"not a type: {type_!r}")
+
+
+def prenex_text(variables:Tuple[str, ...])->str:
+    return "".join(["forall"] + [f" {variable}" for variable in variables]) + ","
+
+
+class Formatter():
+    "Builds the document of each declaration"
+    document : List[Any]
+
+    def __init__(self)->None:
+        self.document = []
+
+    def node(self, node:Node)->List[Any]:
+        "The document of an import or a declaration, without the line break after it"
+        self.document = []
+        kind = type(node)
+        if kind is FunctionDefinition:
+            self.function_definition(node)
+        elif kind is FunctionDeclaration:
+            self.document.append(f"{node.name} : {type_text(node.type)}")
+        elif kind is DataType:
+            self.data_type(node)
+        elif kind is Import:
+            alias = f" as {node.alias}" if node.alias is not None else ""
+            self.document.append(f"import {'.'.join(node.path.parts)}{alias}")
+        else:
+            raise TypeError(f"not a declaration: {node!r}")
+        return self.document
+
+    def function_definition(self, node:FunctionDefinition)->None:
+        document = self.document
+        head = node.name
+        if node.parameters:
+            head += " " + " $ ".join(pattern_text(parameter) for parameter in node.parameters)
+        document.extend((GROUP, head + " =", NEST, LINE))
+        self.exp(node.body)
+        document.extend((DEDENT, END_GROUP))
+
+    def data_type(self, node:DataType)->None:
+        document = self.document
+        prenex = f" {prenex_text(node.variables)}" if node.variables is not None else ""
+        document.extend((f"data {node.name}{prenex} =", NEST))
+        for constructor in node.constructors:
+            document.append(HARDLINE)
+            document.append(" ".join([constructor.name] + [self.constructor_arg(arg) for arg in constructor.args]))
+        document.append(DEDENT)
+
+    def constructor_arg(self, arg:ConstructorArg)->str:
+        if arg.name is None:
+            return arg.type
+        return f"({arg.name} : {type_text(arg.type)})"
+
+    def close(self, exp:Exp, text:str)->None:
+        "`exp` followed by `text`, on the next line if `exp` ends in a block"
+        self.exp(exp)
+        if ends_in_block(exp):
+            self.document.extend((HARDLINE, text.lstrip()))
+        else:
+            self.document.append(text)
+
+    def items(self, items:Tuple[Exp, ...], open:str, close:str)->None:
+        document = self.document
+        document.extend((ANCHOR, open))
+        last = len(items) - 1
+        for i, item in enumerate(items):
+            self.close(item, ", " if i < last else close)
+        if not items:
+            document.append(close)
+        document.append(DEDENT)
+
+    def exp(self, exp:Exp)->None:
+        document = self.document
+        kind = type(exp)
+        if kind is Application:
+            # the function is a name or between parentheses, only the last
+            # argument of a chain can take lines
+            while type(exp) is Application:
+                function = exp.function
+                if type(function) is Path:
+                    document.append(".".join(function.parts))
+                else:
+                    self.exp(function)
+                document.append(" $ " if exp.dollar else " ")
+                exp = exp.argument
+            self.exp(exp)
+        elif kind is Path:
+            document.append(".".join(exp.parts))
+        elif kind is Number:
+            document.append(str(exp.token))
+        elif kind is ExpGroup:
+            document.extend((ANCHOR, "("))
+            self.close(exp.exp, ")")
+            document.append(DEDENT)
+        elif kind is ExpTuple:
+            self.items(exp.items, "(", ")")
+        elif kind is ExpList:
+            self.items(exp.items, "[", "]")
+        elif kind is Annotated:
+            document.extend((ANCHOR, "("))
+            self.close(exp.exp, f" : {type_text(exp.type)})")
+            document.append(DEDENT)
+        elif kind is Let:
+            self.let(exp)
+        elif kind is Match:
+            self.match(exp)
+        else:
+            raise TypeError(f"not an expression: {exp!r}")
+
+    def binding(self, binding:LetBinding)->None:
+        self.document.append(f"{pattern_text(binding.pattern)} = ")
+        self.exp(binding.value)
+
+    def let(self, exp:Let)->None:
+        document = self.document
+        bindings = exp.bindings
+        document.extend((ANCHOR, "let"))
+        if len(bindings) > 1:
+            document.append(NEST)
+            for binding in bindings:
+                document.append(HARDLINE)
+                self.binding(binding)
+            document.extend((DEDENT, HARDLINE, "in "))
+        elif ends_in_block(bindings[0].value):
+            # only `let p = v in` takes a binding ending in a block, the
+            # `in` closes it
+            document.append(" ")
+            self.binding(bindings[0])
+            document.extend((HARDLINE, "in "))
+        else:
+            # on one line if the binding fits, the body can't break anyway
+            document.extend((GROUP, NEST, LINE))
+            self.binding(bindings[0])
+            document.extend((DEDENT, LINE, "in ", END_GROUP))
+        self.exp(exp.body)
+        document.append(DEDENT)
+
+    def match(self, exp:Match)->None:
+        document = self.document
+        document.extend((ANCHOR, "match "))
+        self.close(exp.scrutinee, " of")
+        document.append(NEST)
+        for case in exp.cases:
+            document.extend((HARDLINE, f"{pattern_text(case.pattern)} -> "))
+            self.exp(case.body)
+        document.extend((DEDENT, DEDENT))
+
+
+def _separated(nodes:Iterable[Node])->Iterator[Tuple[Node, int]]:
+    """Each node with the line breaks before it: the clauses of a function go
+    right after its signature or its previous clause, other declarations
+    after a blank line"""
+    previous : Optional[Node] = None
+    for node in nodes:
+        if previous is None:
+            breaks = 0
+        elif type(previous) is Import and type(node) is Import:
+            breaks = 1
+        elif type(node) is FunctionDefinition and type(previous) in (FunctionDeclaration, FunctionDefinition) \
+                and previous.name == node.name:
+            breaks = 1
+        else:
+            breaks = 2
+        yield node, breaks
+        previous = node
+
+
+def format_nodes(nodes:Iterable[Node], output:IO[str], width:int=DEFAULT_WIDTH, indent:int=DEFAULT_INDENT)->None:
+    "Writes the imports and declarations `nodes`, one at a time, to `output`"
+    printer = Printer(output, width, indent)
+    formatter = Formatter()
+    written = False
+    for node, breaks in _separated(nodes):
+        if breaks:
+            printer.feed((HARDLINE,) * breaks)
+        printer.feed(formatter.node(node))
+        printer.flush()
+        written = True
+    if written:
+        printer.feed((HARDLINE,))
+        printer.flush()
+
+
+def format_module(module:Module, output:IO[str], width:int=DEFAULT_WIDTH, indent:int=DEFAULT_INDENT)->None:
+    format_nodes(module.imports + module.declarations, output, width, indent)
+
+
+def stream_nodes(lines:Iterable[str], parser:Optional[Lark]=None)->Iterator[Node]:
+    "The imports and declarations of `lines`, parsed one at a time by `streaming`"
+    builder = SyntaxBuilder()
+    for tree in parse_declarations(lines, parser):
+        yield builder.transform(tree)
+
+
+def format_source(text:str, parser:Optional[Lark]=None, width:int=DEFAULT_WIDTH, indent:int=DEFAULT_INDENT)->str:
+    "`text` formatted, `parser` is one of `get_syntax_parser`"
+    if parser is None:
+        parser = get_syntax_parser()
+    output = io.StringIO()
+    format_module(parser.parse(text), output, width, indent)
+    return output.getvalue()
+
+
+class _Difference(Exception):
+    offset : int
+
+    def __init__(self, offset:int)->None:
+        self.offset = offset
+
+
+class _Comparison():
+    "A stream comparing what is written to it with `text`"
+    text : str
+    offset : int
+
+    def __init__(self, text:str)->None:
+        self.text = text
+        self.offset = 0
+
+    def write(self, piece:str)->int:
+        offset = self.offset
+        end = offset + len(piece)
+        if not self.text.startswith(piece, offset):
+            original = self.text[offset:end]
+            index = 0
+            while index < len(original) and original[index] == piece[index]:
+                index += 1
+            raise _Difference(offset + index)
+        self.offset = end
+        return len(piece)
+
+
+def check_source(text:str, parser:Optional[Lark]=None, width:int=DEFAULT_WIDTH,
+        indent:int=DEFAULT_INDENT)->Optional[Tuple[int, int]]:
+    """The line and column of the first difference between `text` and its
+    formatted version, None if it is formatted. Declarations are parsed and
+    formatted one at a time and the ones after the difference aren't,
+    `parser` is one of `get_parser`"""
+    comparison = _Comparison(text)
+    try:
+        format_nodes(stream_nodes(read_lines(io.StringIO(text, newline="")), parser), comparison, width, indent)
+        if comparison.offset == len(text):
+            return None
+        offset = comparison.offset
+    except _Difference as difference:
+        offset = difference.offset
+    line_start = text.rfind("\n", 0, offset) + 1
+    return text.count("\n", 0, offset) + 1, offset - line_start + 1
+
+
+def main(argv:List[str])->None:
+    """Formats .dy files (or the ones under the directories given) to stdout,
+    in place with `--write`, or with `--check` reports the first difference
+    of each file not formatted and exits with 1"""
+    from .batch import find_sources
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.formatter", description=main.__doc__)
+    arg_parser.add_argument("paths", nargs="*")
+    arg_parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    arg_parser.add_argument("--indent", type=int, default=DEFAULT_INDENT)
+    mode = arg_parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true")
+    mode.add_argument("--write", action="store_true")
+    mode.add_argument("--bench", type=int, metavar="DECLARATIONS", default=None,
+        help="time formatting and checking a generated corpus instead")
+    args = arg_parser.parse_args(argv[1:])
+    if args.bench is not None:
+        _bench(args.bench, args.width, args.indent)
+        return
+
+    parser = get_parser()
+    failed = False
+    for root in args.paths:
+        for path in find_sources(root):
+            try:
+                with open(path, encoding="utf8") as f:
+                    text = f.read()
+                if args.check:
+                    difference = check_source(text, parser, args.width, args.indent)
+                    if difference is not None:
+                        failed = True
+                        print(f"{path}:{difference[0]}:{difference[1]}: not formatted")
+                    continue
+                output = io.StringIO()
+                format_nodes(stream_nodes(read_lines(io.StringIO(text, newline="")), parser), output, args.width, args.indent)
+            except LarkError as e:
+                failed = True
+                print(f"{path}: {type(e).__name__}: {str(e).splitlines()[0]}", file=sys.stderr)
+                continue
+            if args.write:
+                if output.getvalue() != text:
+                    with open(path, "w", encoding="utf8") as f:
+                        f.write(output.getvalue())
+            else:
+                sys.stdout.write(output.getvalue())
+    if failed:
+        sys.exit(1)
+
+
+def _bench(declarations:int, width:int, indent:int)->None:
+    """Times parsing, formatting and checking a generated corpus of
+    `declarations` and one twice as large, and checking it with a difference
+    on its first line"""
+    from bench import corpus
+
+    parser = get_syntax_parser()
+    tree_parser = get_parser()
+    for scale in (1, 2):
+        text = corpus.generate(corpus.CorpusConfig(declarations * scale))
+        start = time.perf_counter()
+        module = parser.parse(text)
+        parsed = time.perf_counter() - start
+        output = io.StringIO()
+        start = time.perf_counter()
+        format_module(module, output, width, indent)
+        formatted = time.perf_counter() - start
+        result = output.getvalue()
+        assert parser.parse(result) == module
+        start = time.perf_counter()
+        difference = check_source(result, tree_parser, width, indent)
+        checked = time.perf_counter() - start
+        assert difference is None
+        start = time.perf_counter()
+        difference = check_source(result.replace(" =", "  =", 1), tree_parser, width, indent)
+        stopped = time.perf_counter() - start
+        assert difference is not None and difference[0] == 1
+        megabytes = len(result.encode("utf8")) / (1 << 20)
+        print(f"{declarations * scale} declarations, {megabytes:.2f} MB, {result.count(chr(10))} lines")
+        print(f"  parse  : {parsed:8.2f} s")
+        print(f"  format : {formatted:8.2f} s  {megabytes / formatted:6.2f} MB/s")
+        print(f"  check  : {checked:8.2f} s  {stopped*1000:8.2f} ms with a difference on line 1")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,127 @@
+"""Tree walking interpreter over the nodes of `syntax`.
+
+The reference the compiling backends are tested and benchmarked against:
+every step dispatches on the type of the node and looks names up in
+dictionaries. Values are those of `runtime`."""
+
+from typing import Any, Callable, Dict, Optional
+
+from .syntax import (Module, Path, PatternHole, PatternList, PatternTuple, PatternGroup,
+    PatternApplication, PatternBind, Number, ExpTuple, ExpGroup, ExpList, Annotated, Let,
+    Match, Application, application_spine)
+from .runtime import MatchError, ProgramError, Program, curry, apply
+
+Environment = Dict[str, Any]
+
+
+class Interpreter():
+    program : Program
+
+    def __init__(self, module:Module)->None:
+        self.program = Program(module)
+
+    def call(self, name:str, *args:Any)->Any:
+        "The value of function `name` applied to `args`"
+        arity = self.program.arities[name]
+        if len(args) < arity:
+            return apply(curry(lambda *all: self.call(name, *all), arity), *args)
+        result = self._call(name, args[:arity])
+        return apply(result, *args[arity:])
+
+    def _call(self, name:str, args:Any)->Any:
+        for clause in self.program.functions[name]:
+            env : Environment = {}
+            for parameter, value in zip(clause.parameters, args):
+                if not self.match(parameter, value, env):
+                    break
+            else:
+                return self.evaluate(clause.body, env)
+        raise MatchError(name)
+
+    def match(self, pattern:Any, value:Any, env:Environment)->bool:
+        "Whether `value` matches `pattern`, adding the variables to `env`"
+        kind = type(pattern)
+        if kind is Path:
+            name = pattern.name
+            if name in self.program.constructors:
+                return value[0] == name
+            env[name] = value
+            return True
+        if kind is PatternApplication:
+            if value[0] != pattern.head.name:
+                return False
+            for argument, item in zip(pattern.args, value[1:]):
+                if not self.match(argument, item, env):
+                    return False
+            return True
+        if kind is PatternHole:
+            return True
+        if kind is PatternGroup:
+            return self.match(pattern.pattern, value, env)
+        if kind is PatternTuple or kind is PatternList:
+            if len(value) != len(pattern.items):
+                return False
+            for item_pattern, item in zip(pattern.items, value):
+                if not self.match(item_pattern, item, env):
+                    return False
+            return True
+        if kind is PatternBind:
+            env[pattern.name.name] = value
+            return self.match(pattern.pattern, value, env)
+        raise ProgramError(f"unknown pattern {pattern!r}")
+
+    def evaluate(self, exp:Any, env:Environment)->Any:
+        kind = type(exp)
+        if kind is Path:
+            return self.lookup(exp, env)
+        if kind is Application:
+            head, args = application_spine(exp)
+            values = [self.evaluate(arg, env) for arg in args]
+            if type(head) is Path and head.name not in env:
+                name = head.name
+                arity = self.program.constructors.get(name)
+                if arity is not None and arity == len(values):
+                    return (name,) + tuple(values)
+                if self.program.arities.get(name, 0) > 0:
+                    return self.call(name, *values)
+            return apply(self.evaluate(head, env), *values)
+        if kind is Number:
+            return exp.value
+        if kind is ExpGroup or kind is Annotated:
+            return self.evaluate(exp.exp, env)
+        if kind is Let:
+            env = dict(env)
+            for binding in exp.bindings:
+                value = self.evaluate(binding.value, env)
+                if not self.match(binding.pattern, value, env):
+                    raise MatchError("let")
+            return self.evaluate(exp.body, env)
+        if kind is Match:
+            value = self.evaluate(exp.scrutinee, env)
+            for case in exp.cases:
+                case_env = dict(env)
+                if self.match(case.pattern, value, case_env):
+                    return self.evaluate(case.body, case_env)
+            raise MatchError("match")
+        if kind is ExpTuple:
+            return tuple(self.evaluate(item, env) for item in exp.items)
+        if kind is ExpList:
+            return [self.evaluate(item, env) for item in exp.items]
+        raise ProgramError(f"unknown expression {exp!r}")
+
+    def lookup(self, path:Path, env:Environment)->Any:
+        name = path.name
+        if name in env:
+            return env[name]
+        arity : Optional[int] = self.program.constructors.get(name)
+        if arity is not None:
+            if arity == 0:
+                return (name,)
+            return curry(lambda *args: (name,) + args, arity)
+        arity = self.program.arities.get(name)
+        if arity is None:
+            raise ProgramError(f"{path.parts[0].line}:{path.parts[0].column}: unknown name `{name}`")
+        if arity == 0:
+            return self._call(name, ())
+        function : Callable[..., Any] = lambda *args: self._call(name, args)
+        return curry(function, arity)
@@ -0,0 +1,337 @@
+"""Module loading: resolves `import` paths to files, builds the dependency
+graph and compiles modules in dependency order across worker processes.
+
+`import a.b` is looked up as `a/b.dy` in each directory of the search path,
+the first match wins. Imports are found by a pre-scan of the lines at the
+top of a file (the grammar only allows them before any declaration), so
+building the graph doesn't parse anything."""
+
+import os
+import re
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .batch import SOURCE_SUFFIX, FileResult, _init_worker, parse_file, find_sources
+
+_IMPORT_LINE = re.compile(r"import[ \t]+(\S+)(?:[ \t]+as[ \t]+\S+)?[ \t]*$")
+
+
+class ModuleError(Exception):
+    pass
+
+
+class UnresolvedImports(ModuleError):
+    "Imports that are in no directory of the search path, by importing module"
+    missing : Dict[str, List[str]]
+
+    def __init__(self, missing:Dict[str, List[str]])->None:
+        self.missing = missing
+        lines = [f"{module}: cannot find {', '.join(names)}" for module, names in sorted(missing.items())]
+        super().__init__("\n".join(lines))
+
+
+class ImportCycle(ModuleError):
+    "Every group of modules that import each other"
+    cycles : List[List[str]]
+
+    def __init__(self, cycles:List[List[str]])->None:
+        self.cycles = cycles
+        lines = [" -> ".join(cycle + [cycle[0]]) for cycle in cycles]
+        super().__init__("import cycle: " + "\nimport cycle: ".join(lines))
+
+
+def scan_imports(path:str)->List[str]:
+    "The module paths imported by the file, reading only its leading import lines"
+    imports = []
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            match = _IMPORT_LINE.match(stripped)
+            if match is None:
+                break
+            imports.append(match.group(1))
+    return imports
+
+
+def module_name(root:str, path:str)->str:
+    "`a.b` for `root/a/b.dy`"
+    relative = os.path.relpath(path, root)[:-len(SOURCE_SUFFIX)]
+    return ".".join(relative.split(os.sep))
+
+
+class ModuleInfo():
+    name : str
+    path : str
+    imports : List[str]
+
+    def __init__(self, name:str, path:str, imports:List[str])->None:
+        self.name = name
+        self.path = path
+        self.imports = imports
+
+    def __repr__(self):
+        return f"ModuleInfo({self.name}, {self.path}, imports={self.imports})"
+
+
+class ModuleGraph():
+    "The modules reachable from some roots and the imports between them"
+    search_path : List[str]
+    modules : Dict[str, ModuleInfo]
+    missing : Dict[str, List[str]]
+
+    def __init__(self, search_path:List[str])->None:
+        self.search_path = search_path
+        self.modules = {}
+        self.missing = {}
+
+    def resolve(self, name:str)->Optional[str]:
+        relative = os.path.join(*name.split(".")) + SOURCE_SUFFIX
+        for directory in self.search_path:
+            path = os.path.join(directory, relative)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def add(self, names:Iterable[str])->None:
+        "Adds the modules `names` and everything they import"
+        pending = deque(name for name in names if name not in self.modules)
+        while pending:
+            name = pending.popleft()
+            if name in self.modules:
+                continue
+            path = self.resolve(name)
+            if path is None:
+                raise UnresolvedImports({"<command line>": [name]})
+            info = ModuleInfo(name, path, scan_imports(path))
+            self.modules[name] = info
+            for imported in info.imports:
+                if imported in self.modules:
+                    continue
+                if self.resolve(imported) is None:
+                    self.missing.setdefault(name, []).append(imported)
+                else:
+                    pending.append(imported)
+
+    def add_all(self)->None:
+        "Adds every module under the search path"
+        names = []
+        for directory in self.search_path:
+            names.extend(module_name(directory, path) for path in find_sources(directory))
+        self.add(names)
+
+    def dependencies(self, name:str)->List[str]:
+        return [imported for imported in self.modules[name].imports if imported in self.modules]
+
+    def dependents(self)->Dict[str, List[str]]:
+        result : Dict[str, List[str]] = {name: [] for name in self.modules}
+        for name in self.modules:
+            for imported in set(self.dependencies(name)):
+                result[imported].append(name)
+        return result
+
+    def cycles(self)->List[List[str]]:
+        "Strongly connected components with more than one module, or a module importing itself"
+        index : Dict[str, int] = {}
+        low : Dict[str, int] = {}
+        on_stack : Set[str] = set()
+        stack : List[str] = []
+        found = []
+        counter = 0
+        for root in self.modules:
+            if root in index:
+                continue
+            # iterative Tarjan, the work stack holds (module, next dependency index)
+            work : List[Tuple[str, int]] = [(root, 0)]
+            while work:
+                name, i = work.pop()
+                if i == 0:
+                    index[name] = low[name] = counter
+                    counter += 1
+                    stack.append(name)
+                    on_stack.add(name)
+                dependencies = self.dependencies(name)
+                if i < len(dependencies):
+                    work.append((name, i + 1))
+                    dependency = dependencies[i]
+                    if dependency not in index:
+                        work.append((dependency, 0))
+                    elif dependency in on_stack:
+                        low[name] = min(low[name], index[dependency])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[name])
+                if low[name] == index[name]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == name:
+                            break
+                    if len(component) > 1 or name in self.dependencies(name):
+                        found.append(list(reversed(component)))
+        return found
+
+    def check(self)->None:
+        if self.missing:
+            raise UnresolvedImports(self.missing)
+        cycles = self.cycles()
+        if cycles:
+            raise ImportCycle(cycles)
+
+    def levels(self)->List[List[str]]:
+        """Modules grouped so that each one only imports modules of earlier
+        groups, the modules of a group can be compiled at the same time"""
+        self.check()
+        remaining = {name: len(set(self.dependencies(name))) for name in self.modules}
+        dependents = self.dependents()
+        current = sorted(name for name, count in remaining.items() if count == 0)
+        levels = []
+        while current:
+            levels.append(current)
+            following = []
+            for name in current:
+                for dependent in dependents[name]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        following.append(dependent)
+            current = sorted(following)
+        return levels
+
+    def topological_order(self)->List[str]:
+        return [name for level in self.levels() for name in level]
+
+    def critical_path(self, seconds:Dict[str, float])->Tuple[List[str], float]:
+        "The chain of imports with the largest total of `seconds`"
+        best : Dict[str, Tuple[float, Optional[str]]] = {}
+        for name in self.topological_order():
+            previous = max(((best[d][0], d) for d in set(self.dependencies(name))), default=(0.0, None))
+            best[name] = (previous[0] + seconds.get(name, 0.0), previous[1])
+        if not best:
+            return [], 0.0
+        name : Optional[str] = max(best, key=lambda n: best[n][0])
+        total = best[name][0] if name is not None else 0.0
+        path = []
+        while name is not None:
+            path.append(name)
+            name = best[name][1]
+        return list(reversed(path)), total
+
+
+class BuildResult():
+    results : Dict[str, FileResult]
+    # modules not compiled because an import failed
+    skipped : List[str]
+    seconds : float
+
+    def __init__(self, results:Dict[str, FileResult], skipped:List[str], seconds:float)->None:
+        self.results = results
+        self.skipped = skipped
+        self.seconds = seconds
+
+    @property
+    def failed(self)->List[str]:
+        return [name for name, result in self.results.items() if not result.ok]
+
+    @property
+    def ok(self)->bool:
+        return not self.skipped and not self.failed
+
+
+def build(graph:ModuleGraph, workers:Optional[int]=None, cache_dir:Optional[str]=None,
+        tree_cache:bool=False)->BuildResult:
+    """Compiles every module of `graph`, each one as soon as all its imports
+    are compiled, so the time is bound by the critical path of the graph"""
+    graph.check()
+    start = time.perf_counter()
+    remaining = {name: len(set(graph.dependencies(name))) for name in graph.modules}
+    dependents = graph.dependents()
+    blocked : Set[str] = set()
+    results : Dict[str, FileResult] = {}
+    skipped : List[str] = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir, False, tree_cache)) as pool:
+        running = {}
+
+        def finished(name:str, ok:bool)->None:
+            # a failure blocks its dependents, they finish without being compiled
+            ready = deque([(name, ok)])
+            while ready:
+                name, ok = ready.popleft()
+                for dependent in dependents[name]:
+                    if not ok:
+                        blocked.add(dependent)
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        if dependent in blocked:
+                            skipped.append(dependent)
+                            ready.append((dependent, False))
+                        else:
+                            running[pool.submit(parse_file, graph.modules[dependent].path)] = dependent
+
+        for name, count in remaining.items():
+            if count == 0:
+                running[pool.submit(parse_file, graph.modules[name].path)] = name
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result = future.result()
+                results[name] = result
+                finished(name, result.ok)
+
+    return BuildResult(results, skipped, time.perf_counter() - start)
+
+
+def main(argv:List[str])->None:
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.modules",
+        description="Builds the import graph of a project and compiles it in dependency order")
+    arg_parser.add_argument("modules", nargs="*", help="modules to build with their imports, default all")
+    arg_parser.add_argument("-I", "--include", action="append", default=None, help="search path directory (repeatable)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, default one per core")
+    arg_parser.add_argument("--cache-dir", default=None, help="parse table cache directory")
+    arg_parser.add_argument("--tree-cache", action="store_true", help="reuse the trees of unchanged modules")
+    arg_parser.add_argument("--graph", action="store_true", help="only print the compilation levels")
+    args = arg_parser.parse_args(argv[1:])
+
+    graph = ModuleGraph(args.include or ["."])
+    start = time.perf_counter()
+    if args.modules:
+        graph.add(args.modules)
+    else:
+        graph.add_all()
+    try:
+        levels = graph.levels()
+    except ModuleError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    scanned = time.perf_counter() - start
+    print(f"{len(graph.modules)} modules in {len(levels)} levels, scanned in {scanned*1000:.2f} ms")
+    if args.graph:
+        for i, level in enumerate(levels):
+            print(f"  {i}: {' '.join(level)}")
+        return
+
+    result = build(graph, args.jobs, args.cache_dir, args.tree_cache)
+    for name in result.failed:
+        print(f"{name}: {result.results[name].error}")
+    for name in result.skipped:
+        print(f"{name}: skipped, an import failed")
+    seconds = {name: r.seconds for name, r in result.results.items()}
+    path, critical = graph.critical_path(seconds)
+    cached = sum(1 for r in result.results.values() if r.cached)
+    print(f"built in {result.seconds:.2f} s ({cached} cached), {sum(seconds.values()):.2f} s of compilation, "
+        f"critical path {critical:.2f} s over {len(path)} modules")
+    if not result.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,342 @@
+"""Table driven version of the Indenter.
+
+The INDENT_BLOCKS/PRODUCE_INDENT/REGULAR_INDENT declarations are compiled
+once into a per token type action table and the indentation stack is kept
+as parallel int arrays, the token stream produced is the same as the one
+of `Indenter`, as are the events recorded when it is built with `trace`."""
+
+import sys
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lark.lexer import Token
+
+from .indenter import (Indenter, IndentType, AtNextToken, Indentation, Indent, BlockStart,
+    ExpectedCloseToken, IndentationAtZero, UnexpectedIndentBlock, UnexpectedIndentRegular,
+    ReportBug, IndenterTrace, TraceAction)
+
+# kinds of stack items
+KIND_INDENT = 0
+KIND_BLOCK = 1
+
+# what a token asks for once it was emitted
+ACTION_NOTHING = 0
+ACTION_INDENT_AT_START = 1
+ACTION_INDENT_AT_END = 2
+ACTION_INDENT_AT_NEXT = 3
+ACTION_BLOCK = 4
+
+_PRODUCE_ACTIONS = {
+    IndentType.at_start: ACTION_INDENT_AT_START,
+    IndentType.at_end: ACTION_INDENT_AT_END,
+    IndentType.at_next: ACTION_INDENT_AT_NEXT,
+}
+
+# pending work for the next token, same meaning as AtNextToken
+_PENDING_NOTHING = 0
+_PENDING_BLOCK = 1
+_PENDING_INDENT = 2
+
+_PENDING_STATES = {
+    _PENDING_NOTHING: AtNextToken.nothing,
+    _PENDING_BLOCK: AtNextToken.add_block,
+    _PENDING_INDENT: AtNextToken.add_indent_start,
+}
+
+
+class CompiledIndenter(Indenter):
+    """Drop in replacement of `Indenter`, subclasses declare the same
+    REGULAR_INDENT, INDENT_BLOCKS and PRODUCE_INDENT"""
+    actions : Dict[str, int]
+    end_ids : Dict[str, int]
+    block_info : Dict[str, Tuple[IndentType, int, str]]
+
+    def __init__(self, trace:bool=False, trace_size:int=256) -> None:
+        "`trace` and `trace_size` as for `Indenter`"
+        self.trace = IndenterTrace(trace_size) if trace else None
+        self.indent_type, self.dedent_type, self.separator_type = self.REGULAR_INDENT
+        self.produce_indent = self.PRODUCE_INDENT
+        self.indent_blocks = self.INDENT_BLOCKS
+        self.compile_tables()
+        self.reset()
+
+    def compile_tables(self)->None:
+        "Builds the action table and gives an id to every block end type"
+        self.actions = {}
+        self.end_ids = {}
+        self.end_types = [""]
+        self.block_info = {}
+        for token_type, (indent_place, end_type, separator_type) in self.indent_blocks.items():
+            end_id = self.end_ids.get(end_type)
+            if end_id is None:
+                end_id = len(self.end_types)
+                self.end_ids[end_type] = end_id
+                self.end_types.append(end_type)
+            self.block_info[token_type] = (indent_place, end_id, separator_type)
+            self.actions[token_type] = ACTION_BLOCK
+        # anon blocks take precedence, as in Indenter.process_indentation_start
+        for token_type, indent_place in self.produce_indent.items():
+            self.actions[token_type] = _PRODUCE_ACTIONS[indent_place]
+
+    def reset(self)->None:
+        self.levels = array("l")
+        self.kinds = array("b")
+        self.ends = array("l")
+        # only used to report errors and to close blocks
+        self.openers : List[Optional[Token]] = []
+        self.separators : List[str] = []
+        self.pending = _PENDING_NOTHING
+
+    @property
+    def stack_state(self)->List[Indentation]:
+        "The stack as `Indent`/`BlockStart` items, like the one of `Indenter`"
+        return [self._item(i) for i in range(len(self.levels))]
+
+    @stack_state.setter
+    def stack_state(self, items:List[Indentation])->None:
+        self.reset()
+        for item in items:
+            if isinstance(item, BlockStart):
+                self._push(item.level, KIND_BLOCK, self.end_ids[item.end_type], item.token, item.separator_type)
+            else:
+                self._push(item.level, KIND_INDENT, 0, None, self.separator_type)
+
+    @property
+    def state(self)->AtNextToken:
+        return _PENDING_STATES[self.pending]
+
+    @state.setter
+    def state(self, value:AtNextToken)->None:
+        for pending, state in _PENDING_STATES.items():
+            if state == value:
+                self.pending = pending
+
+    def _push(self, level:int, kind:int, end_id:int, opener:Optional[Token], separator:str)->None:
+        self.levels.append(level)
+        self.kinds.append(kind)
+        self.ends.append(end_id)
+        self.openers.append(opener)
+        self.separators.append(separator)
+
+    def _pop(self)->None:
+        self.levels.pop()
+        self.kinds.pop()
+        self.ends.pop()
+        self.openers.pop()
+        self.separators.pop()
+
+    def _item(self, i:int)->Indentation:
+        if self.kinds[i] == KIND_INDENT:
+            return Indent(self.levels[i])
+        opener = self.openers[i]
+        assert opener is not None
+        return BlockStart(opener, self.end_types[self.ends[i]], self.separators[i], self.levels[i])
+
+    def _push_indent(self, level:int, token:Token, trigger:Token)->Tuple[Token, Token]:
+        levels = self.levels
+        if len(levels) > 0:
+            if levels[-1] >= level:
+                raise UnexpectedIndentRegular(self._item(len(levels)-1), level, token, trigger)
+        elif level <= 0:
+            raise IndentationAtZero()
+        self.check_level(level, token, trigger)
+        self._push(level, KIND_INDENT, 0, None, self.separator_type)
+        if self.trace is not None:
+            self.trace.record(TraceAction.add_indent, token, len(levels))
+        return (self.make_indent(token, level), self.make_separator(token, level))
+
+    def _push_block(self, token:Token, trigger:Token)->Token:
+        levels = self.levels
+        column = token.column
+        if len(levels) > 0:
+            if levels[-1] >= column:
+                raise UnexpectedIndentBlock(self._item(len(levels)-1), column, token, trigger)
+        elif column <= 0:
+            raise IndentationAtZero()
+        indent_place, end_id, separator_type = self.block_info[trigger.type]
+        if indent_place == IndentType.at_start:
+            level = trigger.column
+        elif indent_place == IndentType.at_end:
+            level = trigger.end_column
+        else:
+            level = column
+        self.check_level(level, token, trigger)
+        self._push(level, KIND_BLOCK, end_id, trigger, separator_type)
+        if self.trace is not None:
+            self.trace.record(TraceAction.add_block, token, len(levels))
+        return Token(separator_type, "", token.start_pos, token.line, column, token.end_line, token.end_column, token.end_pos)
+
+    def _process(self, stream:Iterator[Token])->Iterator[Token]:
+        levels = self.levels
+        kinds = self.kinds
+        ends = self.ends
+        openers = self.openers
+        separators = self.separators
+        actions_get = self.actions.get
+        end_ids_get = self.end_ids.get
+        separator_type = self.separator_type
+        dedent_type = self.dedent_type
+        trace = self.trace
+
+        last_token = None
+        token = None
+        for token in stream:
+            column = token.column
+            if trace is not None:
+                trace.record(TraceAction.token, token, len(levels))
+            pending = self.pending
+            if pending == _PENDING_BLOCK:
+                if last_token is None :
+                    raise ReportBug()
+                yield self._push_block(token, last_token)
+                self.pending = _PENDING_NOTHING
+            elif pending == _PENDING_INDENT:
+                if last_token is None :
+                    raise ReportBug()
+                yield from self._push_indent(column, token, last_token)
+                self.pending = _PENDING_NOTHING
+            else:
+                while levels:
+                    level = levels[-1]
+                    if kinds[-1] == KIND_INDENT:
+                        if level == column:
+                            if trace is not None:
+                                trace.record(TraceAction.separator, token, len(levels))
+                            yield Token(separator_type, "", token.start_pos, token.line, column, token.end_line, token.end_column, token.end_pos)
+                            break
+                        elif level > column:
+                            if trace is not None:
+                                trace.record(TraceAction.dedent, token, len(levels))
+                            yield Token(dedent_type, "", token.start_pos, token.line, column, token.end_line, token.end_column, token.end_pos)
+                            self._pop()
+                        else:
+                            break
+                    elif ends[-1] == end_ids_get(token.type, 0):
+                        opener = openers[-1]
+                        if opener.column <= column:
+                            if trace is not None:
+                                trace.record(TraceAction.close_block, token, len(levels))
+                            self._pop()
+                            break
+                        raise ExpectedCloseToken(token, self._item(len(levels)-1), True)
+                    elif level > column:
+                        raise ExpectedCloseToken(token, self._item(len(levels)-1), False)
+                    elif level == column:
+                        if trace is not None:
+                            trace.record(TraceAction.separator, token, len(levels))
+                        yield Token(separators[-1], "", token.start_pos, token.line, column, token.end_line, token.end_column, token.end_pos)
+                        break
+                    else:
+                        break
+
+            action = actions_get(token.type, ACTION_NOTHING)
+            if action != ACTION_NOTHING:
+                if action == ACTION_BLOCK:
+                    if trace is not None:
+                        trace.record(TraceAction.wait_block, token, len(levels))
+                    self.pending = _PENDING_BLOCK
+                elif action == ACTION_INDENT_AT_NEXT:
+                    if trace is not None:
+                        trace.record(TraceAction.wait_indent, token, len(levels))
+                    self.pending = _PENDING_INDENT
+                elif action == ACTION_INDENT_AT_START:
+                    yield from self._push_indent(column, token, token)
+                else:
+                    yield from self._push_indent(token.end_column, token, token)
+            last_token = token
+            yield token
+
+        while levels:
+            if kinds[-1] == KIND_INDENT:
+                self._pop()
+                if trace is not None:
+                    trace.record(TraceAction.eof_dedent, token, len(levels))
+                yield self.make_dedent(token, token.end_column)
+            else:
+                item = self._item(len(levels)-1)
+                self._pop()
+                end_token = self.make_with_level(token, "$END", token.end_column)
+                raise ExpectedCloseToken(end_token, item, False)
+
+    def process(self, stream:Iterator[Token])->Iterator[Token]:
+        self.reset()
+        if self.trace is not None:
+            self.trace.clear()
+            return self._process_traced(stream)
+        return self._process(stream)
+
+
+def main(argv:List[str])->None:
+    "Times `Indenter` against `CompiledIndenter` on a deeply nested generated source"
+    from lark import Lark
+
+    lines = int(argv[1]) if len(argv) > 1 else 5000
+    depth = int(argv[2]) if len(argv) > 2 else 20
+
+    grammar = r"""
+        %declare _INDENT _DEDENT _NL _LET_SEPARATOR
+        %ignore /(\s|\r?\n)+/
+        WORD : /\S+/
+        start : WORD
+        """
+    keywords = {"let": "LET", "in": "IN", "match": "MATCH", "of": "OF"}
+    lexer = Lark(grammar, parser="lalr", lexer="basic",
+        lexer_callbacks={"WORD": lambda t: Token.new_borrow_pos(keywords.get(t.value, "WORD"), t.value, t)})
+
+    def source_lines()->Iterator[str]:
+        # `depth` nested `let` blocks, each body is a `match ... of` whose
+        # first case holds the next `let`, the other cases close them
+        written = 0
+        while written < lines:
+            case_columns = []
+            column = 0
+            for _ in range(depth):
+                pad = " " * column
+                yield pad + "let"
+                yield pad + "    a = b"
+                yield pad + "    c = d"
+                head = "  in match a of "
+                yield pad + head + "x -> y"
+                column += len(head)
+                case_columns.append(column)
+                written += 4
+            for column in reversed(case_columns):
+                yield " " * column + "z -> w"
+                written += 1
+
+    source = "\n".join(source_lines())
+    tokens = list(lexer.lex(source, dont_ignore=False))
+
+    class LetMatch():
+        REGULAR_INDENT = ("_INDENT", "_DEDENT", "_NL")
+        INDENT_BLOCKS = {"LET": (IndentType.at_next, "IN", "_LET_SEPARATOR")}
+        PRODUCE_INDENT = {"IN": IndentType.at_next, "OF": IndentType.at_next}
+
+    class Regular(LetMatch, Indenter):
+        pass
+
+    class Compiled(LetMatch, CompiledIndenter):
+        pass
+
+    timings = {}
+    outputs = {}
+    for name, cls in (("Indenter", Regular), ("CompiledIndenter", Compiled)):
+        best = None
+        for _ in range(5):
+            start = time.perf_counter()
+            out = list(cls().process(iter(tokens)))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        outputs[name] = [(t.type, t.value, t.column) for t in out]
+
+    assert outputs["Indenter"] == outputs["CompiledIndenter"]
+    print(f"{lines} lines, let/match depth {depth}, {len(tokens)} tokens in")
+    for name, elapsed in timings.items():
+        print(f"{name:<17}: {elapsed*1000:.2f} ms")
+    print(f"speedup          : {timings['Indenter']/timings['CompiledIndenter']:.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,7 +1,8 @@
 "Provides Indentation services for languages with indentation similar to Haskell"
 
 from abc import ABC, abstractmethod
-from typing import List, Iterator, Tuple, Dict, Optional
+from typing import List, Iterator, Tuple, Dict, Optional, Deque
+from collections import deque
 from enum import Enum, auto
 import logging
 
@@ -12,14 +13,6 @@ from lark.lark import PostLex
 from lark.lexer import Token
 
 log =logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
-log_handler = logging.StreamHandler()
-log_handler.setLevel(logging.DEBUG)
-log_format = logging.Formatter("%(filename)s-%(funcName)s-%(lineno)d: %(message)s")
-log_handler.setFormatter(log_format)
-log.addHandler(log_handler)
-
-logb = log.debug
 
 
 class AtNextToken(Enum):
@@ -32,13 +25,51 @@ class IndentType(Enum):
     at_end = auto()
     at_next = auto()
 
+def token_at_level(_type:str, token:Token, level:int)->Token:
+    """An empty token at column `level` of the line of `token`, the level can
+    be behind the token (but not on another line) so its offset is moved too"""
+    start_pos = None if token.start_pos is None else token.start_pos + level - token.column
+    return Token(_type, "", start_pos, token.line, level, token.line, level, start_pos)
+
 def show_token(token:Token):
     return f"{repr(token)} at line {token.line}, column {token.column}"
 
+class TraceAction(Enum):
+    token = auto()
+    separator = auto()
+    dedent = auto()
+    close_block = auto()
+    add_indent = auto()
+    add_block = auto()
+    wait_indent = auto()
+    wait_block = auto()
+    eof_dedent = auto()
+
+TraceEvent = Tuple[TraceAction, Token, int]
+
+class IndenterTrace():
+    "Ring buffer with the last decisions (action, token, stack depth) of an Indenter"
+    events : Deque[TraceEvent]
+
+    def __init__(self, size:int)->None:
+        self.events = deque(maxlen=size)
+
+    def record(self, action:TraceAction, token:Token, depth:int)->None:
+        self.events.append((action, token, depth))
+
+    def clear(self)->None:
+        self.events.clear()
+
+    def __str__(self):
+        lines = [f"{action.name:<12} depth={depth} {show_token(token)}" for (action, token, depth) in self.events]
+        return "indenter trace (oldest first):\n    " + "\n    ".join(lines)
+
 class IndenterError(Exception):
     token : Token
     pre_msg :str
     post_msg :str
+    # filled with the recorded events when the Indenter was built with tracing
+    trace : Optional[List[TraceEvent]] = None
 
 class ExpectedCloseToken(IndenterError):
     item : "BlockStart"
@@ -137,16 +168,7 @@ class BlockStart(Indentation):
 
     def make_with_level(self,token:Token, level:Optional[int]=None)->Token:
         if level :
-            tok = Token(self.separator_type, "")
-            tok.column = level
-            tok.end_column = level
-            tok.line = token
-            tok.end_line = token
-            # we don't know this and can't just borrow token as token position could
-            #be behind level (but not further)
-            #tok.start_pos = -1
-            #tok.end_pos = -1
-            return tok
+            return token_at_level(self.separator_type, token, level)
         return Token.new_borrow_pos(self.separator_type,"",token)
 
     def __repr__(self):
@@ -156,8 +178,12 @@ class BlockStart(Indentation):
 class Indenter(PostLex, ABC):
     stack_state :List[Token]
     state: AtNextToken
+    trace: Optional[IndenterTrace]
 
-    def __init__(self) -> None:
+    def __init__(self, trace:bool=False, trace_size:int=256) -> None:
+        """With `trace` every decision is recorded in a ring buffer of `trace_size`
+        events that is attached to (and logged with) any raised IndenterError"""
+        self.trace = IndenterTrace(trace_size) if trace else None
         self.stack_state = []
         self.state = AtNextToken.nothing
         self.indent_type, self.dedent_type, self.separator_type = self.REGULAR_INDENT
@@ -167,16 +193,7 @@ class Indenter(PostLex, ABC):
 
     def make_with_level(self,token:Token, _type:str, level:Optional[int]=None)->Token:
         if level :
-            tok = Token(_type, "")
-            tok.column = level
-            tok.end_column = level
-            tok.line = token
-            tok.end_line = token
-            # we don't know this and can't just borrow token as token position could
-            #be behind level (but not further)
-            #tok.start_pos = -1
-            #tok.end_pos = -1
-            return tok
+            return token_at_level(_type, token, level)
         return Token.new_borrow_pos(_type,"",token)
 
     def make_separator(self,token:Token, level:Optional[int]=None)->Token:
@@ -191,51 +208,57 @@ class Indenter(PostLex, ABC):
     def handle_token_indentation(self, token)->Iterator[Token]:
         """traverses stack until lower indentation is found or raises errors on bad states"""
         assert token.column>=0
+        trace = self.trace
         if len(self.stack_state)== 0 :
-            logb("stack is empty, accepting token")
+            # stack is empty, accepting token
             return token 
 
-        logb("loop start")
         while len(self.stack_state) != 0:
             item = self.stack_state[-1]
-            logb(f"top item={repr(item)}")
 
             if isinstance(item,Indent):
                 if item.level == token.column :
-                    logb("token is at level of stack item, injecting separator")
+                    # token is at level of stack item, injecting separator
+                    if trace is not None:
+                        trace.record(TraceAction.separator, token, len(self.stack_state))
                     yield self.make_separator(token)
                     break
                 elif item.level > token.column :
-                    logb("stack item is further indented than token, inject dedent and pop item")
+                    # stack item is further indented than token, inject dedent and pop item
+                    if trace is not None:
+                        trace.record(TraceAction.dedent, token, len(self.stack_state))
                     yield self.make_dedent(token)
                     self.stack_state.pop()
                 else:
-                    logb("token is further indented than stack item, inlining token")
+                    # token is further indented than stack item, inlining token
                     break
             elif isinstance(item,BlockStart):
                 if item.match(token):
-                    logb(f"{repr(item)} is closed by {show_token(token)}")
                     #if item.token.column.level <= token.column:
                     if item.token.column <= token.column:
-                        logb("token is further indented than stack item, poping item")
+                        # token closes the block and is further indented than it, poping item
                         #we could inject a separator before end, but we choose to don't
                         #yield item.make_separator(token)
+                        if trace is not None:
+                            trace.record(TraceAction.close_block, token, len(self.stack_state))
                         self.stack_state.pop()
                         break
                     elif item.level > token.column:
-                        logb("stack item is further indented than token, bad indent for closing item")
+                        # stack item is further indented than token, bad indent for closing item
                         raise ExpectedCloseToken(token, item, True)
                 else:
-                    logb("token won't close item")
+                    # token won't close item
                     if item.level > token.column:
-                        logb("stack item is further indented than token, indentation error or missing close token")
+                        # indentation error or missing close token
                         raise ExpectedCloseToken(token, item, False)
                     elif item.level == token.column:
-                        logb("token is at same level of stack item, injecting separator ")
+                        # token is at same level of stack item, injecting separator
+                        if trace is not None:
+                            trace.record(TraceAction.separator, token, len(self.stack_state))
                         yield item.make_separator(token)
                         break
                     else:
-                        logb("token further indented than stack item, inlining token")
+                        # token further indented than stack item, inlining token
                         break
             else:
                 raise ReportBug()
@@ -276,33 +299,28 @@ class Indenter(PostLex, ABC):
 
 
     def add_indent_token(self, level:int, current_stream_token: Token,token_that_trigger_add:Token)->List[Token]:
-        logb(f"got : {level}, {show_token(current_stream_token)}, {show_token(token_that_trigger_add)}")
         if len(self.stack_state)>0:
             last_item = self.stack_state[-1]
-            logb("stack isn't empty, check if token is indented further")
+            # stack isn't empty, check if token is indented further
             if last_item.level >= level:
-                logb("new indent level is too short")
                 raise UnexpectedIndentRegular(last_item,level, current_stream_token, token_that_trigger_add)
         else : 
             if level<=0:
                 raise IndentationAtZero()
 
-        logb(f"{level}, {show_token(current_stream_token)}")
-
         self.check_level(level, current_stream_token, token_that_trigger_add)
 
         item = Indent(level)
-        logb("adding Indent to stack")
         self.stack_state.append(item)
-        logb(f"injecting anon indent for {show_token(current_stream_token)} with level={level}, injection separator")
+        if self.trace is not None:
+            self.trace.record(TraceAction.add_indent, current_stream_token, len(self.stack_state))
         return [self.make_indent(current_stream_token, level), self.make_separator(current_stream_token, level)]
 
     def add_indent_block(self, token:Token,last_token:Token)->List[Token]:
         if len(self.stack_state)>0:
             last_item = self.stack_state[-1]
-            logb("stack isn't empty, check if token is indented further")
+            # stack isn't empty, check if token is indented further
             if last_item.level >= token.column:
-                logb("new indent level is too short")
                 raise UnexpectedIndentBlock(last_item, token.column , token, last_token)
         else : 
             if token.column<=0:
@@ -310,127 +328,118 @@ class Indenter(PostLex, ABC):
 
         block = self.indent_blocks.get(last_token.type)
         if block is None :
-            logb("we had tested before that last_token is part of named block producers, this only makes sense on bug")
+            # we had tested before that last_token is part of named block producers, this only makes sense on bug
             raise ReportBug()
         indent_place,end_type,separator_type = block
-        logb(f"named block info: indent={indent_place}, ends_at={end_type}, produce_separators={separator_type}")
         if indent_place == IndentType.at_start:
-            logb(f"set level at start of {show_token(last_token)}")
             level = last_token.column
         elif indent_place == IndentType.at_end:
-            logb(f"set level at end of {show_token(last_token)}")
             level = last_token.column_end
         elif indent_place == IndentType.at_next:
-            logb(f"set level at start of {show_token(token)}")
             level = token.column
         else :
-            logb("We expect indent_place to be a IndentType and had just this cases")
+            # We expect indent_place to be a IndentType and had just this cases
             raise ReportBug()
 
         self.check_level(level, token, last_token)
 
         block_item = BlockStart(last_token, end_type, separator_type, level)
-        logb("adding BlockStart to stack")
         self.stack_state.append(block_item)
-        logb(f"injecting separator at {token}")
+        if self.trace is not None:
+            self.trace.record(TraceAction.add_block, token, len(self.stack_state))
         return [block_item.make_separator(token)]
 
     def process_indentation_start(self, token:Token)->Tuple[AtNextToken, List[Token]]:
         """finds if indentation must be added to stack and returns state"""
-        logb("testing if token is an anon block producer")
         maybe_type = self.produce_indent.get(token.type)
         if maybe_type is None:
-            logb("testing if token is a named block producer")
             maybe_block_tuple = self.indent_blocks.get(token.type)
             if maybe_block_tuple is None :
-                logb("token wasn't a block producer")
+                # token wasn't a block producer
                 return (AtNextToken.nothing, [])
             else :
-                logb("set state to add named block at next token")
+                # add named block at next token
+                if self.trace is not None:
+                    self.trace.record(TraceAction.wait_block, token, len(self.stack_state))
                 return (AtNextToken.add_block,[])
         else:
             if maybe_type == IndentType.at_start:
-                logb("adding anon block at token start={token.column}")
                 out_tokens = self.add_indent_token(token.column, token, token)
                 return (AtNextToken.nothing, out_tokens)
             elif maybe_type == IndentType.at_end:
-                logb("adding anon block at token end={token.column_end}")
                 out_tokens = self.add_indent_token(token.column_end,token, token )
                 return (AtNextToken.nothing, out_tokens)
             elif maybe_type == IndentType.at_next:
-                logb("set state to add anon block at next token")
+                # add anon block at next token
+                if self.trace is not None:
+                    self.trace.record(TraceAction.wait_indent, token, len(self.stack_state))
                 return (AtNextToken.add_indent_start, [])
             else:
                 raise ReportBug()
 
     def _process(self, stream:Iterator[Token])->Iterator[Token]:
         last_token = None
+        trace = self.trace
         for token in stream:
-            logb(f"for begins with {show_token(token)}")
-            logb(f"state : {repr(self)}")
+            if trace is not None:
+                trace.record(TraceAction.token, token, len(self.stack_state))
             if self.state == AtNextToken.add_block:
                 #we need to add the new token before match indentation or we loose info.
                 if last_token is None :
                     raise ReportBug()
 
-                logb(f"adding block started by {show_token(last_token)}, at level of {show_token(token)}")
-                to_inject= self.add_indent_block(token,last_token)
-                for tok in to_inject:
-                    logb(f"yield inyected token {tok}")
-                    yield tok
-                logb("state set to nothing")
+                yield from self.add_indent_block(token,last_token)
                 self.state = AtNextToken.nothing
 
             elif self.state == AtNextToken.add_indent_start:
                 if last_token is None :
                     raise ReportBug()
 
-                logb(f"adding anon block started by {show_token(last_token)}, at level of {show_token(token)}")
-                to_inject = self.add_indent_token(token.column, token, last_token)
-                for tok in to_inject:
-                    logb(f"yield inyected token {show_token(tok)}")
-                    yield tok
-                logb("state set to nothing")
+                yield from self.add_indent_token(token.column, token, last_token)
                 self.state = AtNextToken.nothing
             
             else:
                 #there wasn't a pending order to add indentation at this token, so we only care of 
                 #indentation stack
-                logb(f"checking if we need to dedent {show_token(token)}")
                 yield from self.handle_token_indentation(token) 
 
-            
-            logb("pending emits of new blocks or dedents were handled")
-            logb("testing if we need to inject tokens or set state")
+            # pending emits of new blocks or dedents were handled,
+            # testing if we need to inject tokens or set state
             self.state,inject = self.process_indentation_start(token)
-            if len(inject ) ==0:
-                logb("Nothing to inject")
-            else :
-                for tok in inject:
-                    logb(f"yielding {show_token(tok)}")
-                    yield tok
+            yield from inject
             last_token = token
             yield token
 
-        logb(f"reached EOF handling end state : {repr(self)}")
+        # reached EOF handling end state
         while len (self.stack_state) !=0:
             item = self.stack_state.pop()
-            logb(f"handling {repr(item)}")
             if isinstance(item, Indent):
-                logb("yield inject dedent")
+                if trace is not None:
+                    trace.record(TraceAction.eof_dedent, token, len(self.stack_state))
                 yield self.make_dedent(token, token.end_column)
             elif isinstance(item, BlockStart):
-                logb("Missing at least {item.end_type} to close this block")
-                end_token = self.make_with_level(token, token.end_column)
-                end_token.type = "$END"
+                # Missing at least item.end_type to close this block
+                end_token = self.make_with_level(token, "$END", token.end_column)
                 raise ExpectedCloseToken(end_token, item, False)
             else:
                 raise ReportBug()
 
+    def _process_traced(self, stream:Iterator[Token])->Iterator[Token]:
+        "Runs `_process` and hands the recorded trace to any IndenterError"
+        try:
+            yield from self._process(stream)
+        except IndenterError as e:
+            e.trace = list(self.trace.events)
+            log.debug("%s", self.trace)
+            raise
+
 
 
     def process(self, stream:Iterator[Token])->Iterator[Token]:
         self.stack_state = []
+        if self.trace is not None:
+            self.trace.clear()
+            return self._process_traced(stream)
         return self._process(stream)
 
     # XXX Hack for ContextualLexer. Maybe there's a more elegant solution?
@@ -0,0 +1,328 @@
+"""On disk cache of parse trees, addressed by the content of the source.
+
+An entry is keyed by the hash of the source text and of the parser tables
+key of `load_parser` (grammar, lark version, options and indenter
+settings), so editing the grammar or the indenter never returns a stale
+tree. Trees are stored as a flat post-order code of rule and token type ids
+with the offsets of the tokens; token values are sliced back from the text
+on load, which is why the text is needed to read an entry. The code is
+stored after the sha256 digest of its marshalled bytes, an entry whose
+digest doesn't match is a miss and gets overwritten.
+
+Files are written with `parser._atomic_write`, so concurrent builds at
+worst write the same entry twice. The modification time of an entry is its
+last use, the least recently used ones are removed when the cache grows
+over `max_bytes`."""
+
+import os
+import sys
+import time
+import marshal
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from lark import Lark, Token, Tree
+
+from .parser import load_parser, cache_dir_path, _atomic_write
+from .token_buffer import line_table
+
+FORMAT_VERSION = 2
+DIGEST_SIZE = hashlib.sha256().digest_size
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# pruning goes below the bound so it doesn't run again on the next store
+PRUNE_TO = 0.9
+
+_NONE = -1
+
+
+def encode_tree(tree:Tree)->Tuple[List[str], List[int]]:
+    """The names used by `tree` and its post-order code: a token is its type
+    id and its start and end offsets, a missing optional child is -1 and a
+    tree with n children is -2-n followed by the id of its rule"""
+    ids : Dict[str, int] = {}
+    code : List[int] = []
+    append = code.append
+
+    def name_id(name:str)->int:
+        i = ids.get(name)
+        if i is None:
+            # rule names are `Token`s, which marshal doesn't take
+            i = ids[str(name)] = len(ids)
+        return i
+
+    # (node, children done)
+    stack : List[Tuple[Any, bool]] = [(tree, False)]
+    while stack:
+        node, done = stack.pop()
+        if node is None:
+            append(_NONE)
+        elif isinstance(node, Token):
+            append(name_id(node.type))
+            append(node.start_pos)
+            append(node.end_pos)
+        elif done:
+            append(-2 - len(node.children))
+            append(name_id(node.data))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+    return list(ids), code
+
+
+def decode_tree(text:str, names:List[str], code:List[int])->Tree:
+    "The tree `encode_tree` gave `names` and `code` for, over the same `text`"
+    line_starts = line_table(text)
+    last_line = len(line_starts) - 1
+    stack : List[Any] = []
+    push = stack.append
+    new_token = str.__new__
+    new_tree = Tree.__new__
+    line = 0
+    ops = iter(code)
+    for op in ops:
+        if op >= 0:
+            start = next(ops)
+            end = next(ops)
+            # tokens come in text order, lines are followed with a cursor
+            while line < last_line and line_starts[line + 1] <= start:
+                line += 1
+            end_line = line
+            while end_line < last_line and line_starts[end_line + 1] <= end:
+                end_line += 1
+            value = text[start:end]
+            # what `Token.__init__` would set, without its argument handling
+            token = new_token(Token, value)
+            token.type = names[op]
+            token.value = value
+            token.start_pos = start
+            token.line = line + 1
+            token.column = start - line_starts[line] + 1
+            token.end_line = end_line + 1
+            token.end_column = end - line_starts[end_line] + 1
+            token.end_pos = end
+            push(token)
+        elif op == _NONE:
+            push(None)
+        else:
+            count = -2 - op
+            if count:
+                children = stack[-count:]
+                del stack[-count:]
+            else:
+                children = []
+            tree = new_tree(Tree)
+            tree.data = names[next(ops)]
+            tree.children = children
+            tree._meta = None
+            push(tree)
+    if len(stack) != 1 or not isinstance(stack[0], Tree):
+        raise ValueError(f"code leaves {len(stack)} nodes")
+    return stack[0]
+
+
+class CacheStats():
+    "Counters of one `ParseCache`, `metrics` formats them for a scraper"
+    hits : int
+    misses : int
+    stores : int
+    evictions : int
+    errors : int
+    bytes_read : int
+    bytes_written : int
+
+    def __init__(self)->None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def as_dict(self)->Dict[str, int]:
+        return dict(vars(self))
+
+    @property
+    def hit_rate(self)->float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def metrics(self, prefix:str="pydayuri_parse_cache")->str:
+        "The counters in the Prometheus text format"
+        lines = []
+        for name, value in self.as_dict().items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def __repr__(self):
+        return f"CacheStats({', '.join(f'{k}={v}' for k, v in self.as_dict().items())})"
+
+
+class ParseCache():
+    """Parses with the parser of `load_parser`, returning cached trees for
+    texts it has already seen"""
+    directory : str
+    max_bytes : int
+    parser : Lark
+    grammar_key : str
+    stats : CacheStats
+    # estimate of the size of the directory, None until it is scanned
+    _size : Optional[int]
+
+    def __init__(self, cache_dir:Optional[str]=None, max_bytes:int=DEFAULT_MAX_BYTES, **options)->None:
+        self.parser, report = load_parser(cache_dir=cache_dir, **options)
+        self.grammar_key = report.key
+        self.directory = os.path.join(cache_dir_path(cache_dir), "trees")
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._size = None
+
+    def key(self, text:str)->str:
+        h = hashlib.sha256(self.grammar_key.encode("ascii"))
+        h.update(text.encode("utf8", "surrogatepass"))
+        return h.hexdigest()
+
+    def path(self, key:str)->str:
+        return os.path.join(self.directory, key[:2], key + ".tree")
+
+    def load(self, text:str, key:Optional[str]=None)->Optional[Tree]:
+        path = self.path(key or self.key(text))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.stats.misses += 1
+            return None
+        try:
+            digest, payload = data[:DIGEST_SIZE], data[DIGEST_SIZE:]
+            if hashlib.sha256(payload).digest() != digest:
+                raise ValueError("digest mismatch")
+            version, names, code = marshal.loads(payload)
+            if version != FORMAT_VERSION:
+                raise ValueError(version)
+            tree = decode_tree(text, names, code)
+        except (ValueError, TypeError, EOFError, IndexError, KeyError, StopIteration):
+            self.stats.errors += 1
+            self.stats.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats.hits += 1
+        self.stats.bytes_read += len(data)
+        return tree
+
+    def store(self, text:str, tree:Tree, key:Optional[str]=None)->None:
+        names, code = encode_tree(tree)
+        payload = marshal.dumps((FORMAT_VERSION, names, code))
+        data = hashlib.sha256(payload).digest() + payload
+        try:
+            _atomic_write(self.path(key or self.key(text)), data)
+        except OSError:
+            # a read only cache must not stop us from parsing
+            self.stats.errors += 1
+            return
+        self.stats.stores += 1
+        self.stats.bytes_written += len(data)
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.prune()
+
+    def parse(self, text:str)->Tree:
+        "The tree of `text`, parse errors are raised and not cached"
+        key = self.key(text)
+        tree = self.load(text, key)
+        if tree is None:
+            tree = self.parser.parse(text)
+            self.store(text, tree, key)
+        return tree
+
+    def parse_file(self, path:str)->Tree:
+        with open(path, encoding="utf8") as f:
+            return self.parse(f.read())
+
+    def _entries(self)->List[Tuple[float, int, str]]:
+        entries = []
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".tree"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                # another process pruned the shard
+                continue
+        return entries
+
+    def size(self)->int:
+        return sum(size for _, size, _ in self._entries())
+
+    def prune(self, max_bytes:Optional[int]=None)->int:
+        """Removes the least recently used entries until the cache is under
+        `max_bytes` (by default a bit less than the bound), returns how many"""
+        if max_bytes is None:
+            max_bytes = int(self.max_bytes * PRUNE_TO)
+        entries = self._entries()
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # removed by a concurrent build
+                pass
+            total -= size
+        self.stats.evictions += removed
+        self._size = total
+        return removed
+
+    def clear(self)->int:
+        return self.prune(0)
+
+
+def main(argv:List[str])->None:
+    "Parses the given files through the cache twice and reports both runs"
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.parse_cache", description=main.__doc__)
+    arg_parser.add_argument("files", nargs="*")
+    arg_parser.add_argument("--cache-dir", default=None)
+    arg_parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20)
+    arg_parser.add_argument("--clear", action="store_true", help="remove every entry first")
+    arg_parser.add_argument("--metrics", action="store_true", help="print the counters for a scraper")
+    args = arg_parser.parse_args(argv[1:])
+
+    cache = ParseCache(args.cache_dir, int(args.max_mb * 2**20))
+    if args.clear:
+        print(f"removed {cache.clear()} entries")
+    texts = []
+    for path in args.files:
+        with open(path, encoding="utf8") as f:
+            texts.append(f.read())
+    for run in ("first", "second"):
+        start = time.perf_counter()
+        for text in texts:
+            cache.parse(text)
+        print(f"{run:6} run : {(time.perf_counter() - start)*1000:9.2f} ms")
+    if args.metrics:
+        print(cache.stats.metrics(), end="")
+    else:
+        print(cache.stats)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,199 @@
+"Builds the Dayuri LALR parser, keeping the analysed tables in an on disk cache"
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import lark
+from lark import Lark
+from lark.grammar import Rule
+from lark.indenter import Indenter
+from lark.lexer import TerminalDef
+
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.lark")
+
+CACHE_ENV = "PYDAYURI_CACHE"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pydayuri")
+
+DEFAULT_OPTIONS : Dict[str, Any] = {"parser": "lalr", "maybe_placeholders": True}
+
+# Options that don't change the tables, they are given again each time a
+# parser is loaded from cache and must not be part of the cache key.
+RUNTIME_OPTIONS = ("postlex", "transformer", "lexer_callbacks", "debug",
+    "propagate_positions", "tree_class")
+
+# the cache file is the digest of the pickled tables followed by them
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+# marks that `load_parser` must create a new `TreeIndenter`
+DEFAULT_POSTLEX = object()
+
+
+class TreeIndenter(Indenter):
+    NL_type = '_NL'
+    OPEN_PAREN_types : List[str]= []
+    CLOSE_PAREN_types : List[str] = []
+    INDENT_type = '_INDENT'
+    DEDENT_type = '_DEDENT'
+    tab_len = 4
+
+
+class LoadReport():
+    "How a parser was obtained by `load_parser`"
+    key : str
+    path : str
+    from_cache : bool
+    seconds : float
+
+    def __init__(self, key:str, path:str, from_cache:bool, seconds:float)->None:
+        self.key = key
+        self.path = path
+        self.from_cache = from_cache
+        self.seconds = seconds
+
+    def __repr__(self):
+        kind = "warm" if self.from_cache else "cold"
+        return f"LoadReport({kind}, seconds={self.seconds:.4f}, path={self.path})"
+
+
+def read_grammar(path:str=GRAMMAR_PATH)->str:
+    with open(path, encoding="utf8") as f:
+        return f.read()
+
+
+def postlex_settings(postlex:Any)->Dict[str, Any]:
+    """The configuration of a postlexer as plain data, its class and the
+    upper case attributes that drive it"""
+    if postlex is None:
+        return {}
+    cls = type(postlex)
+    settings : Dict[str, Any] = {"class": cls.__qualname__}
+    for name in dir(cls):
+        if name.isupper() or name.endswith("_type") or name.endswith("_types") or name == "tab_len":
+            value = getattr(postlex, name)
+            if not callable(value):
+                settings[name] = value
+    settings["always_accept"] = tuple(getattr(postlex, "always_accept", ()))
+    return settings
+
+
+def cache_key(grammar:str, options:Dict[str, Any], postlex:Any=None)->str:
+    "Hash of everything the serialized tables depend on"
+    table_options = {k: v for k, v in options.items() if k not in RUNTIME_OPTIONS}
+    h = hashlib.sha256()
+    h.update(grammar.encode("utf8"))
+    h.update(lark.__version__.encode("utf8"))
+    h.update(repr(sorted(table_options.items())).encode("utf8"))
+    h.update(repr(sorted(postlex_settings(postlex).items())).encode("utf8"))
+    return h.hexdigest()
+
+
+def cache_dir_path(cache_dir:Optional[str]=None)->str:
+    if cache_dir is not None:
+        return cache_dir
+    return os.environ.get(CACHE_ENV, DEFAULT_CACHE_DIR)
+
+
+def _atomic_write(path:str, data:bytes)->None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _try_load(path:str, key:str, runtime:Dict[str, Any])->Optional[Lark]:
+    """The parser stored at `path`, None when there is none or it can't be
+    used, then the caller builds it again and overwrites the file"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # a damaged file can still unpickle to tables that fail only when parsing
+        digest, payload = data[:DIGEST_SIZE], data[DIGEST_SIZE:]
+        if hashlib.sha256(payload).digest() != digest:
+            return None
+        stored = pickle.loads(payload)
+        if not isinstance(stored, dict) or stored.get("key") != key:
+            return None
+        if stored.get("postlex") != postlex_settings(runtime.get("postlex")):
+            return None
+        inst = Lark.__new__(Lark)
+        return inst._load(stored["tables"], **runtime)
+    except Exception:
+        # a corrupted file can fail anywhere in unpickling or in `_load`
+        return None
+
+
+def _store(path:str, key:str, parser:Lark, postlex:Any)->None:
+    data, memo = parser.memo_serialize([TerminalDef, Rule])
+    data["options"] = {n: v for n, v in data["options"].items() if n not in RUNTIME_OPTIONS}
+    stored = {
+        "key": key,
+        "lark_version": lark.__version__,
+        "postlex": postlex_settings(postlex),
+        "tables": {"data": data, "memo": memo},
+    }
+    payload = pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL)
+    _atomic_write(path, hashlib.sha256(payload).digest() + payload)
+
+
+def load_parser(grammar_path:str=GRAMMAR_PATH, cache_dir:Optional[str]=None,
+        rebuild:bool=False, postlex:Any=DEFAULT_POSTLEX, **options)->Tuple[Lark, LoadReport]:
+    """Returns the parser for `grammar_path`, built from the cached tables when
+    the grammar, lark version, options and postlexer didn't change.
+
+    `postlex` defaults to a fresh `TreeIndenter` (None parses without one),
+    `rebuild` skips the cache lookup, the new tables are stored anyway."""
+    start_time = time.perf_counter()
+    if postlex is DEFAULT_POSTLEX:
+        postlex = TreeIndenter()
+    all_options = dict(DEFAULT_OPTIONS)
+    all_options.update(options)
+    all_options["postlex"] = postlex
+
+    grammar = read_grammar(grammar_path)
+    key = cache_key(grammar, all_options, postlex)
+    path = os.path.join(cache_dir_path(cache_dir), f"grammar-{key}.pickle")
+    runtime = {k: v for k, v in all_options.items() if k in RUNTIME_OPTIONS}
+
+    parser = None if rebuild else _try_load(path, key, runtime)
+    from_cache = parser is not None
+    if parser is None:
+        parser = Lark(grammar, **all_options)
+        try:
+            _store(path, key, parser, postlex)
+        except OSError:
+            # a read only cache must not stop us from parsing
+            pass
+
+    report = LoadReport(key, path, from_cache, time.perf_counter() - start_time)
+    return parser, report
+
+
+def get_parser(**options)->Lark:
+    return load_parser(**options)[0]
+
+
+def main(argv:List[str])->None:
+    "Reports the cold (build) and warm (cache) load times of the parser"
+    cache_dir = argv[1] if len(argv) > 1 else None
+    _, cold = load_parser(cache_dir=cache_dir, rebuild=True)
+    _, warm = load_parser(cache_dir=cache_dir)
+    print(f"cold load : {cold.seconds*1000:.2f} ms")
+    print(f"warm load : {warm.seconds*1000:.2f} ms (from cache: {warm.from_cache})")
+    print(f"cache     : {warm.path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,253 @@
+"""Peano shaped data types, represented by Python ints.
+
+A data type without variables whose constructors are a nullary one and a
+unary one taking the type itself (`data nat = Z | S nat`) has exactly the
+natural numbers as values, so backends given a `Peano` use ints for
+them: `Z` is 0, `S n` is `n + 1`, and the patterns `Z` and `S p` are
+`v == 0` and `v > 0` with `p` matched against `v - 1`.
+
+That alone still has `add` recursing once per unit. `Peano.arithmetic`
+also recognises functions of two arguments whose clauses are all equations
+of addition (or of multiplication over a recognised addition), that match
+every pair of numbers and whose recursion terminates. Such a function is
+that operation whatever the order of its clauses, so backends replace it
+with `+` or `*` and `mul` takes the time of the arithmetic, not of the
+value."""
+
+import sys
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from .syntax import (Path, PatternHole, PatternGroup, PatternApplication, ExpGroup, Annotated,
+    Application, TypeScheme, DataType, application_spine)
+from .runtime import Program
+
+ADD = "add"
+MUL = "mul"
+
+# forms of patterns and expressions the recognition looks at
+ZERO = "zero"
+SUCC = "succ"
+VAR = "var"
+CALL = "call"
+
+Form = Tuple[Any, ...]
+
+
+class PeanoType():
+    name : str
+    zero : str
+    successor : str
+
+    def __init__(self, name:str, zero:str, successor:str)->None:
+        self.name = name
+        self.zero = zero
+        self.successor = successor
+
+    def __repr__(self):
+        return f"PeanoType({self.name!r}, {self.zero!r}, {self.successor!r})"
+
+
+def _is_self(argument:Any, name:str)->bool:
+    kind = argument.type
+    if isinstance(kind, TypeScheme):
+        if kind.variables:
+            return False
+        kind = kind.type
+        return type(kind) is Path and kind.name == name
+    return str(kind) == name
+
+
+def peano_type(data:DataType)->Optional[PeanoType]:
+    "The Peano shape of `data` if it has one"
+    if data.variables or len(data.constructors) != 2:
+        return None
+    zero, successor = sorted(data.constructors, key=lambda c: len(c.args))
+    name = str(data.name)
+    if len(zero.args) != 0 or len(successor.args) != 1 or not _is_self(successor.args[0], name):
+        return None
+    return PeanoType(name, str(zero.name), str(successor.name))
+
+
+class Peano():
+    "The Peano types of a program and its functions that are their arithmetic"
+    types : List[PeanoType]
+    zeros : Dict[str, PeanoType]
+    successors : Dict[str, PeanoType]
+    # function name: ADD or MUL
+    arithmetic : Dict[str, str]
+
+    def __init__(self, program:Program)->None:
+        self.program = program
+        self.types = []
+        self.zeros = {}
+        self.successors = {}
+        self.arithmetic = {}
+        for data in program.data.values():
+            peano = peano_type(data)
+            if peano is not None:
+                self.types.append(peano)
+                self.zeros[peano.zero] = peano
+                self.successors[peano.successor] = peano
+        for peano in self.types:
+            additions = [name for name in program.functions if self._recognise(name, peano, ADD, ())]
+            for name in additions:
+                self.arithmetic[name] = ADD
+            for name in program.functions:
+                if name not in self.arithmetic and self._recognise(name, peano, MUL, tuple(additions)):
+                    self.arithmetic[name] = MUL
+
+    def _pattern(self, pattern:Any, peano:PeanoType)->Optional[Form]:
+        while type(pattern) is PatternGroup:
+            pattern = pattern.pattern
+        kind = type(pattern)
+        if kind is PatternHole:
+            return (VAR, None)
+        if kind is Path:
+            if pattern.name == peano.zero:
+                return (ZERO,)
+            if pattern.name in self.program.constructors:
+                return None
+            return (VAR, pattern.name)
+        if kind is PatternApplication and pattern.head.name == peano.successor and len(pattern.args) == 1:
+            inner = self._pattern(pattern.args[0], peano)
+            if inner is not None and inner[0] == VAR:
+                return (SUCC, inner[1])
+        return None
+
+    def _expression(self, exp:Any, peano:PeanoType, variables:Tuple[str, ...])->Optional[Form]:
+        while type(exp) is ExpGroup or type(exp) is Annotated:
+            exp = exp.exp
+        if type(exp) is Path:
+            if exp.name == peano.zero:
+                return (ZERO,)
+            if exp.name in variables:
+                return (VAR, exp.name)
+            return None
+        if type(exp) is not Application:
+            return None
+        head, args = application_spine(exp)
+        if type(head) is not Path or head.name in variables:
+            return None
+        forms = [self._expression(arg, peano, variables) for arg in args]
+        if None in forms:
+            return None
+        if head.name == peano.successor and len(forms) == 1:
+            return (SUCC, forms[0])
+        if len(forms) == 2:
+            return (CALL, head.name, forms[0], forms[1])
+        return None
+
+    def _recognise(self, name:str, peano:PeanoType, operation:str, additions:Tuple[str, ...])->bool:
+        "Whether every clause of `name` is an equation of `operation` and together they are a definition of it"
+        if self.program.arities[name] != 2 or (operation == MUL and not additions):
+            return False
+        kinds = set()
+        steps = set()
+        for clause in self.program.functions[name]:
+            first = self._pattern(clause.parameters[0], peano)
+            second = self._pattern(clause.parameters[1], peano)
+            if first is None or second is None:
+                return False
+            variables = tuple(form[1] for form in (first, second) if len(form) > 1 and form[1] is not None)
+            if len(set(variables)) != len(variables):
+                return False
+            body = self._expression(clause.body, peano, variables)
+            if body is None:
+                return False
+            if operation == ADD:
+                step = _addition_step(name, first, second, body)
+            else:
+                step = _multiplication_step(name, additions, first, second, body)
+            if step is None:
+                return False
+            kinds.add((first[0], second[0]))
+            steps.add(step)
+        # some argument is matched against both constructors with the other one free
+        exhaustive = {(ZERO, VAR), (SUCC, VAR)} <= kinds or {(VAR, ZERO), (VAR, SUCC)} <= kinds
+        # `f (S n) m = f n (S m)` and `f n (S m) = f (S n) m` together may loop
+        return exhaustive and not {"shift first", "shift second"} <= steps
+
+
+def _addition_step(name:str, first:Form, second:Form, body:Form)->Optional[str]:
+    "The kind of equation of addition the clause is, None if it isn't one"
+    n, m = (first + (None,))[1], (second + (None,))[1]
+    if first[0] == ZERO and second[0] == ZERO:
+        return "base" if body == (ZERO,) else None
+    if first[0] == ZERO and second[0] == VAR:
+        return "base" if m is not None and body == (VAR, m) else None
+    if first[0] == VAR and second[0] == ZERO:
+        return "base" if n is not None and body == (VAR, n) else None
+    if n is None or m is None:
+        return None
+    recursive = (CALL, name, (VAR, n), (VAR, m))
+    if first[0] == SUCC and second[0] == VAR:
+        if body == (SUCC, recursive):
+            return "down"
+        if body == (CALL, name, (VAR, n), (SUCC, (VAR, m))):
+            return "shift first"
+    if first[0] == VAR and second[0] == SUCC:
+        if body == (SUCC, recursive):
+            return "down"
+        if body == (CALL, name, (SUCC, (VAR, n)), (VAR, m)):
+            return "shift second"
+    return None
+
+
+def _multiplication_step(name:str, additions:Tuple[str, ...], first:Form, second:Form, body:Form)->Optional[str]:
+    "The kind of equation of multiplication the clause is, None if it isn't one"
+    n, m = (first + (None,))[1], (second + (None,))[1]
+    if first[0] == ZERO or second[0] == ZERO:
+        return "base" if body == (ZERO,) else None
+    if n is None or m is None or body[0] != CALL or body[1] not in additions:
+        return None
+    recursive = (CALL, name, (VAR, n), (VAR, m))
+    # `S n * m = m + n * m` and `n * S m = n + n * m`, in either order
+    if first[0] == SUCC and second[0] == VAR:
+        added = (VAR, m)
+    elif first[0] == VAR and second[0] == SUCC:
+        added = (VAR, n)
+    else:
+        return None
+    if body[2:] in ((added, recursive), (recursive, added)):
+        return "down"
+    return None
+
+
+def main(argv:List[str])->None:
+    """Times `mul` of a module over Peano numbers in compiled code with
+    constructor values and with ints, for growing operands"""
+    from .syntax import get_syntax_parser
+    from .codegen import EXAMPLE, CompiledModule, compile_module
+    from .runtime import nat
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.peano", description=main.__doc__)
+    arg_parser.add_argument("file", nargs="?", default=EXAMPLE)
+    arg_parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 300, 10**6, 10**100])
+    arg_parser.add_argument("--max-literal", type=int, default=300, help="largest operand run with constructor values")
+    args = arg_parser.parse_args(argv[1:])
+
+    with open(args.file, encoding="utf8") as f:
+        module = get_syntax_parser().parse(f.read())
+    literal = CompiledModule(compile_module(module, args.file, peano=False), args.file)
+    numbers = CompiledModule(compile_module(module, args.file), args.file)
+    print(f"{args.file}: {Peano(Program(module)).arithmetic}")
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * args.max_literal ** 2 + 1000))
+    for n in args.sizes:
+        line = f"mul {n:<8.3g}"
+        if n <= args.max_literal:
+            start = time.perf_counter()
+            literal.call("mul", nat(n), nat(n))
+            line += f" constructors : {(time.perf_counter() - start)*1000:10.3f} ms"
+        else:
+            line += " constructors :          -   "
+        start = time.perf_counter()
+        result = numbers.call("mul", n, n)
+        line += f"   ints : {(time.perf_counter() - start)*1000:8.4f} ms"
+        assert result == n * n
+        print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
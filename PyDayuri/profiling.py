@@ -0,0 +1,209 @@
+"""Times each phase of parsing a source and counts what it went through.
+
+The phases run one after the other on the result of the previous one,
+instead of interleaved as `Lark.parse` runs them:
+
+- `lex`: the lark lexer of the parser, the tokens of the text.
+- `indent`: `TreeIndenter` over those tokens, adding the `_INDENT` and
+  `_DEDENT` tokens the indentation stands for.
+- `parse`: the LALR parser fed the tokens, building a lark `Tree`.
+- `syntax`: `SyntaxBuilder` turning the tree into the nodes of `syntax`.
+
+So lexing uses the basic lexer instead of the contextual one `Lark.parse`
+uses, which for this grammar gives the same tokens. `profile_source`
+returns a `Profile` with the seconds of each phase and its counters,
+`python -m PyDayuri.profiling` (and `--profile` of `batch`) writes it as
+JSON, or the whole pipeline under `cProfile` as a `pstats` dump, for each
+file."""
+
+import os
+import sys
+import json
+import time
+import cProfile
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lark import Lark, Token, Tree
+from lark.exceptions import LarkError
+
+from .parser import TreeIndenter, load_parser
+from .syntax import SyntaxBuilder, Module
+
+FORMATS = ("json", "cprofile")
+SUFFIXES = {"json": ".profile.json", "cprofile": ".prof"}
+
+
+class _CountingIndenter(TreeIndenter):
+    "`TreeIndenter` remembering the deepest its stack of indentations got"
+    depth : int
+
+    def process(self, stream):
+        self.depth = 0
+        return super().process(stream)
+
+    def handle_NL(self, token:Token)->Iterator[Token]:
+        yield from super().handle_NL(token)
+        self.depth = max(self.depth, len(self.indent_level) - 1)
+
+
+class Profile():
+    "Seconds of each phase, in order, and what they counted"
+    path : Optional[str]
+    phases : Dict[str, float]
+    tokens : int
+    # tokens of each kind the indenter added (or, for `_NL`, passed on)
+    indents : int
+    dedents : int
+    newlines : int
+    max_indent_depth : int
+    tree_nodes : int
+
+    def __init__(self, path:Optional[str]=None)->None:
+        self.path = path
+        self.phases = {}
+        self.tokens = 0
+        self.indents = 0
+        self.dedents = 0
+        self.newlines = 0
+        self.max_indent_depth = 0
+        self.tree_nodes = 0
+
+    @property
+    def seconds(self)->float:
+        return sum(self.phases.values())
+
+    def to_json(self)->Dict[str, Any]:
+        return {
+            "path": self.path,
+            "seconds": self.seconds,
+            "phases": dict(self.phases),
+            "counters": {
+                "tokens": self.tokens,
+                "indents": self.indents,
+                "dedents": self.dedents,
+                "newlines": self.newlines,
+                "max_indent_depth": self.max_indent_depth,
+                "tree_nodes": self.tree_nodes,
+            },
+        }
+
+    def __str__(self):
+        phases = "  ".join(f"{name} {seconds*1000:8.3f} ms" for name, seconds in self.phases.items())
+        return (f"{phases}  tokens {self.tokens}  indents {self.indents}  dedents {self.dedents}  "
+            f"newlines {self.newlines}  depth {self.max_indent_depth}  nodes {self.tree_nodes}")
+
+
+def get_profiling_parser(**options)->Lark:
+    "A parser building lark trees, its postlexer is run by `profile_source` itself"
+    parser = load_parser(postlex=None, **options)[0]
+    if not hasattr(parser, "lexer"):
+        # parsers loaded from the cache build it on every `lex` otherwise
+        parser.lexer = parser._build_lexer()
+    # the lexer compiles its patterns on first use, not in the first profile
+    list(parser.lex("\n"))
+    return parser
+
+
+def profile_source(text:str, parser:Optional[Lark]=None, path:Optional[str]=None)->Tuple[Profile, Module]:
+    """Parses `text` phase by phase with a parser of `get_profiling_parser`,
+    the profile and the module"""
+    if parser is None:
+        parser = get_profiling_parser()
+    profile = Profile(path)
+
+    start = time.perf_counter()
+    tokens = list(parser.lex(text))
+    profile.phases["lex"] = time.perf_counter() - start
+    profile.tokens = len(tokens)
+
+    indenter = _CountingIndenter()
+    start = time.perf_counter()
+    indented = list(indenter.process(iter(tokens)))
+    profile.phases["indent"] = time.perf_counter() - start
+    added = Counter(token.type for token in indented)
+    added.subtract(token.type for token in tokens)
+    profile.indents = added[TreeIndenter.INDENT_type]
+    profile.dedents = added[TreeIndenter.DEDENT_type]
+    profile.newlines = sum(1 for token in indented if token.type == TreeIndenter.NL_type)
+    profile.max_indent_depth = indenter.depth
+
+    start = time.perf_counter()
+    interactive = parser.parse_interactive()
+    for token in indented:
+        interactive.feed_token(token)
+    tree = interactive.feed_eof(indented[-1] if indented else None)
+    profile.phases["parse"] = time.perf_counter() - start
+    profile.tree_nodes = sum(1 for _ in tree.iter_subtrees()) if isinstance(tree, Tree) else 0
+
+    start = time.perf_counter()
+    module = SyntaxBuilder().transform(tree)
+    profile.phases["syntax"] = time.perf_counter() - start
+    return profile, module
+
+
+def profile_file(path:str, parser:Optional[Lark]=None)->Profile:
+    with open(path, encoding="utf8") as f:
+        text = f.read()
+    return profile_source(text, parser, path)[0]
+
+
+def write_profile(path:str, output:str, kind:str="json", parser:Optional[Lark]=None)->Profile:
+    """Profiles file `path`, writing the profile as JSON or a `cProfile` dump
+    of its phases to `output`"""
+    if parser is None:
+        parser = get_profiling_parser()
+    if kind == "json":
+        profile = profile_file(path, parser)
+        with open(output, "w", encoding="utf8") as f:
+            json.dump(profile.to_json(), f, indent=2)
+            f.write("\n")
+        return profile
+    if kind != "cprofile":
+        raise ValueError(f"unknown profile format `{kind}`, expected one of {FORMATS}")
+    profiler = cProfile.Profile()
+    profile = profiler.runcall(profile_file, path, parser)
+    profiler.dump_stats(output)
+    return profile
+
+
+def output_path(path:str, kind:str, directory:Optional[str]=None)->str:
+    "Where the profile of `path` goes, next to it unless `directory` is given"
+    if directory is not None:
+        path = os.path.join(directory, os.path.basename(path))
+    return path + SUFFIXES[kind]
+
+
+def main(argv:List[str])->None:
+    "Profiles the phases of parsing each .dy file given (or found under the directories given)"
+    from .batch import find_sources
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.profiling", description=main.__doc__)
+    arg_parser.add_argument("paths", nargs="+")
+    arg_parser.add_argument("--profile", choices=FORMATS, default=None, help="also write the profile of each file")
+    arg_parser.add_argument("--output-dir", default=None, help="where the profiles go, default next to the files")
+    args = arg_parser.parse_args(argv[1:])
+
+    parser = get_profiling_parser()
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = False
+    for root in args.paths:
+        for path in find_sources(root):
+            try:
+                if args.profile is None:
+                    profile = profile_file(path, parser)
+                else:
+                    profile = write_profile(path, output_path(path, args.profile, args.output_dir), args.profile, parser)
+            except LarkError as e:
+                failed = True
+                print(f"{path}: {type(e).__name__}: {str(e).splitlines()[0]}")
+                continue
+            print(f"{path}: {profile}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
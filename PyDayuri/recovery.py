@@ -0,0 +1,284 @@
+"""Parsing that collects every error of a file in one pass.
+
+Lexer and indentation errors don't stop the token stream, they are
+injected in it as `ErrorToken`s (the `IndentErrorToken` idea of
+`old/indenter2.py`). The parser is restarted at every top level
+declaration; once a declaration has an error the rest of its tokens are
+skipped, so parsing resynchronises at the next line that starts at column
+1. Errors keep the data they were found with and only build their message
+when it is asked for."""
+
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+
+from lark import Lark, Token, Tree
+from lark.exceptions import UnexpectedInput
+from lark.lexer import BasicLexer, LineCounter
+from lark.utils import TextSlice
+
+from .parser import get_parser, TreeIndenter
+from .source_map import SourceMap
+
+LEXER = "lexer"
+INDENTATION = "indentation"
+SYNTAX = "syntax"
+
+
+class ErrorToken(Token):
+    "A token that stands for an error in the token stream"
+    kind = ""
+
+    def message(self)->str:
+        return f"{self.kind or 'unknown'} error at {self.value!r}"
+
+
+class LexErrorToken(ErrorToken):
+    "A run of characters no terminal matches, they are its value"
+    kind = LEXER
+
+    def message(self)->str:
+        return f"No terminal matches {self.value!r}"
+
+
+class IndentErrorToken(ErrorToken):
+    "A dedent to a `level` that isn't in the indentation stack"
+    kind = INDENTATION
+    level : int
+    expected : Tuple[int, ...]
+
+    def message(self)->str:
+        levels = ", ".join(str(level) for level in self.expected)
+        return f"Unexpected dedent to column {self.level}. Expected dedent to one of {levels}"
+
+
+class ParseError():
+    "An error found by `parse_with_recovery`"
+    kind : str
+    line : int
+    column : int
+    source : Union[ErrorToken, UnexpectedInput]
+
+    def __init__(self, kind:str, line:int, column:int, source:Union[ErrorToken, UnexpectedInput])->None:
+        self.kind = kind
+        self.line = line
+        self.column = column
+        self.source = source
+
+    @classmethod
+    def from_token(cls, token:ErrorToken)->"ParseError":
+        return cls(token.kind, token.line, token.column, token)
+
+    @classmethod
+    def from_exception(cls, e:UnexpectedInput)->"ParseError":
+        # the parser state would keep the partial trees alive
+        e.state = None
+        return cls(SYNTAX, e.line, e.column, e)
+
+    @property
+    def message(self)->str:
+        if isinstance(self.source, ErrorToken):
+            return self.source.message()
+        return str(self.source)
+
+    def get_context(self, text:Union[str, SourceMap])->str:
+        """The line of the error with a caret under its column, given the
+        `SourceMap` of the text it doesn't split the text to find it"""
+        if isinstance(text, SourceMap):
+            return text.context(self.line, self.column)
+        lines = text.split("\n", self.line)
+        line = lines[self.line - 1] if self.line - 1 < len(lines) else ""
+        line = line.split("\n", 1)[0].rstrip("\r")
+        return f"{line}\n{' ' * (self.column - 1)}^\n"
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: {self.kind} error: {self.message.splitlines()[0]}"
+
+    def __repr__(self):
+        return f"ParseError({self.kind}, line={self.line}, column={self.column})"
+
+
+class RecoveryResult():
+    tree : Tree
+    errors : List[ParseError]
+
+    def __init__(self, tree:Tree, errors:List[ParseError])->None:
+        self.tree = tree
+        self.errors = errors
+
+    @property
+    def ok(self)->bool:
+        return not self.errors
+
+
+class RecoveringIndenter(TreeIndenter):
+    """`TreeIndenter` that yields an `IndentErrorToken` on a bad dedent
+    instead of raising, it keeps going from the bad level"""
+
+    def handle_NL(self, token:Token)->Iterator[Token]:
+        if self.paren_level > 0:
+            return
+
+        yield token
+
+        indent_str = token.rsplit('\n', 1)[1]
+        indent = indent_str.count(' ') + indent_str.count('\t') * self.tab_len
+
+        if indent > self.indent_level[-1]:
+            self.indent_level.append(indent)
+            yield Token.new_borrow_pos(self.INDENT_type, indent_str, token)
+        else:
+            expected = tuple(self.indent_level)
+            while indent < self.indent_level[-1]:
+                self.indent_level.pop()
+                yield Token.new_borrow_pos(self.DEDENT_type, indent_str, token)
+
+            if indent != self.indent_level[-1]:
+                self.indent_level.append(indent)
+                error = IndentErrorToken("_INDENT_ERROR", "", token.end_pos, token.end_line,
+                    token.end_column, token.end_line, token.end_column, token.end_pos)
+                error.level = indent
+                error.expected = expected
+                yield error
+
+
+def lex_with_recovery(parser:Lark, text:str)->Iterator[Token]:
+    """The tokens of a `BasicLexer` over `text`, characters that no terminal
+    matches come out as one `LexErrorToken` per run"""
+    lexer = BasicLexer(parser.lexer_conf)
+    match = lexer.scanner.match
+    callbacks = lexer.callback
+    ignore_types = lexer.ignore_types
+    newline_types = lexer.newline_types
+    source = TextSlice.cast_from(text)
+    line_ctr = LineCounter("\n")
+    end = len(text)
+
+    error = None
+    while line_ctr.char_pos < end:
+        result = match(source, line_ctr.char_pos)
+        if not result:
+            if error is None:
+                error = LexErrorToken("_LEX_ERROR", "", line_ctr.char_pos, line_ctr.line, line_ctr.column)
+            line_ctr.feed(text[line_ctr.char_pos])
+            continue
+        if error is not None:
+            error.value = text[error.start_pos:line_ctr.char_pos]
+            error.end_line, error.end_column, error.end_pos = line_ctr.line, line_ctr.column, line_ctr.char_pos
+            yield error
+            error = None
+
+        value, type_ = result
+        ignored = type_ in ignore_types
+        token = None
+        if not ignored or type_ in callbacks:
+            token = Token(type_, value, line_ctr.char_pos, line_ctr.line, line_ctr.column)
+        line_ctr.feed(value, type_ in newline_types)
+        if token is not None:
+            token.end_line = line_ctr.line
+            token.end_column = line_ctr.column
+            token.end_pos = line_ctr.char_pos
+            if token.type in callbacks:
+                token = callbacks[token.type](token)
+            if not ignored:
+                yield token
+
+    if error is not None:
+        error.value = text[error.start_pos:]
+        error.end_line, error.end_column, error.end_pos = line_ctr.line, line_ctr.column, line_ctr.char_pos
+        yield error
+
+
+def parse_with_recovery(text:str, parser:Optional[Lark]=None,
+        indenter:Optional[RecoveringIndenter]=None)->RecoveryResult:
+    """Parses `text` declaration by declaration and returns the tree of the
+    ones without errors together with every error found"""
+    if parser is None:
+        parser = get_parser()
+    if indenter is None:
+        indenter = RecoveringIndenter()
+    tokens = indenter.process(lex_with_recovery(parser, text))
+    line_end_types = (indenter.NL_type, indenter.DEDENT_type)
+
+    children : List[object] = []
+    errors : List[ParseError] = []
+    interactive = None
+    failed = False
+    last = None
+
+    def finish()->None:
+        if interactive is None or failed:
+            return
+        try:
+            children.extend(interactive.feed_eof(last).children)
+        except UnexpectedInput as e:
+            errors.append(ParseError.from_exception(e))
+
+    for token in tokens:
+        # a token at column 1 right after a line end starts a declaration
+        if token.column == 1 and last is not None and last.type in line_end_types \
+                and token.type not in line_end_types:
+            finish()
+            interactive = None
+            failed = False
+        if isinstance(token, ErrorToken):
+            errors.append(ParseError.from_token(token))
+            failed = True
+        elif not failed:
+            if interactive is None:
+                interactive = parser.parse_interactive()
+            try:
+                interactive.feed_token(token)
+            except UnexpectedInput as e:
+                errors.append(ParseError.from_exception(e))
+                failed = True
+        last = token
+    finish()
+
+    errors.sort(key=lambda error: (error.line, error.column))
+    return RecoveryResult(Tree("start", children), errors)
+
+
+def main(argv:List[str])->None:
+    """Reports every error of a file, with `--bench [count]` times recovery
+    on a generated file with an error in each declaration"""
+    parser = get_parser()
+    if len(argv) > 1 and argv[1] != "--bench":
+        with open(argv[1], encoding="utf8") as f:
+            text = f.read()
+        result = parse_with_recovery(text, parser)
+        source_map = SourceMap(text)
+        for error in result.errors:
+            print(f"{argv[1]}:{error}")
+            print(error.get_context(source_map), end="")
+        print(f"{len(result.tree.children)} declarations parsed, {len(result.errors)} errors")
+        return
+
+    count = int(argv[2]) if len(argv) > 2 else 3000
+    pieces = []
+    for i in range(count):
+        if i % 3 == 0:
+            pieces.append(f"f{i} : nat ->\n")
+        elif i % 3 == 1:
+            pieces.append(f"f{i} x =\n    let\n  a = x\n")
+        else:
+            pieces.append(f"f{i} x = add x ? 3\n")
+    text = "".join(pieces)
+    start = time.perf_counter()
+    result = parse_with_recovery(text, parser)
+    parsed = time.perf_counter() - start
+    start = time.perf_counter()
+    messages = [error.message for error in result.errors]
+    formatted = time.perf_counter() - start
+    start = time.perf_counter()
+    source_map = SourceMap(text)
+    contexts = [error.get_context(source_map) for error in result.errors]
+    shown = time.perf_counter() - start
+    print(f"{count} declarations, {len(result.errors)} errors")
+    print(f"parse     : {parsed*1000:.2f} ms")
+    print(f"messages  : {formatted*1000:.2f} ms ({len(messages)} formatted)")
+    print(f"contexts  : {shown*1000:.2f} ms ({len(contexts)} shown)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,116 @@
+"""Values of running Dayuri programs and the helpers every backend shares.
+
+A constructor value is a tuple whose first item is the constructor name
+(`("S", ("Z",))`), Dayuri tuples are plain tuples, lists are Python lists
+and numbers Python ints. Well typed programs never look at a tuple as the
+other kind, so backends don't need to tell them apart, only `show` does.
+
+Functions of n parameters are Python functions of n arguments; used as
+values (partially applied, passed around) they are curried with `curry`
+and applied one argument at a time by `apply`."""
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from .syntax import Module, DataType, FunctionDeclaration, FunctionDefinition
+
+
+class MatchError(Exception):
+    "No clause of a function, or case of a match, takes the value"
+    pass
+
+
+class ProgramError(Exception):
+    "A module that can't be run, as opposed to a type error"
+    pass
+
+
+def curry(function:Callable[..., Any], arity:int, args:Tuple[Any, ...]=())->Callable[[Any], Any]:
+    "`function` taking its `arity` arguments one by one"
+    def curried(argument:Any)->Any:
+        collected = args + (argument,)
+        if len(collected) == arity:
+            return function(*collected)
+        return curry(function, arity, collected)
+    return curried
+
+
+def apply(function:Callable[[Any], Any], *args:Any)->Any:
+    for argument in args:
+        function = function(argument)
+    return function
+
+
+def show(value:Any)->str:
+    "`value` as Dayuri source"
+    if isinstance(value, tuple):
+        if value and type(value[0]) is str:
+            if len(value) == 1:
+                return value[0]
+            return " ".join([value[0]] + [_show_argument(arg) for arg in value[1:]])
+        return "(" + ", ".join(show(item) for item in value) + ")"
+    if isinstance(value, list):
+        return "[" + ", ".join(show(item) for item in value) + "]"
+    if callable(value):
+        return "<function>"
+    return str(value)
+
+
+def _show_argument(value:Any)->str:
+    text = show(value)
+    if isinstance(value, tuple) and len(value) > 1 and type(value[0]) is str:
+        return f"({text})"
+    return text
+
+
+class Program():
+    """The constructors and functions of a module, clauses grouped by
+    function in source order"""
+    data : Dict[str, DataType]
+    constructors : Dict[str, int]
+    functions : Dict[str, List[FunctionDefinition]]
+    arities : Dict[str, int]
+
+    def __init__(self, module:Module)->None:
+        if module.imports:
+            raise ProgramError("imported modules can't be run yet")
+        self.data = {}
+        self.constructors = {}
+        self.functions = {}
+        self.arities = {}
+        for declaration in module.declarations:
+            if type(declaration) is DataType:
+                self.data[str(declaration.name)] = declaration
+                for constructor in declaration.constructors:
+                    self.constructors[str(constructor.name)] = len(constructor.args)
+            elif type(declaration) is FunctionDefinition:
+                name = str(declaration.name)
+                self.functions.setdefault(name, []).append(declaration)
+                arity = self.arities.setdefault(name, len(declaration.parameters))
+                if arity != len(declaration.parameters):
+                    raise ProgramError(f"{declaration.name.line}:{declaration.name.column}: "
+                        f"clauses of `{name}` have {arity} and {len(declaration.parameters)} parameters")
+            else:
+                assert type(declaration) is FunctionDeclaration
+
+    def constructor(self, name:str, *args:Any)->Tuple[Any, ...]:
+        "The value of constructor `name` applied to `args`"
+        arity = self.constructors[name]
+        if arity != len(args):
+            raise ProgramError(f"`{name}` takes {arity} arguments, given {len(args)}")
+        return (name,) + args
+
+
+def nat(n:int)->Tuple[Any, ...]:
+    "`n` as the Peano number of a module with `Z` and `S`"
+    value : Tuple[Any, ...] = ("Z",)
+    for _ in range(n):
+        value = ("S", value)
+    return value
+
+
+def nat_value(value:Tuple[Any, ...])->int:
+    n = 0
+    while value[0] == "S":
+        value = value[1]
+        n += 1
+    return n
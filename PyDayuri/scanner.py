@@ -0,0 +1,237 @@
+"""Hand written scanner for the terminals of `grammar.lark`.
+
+Lark's lexer tries one regular expression alternating every terminal at
+each position. The terminals of Dayuri are simple enough to pick from the
+first character instead: letters start names (a keyword if the name is in
+a dictionary of them), digits numbers, `_` holes, a newline `_NL`, spaces
+and tabs are skipped and anything else is punctuation. Names are scanned
+with an ASCII pattern and only fall back to Unicode `\\w` at the first
+character outside ASCII.
+
+The type of each keyword and punctuation token is taken from the terminals
+of the parser, so tokens are the same as lark's (positions included) and
+`DayuriLexer` can be given as `lexer` to `Lark`, before `TreeIndenter` and
+the LALR parser; `get_scanning_parser` builds such a parser."""
+
+import re
+import sys
+import argparse
+from typing import Dict, Iterator, List, Sequence
+
+from lark import Lark, Token
+from lark.lexer import Lexer, TerminalDef
+from lark.exceptions import UnexpectedCharacters
+
+from .parser import load_parser
+
+IDENTIFIER = "IDENTIFIER"
+UINT = "UINT"
+NUMERIC_HOLE = "NUMERIC_HOLE"
+NAMED_HOLE = "NAMED_HOLE"
+HOLE = "HOLE"
+NL = "_NL"
+# the terminals recognised by their first character rather than their pattern
+PATTERNS = (IDENTIFIER, UINT, NUMERIC_HOLE, NAMED_HOLE, HOLE, NL, "WS_INLINE")
+
+_ASCII_WORD = re.compile(r"[A-Za-z0-9_]*")
+_WORD = re.compile(r"\w*")
+_DIGITS = re.compile(r"[0-9]*")
+_UINT = re.compile(r"[0-9_]*")
+_BLANK = re.compile(r"[ \t]+")
+_NEWLINES = re.compile(r"(\r?\n[\t ]*)+")
+
+# what the first character of a token starts, for the ASCII ones
+_NAME = 0
+_NUMBER = 1
+_UNDERSCORE = 2
+_BLANKS = 3
+_NEWLINE = 4
+_START : Dict[str, int] = {}
+for _c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ":
+    _START[_c] = _NAME
+for _c in "123456789":
+    _START[_c] = _NUMBER
+_START["_"] = _UNDERSCORE
+_START[" "] = _START["\t"] = _BLANKS
+_START["\n"] = _START["\r"] = _NEWLINE
+
+
+def _name_start(c:str)->bool:
+    "Whether `c` can start an IDENTIFIER, `(?!(\\d|_))\\w`"
+    return c.isalnum() and not c.isdecimal()
+
+
+class Scanner():
+    "The tokens of a text, typed after `terminals`"
+    # word literals (`data`, `unit8`...) and the others
+    keywords : Dict[str, str]
+    punctuation : Dict[str, str]
+    # literals longer than one character that aren't words, by first character
+    operators : Dict[str, List[str]]
+    operator_names : Dict[str, str]
+    allowed : set
+
+    def __init__(self, terminals:Sequence[TerminalDef])->None:
+        self.keywords = {}
+        self.punctuation = {}
+        self.operators = {}
+        names = set()
+        for terminal in terminals:
+            names.add(terminal.name)
+            if terminal.pattern.type != "str":
+                if terminal.name not in PATTERNS:
+                    raise ValueError(f"terminal {terminal.name} isn't one the scanner knows")
+                continue
+            value = terminal.pattern.value
+            if _WORD.fullmatch(value) and _name_start(value[0]):
+                self.keywords[value] = terminal.name
+            elif len(value) == 1:
+                self.punctuation[value] = terminal.name
+            else:
+                self.operators.setdefault(value[0], []).append(value)
+        for values in self.operators.values():
+            values.sort(key=len, reverse=True)
+        self.operator_names = {terminal.pattern.value: terminal.name for terminal in terminals
+            if terminal.pattern.type == "str"}
+        self.allowed = names
+
+    def scan(self, text:str)->Iterator[Token]:
+        keywords = self.keywords
+        punctuation = self.punctuation
+        start_of = _START.get
+        new = Token._future_new
+        end = len(text)
+        pos = 0
+        line = 1
+        line_start = 0
+        while pos < end:
+            c = text[pos]
+            kind = start_of(c)
+            if kind == _BLANKS:
+                pos = _BLANK.match(text, pos).end()
+                continue
+            if kind == _NAME:
+                stop = _ASCII_WORD.match(text, pos + 1).end()
+                if stop < end and text[stop] >= "\x80":
+                    stop = _WORD.match(text, stop).end()
+                value = text[pos:stop]
+                kind_name = keywords.get(value, IDENTIFIER)
+            elif kind == _NEWLINE:
+                match = _NEWLINES.match(text, pos)
+                if match is None:
+                    self._error(text, pos, line, line_start)
+                stop = match.end()
+                value = text[pos:stop]
+                last = value.rfind("\n")
+                next_line = line + value.count("\n")
+                yield new(NL, value, pos, line, pos - line_start + 1, next_line, stop - pos - last, stop)
+                line = next_line
+                line_start = pos + last + 1
+                pos = stop
+                continue
+            elif kind == _NUMBER:
+                stop = _UINT.match(text, pos + 1).end()
+                value = text[pos:stop]
+                kind_name = UINT
+            elif kind == _UNDERSCORE:
+                following = text[pos + 1] if pos + 1 < end else ""
+                if "1" <= following <= "9":
+                    stop = _DIGITS.match(text, pos + 2).end()
+                    kind_name = NUMERIC_HOLE
+                elif following and following != "_" and (start_of(following) == _NAME
+                        or (following >= "\x80" and _name_start(following))):
+                    stop = _WORD.match(text, pos + 2).end()
+                    kind_name = NAMED_HOLE
+                else:
+                    stop = pos + 1
+                    kind_name = HOLE
+                value = text[pos:stop]
+            elif c in punctuation:
+                stop = pos + 1
+                value = c
+                kind_name = punctuation[c]
+            elif c in self.operators:
+                for value in self.operators[c]:
+                    if text.startswith(value, pos):
+                        break
+                else:
+                    self._error(text, pos, line, line_start)
+                stop = pos + len(value)
+                kind_name = self.operator_names[value]
+            elif c >= "\x80" and _name_start(c):
+                stop = _WORD.match(text, pos + 1).end()
+                value = text[pos:stop]
+                kind_name = keywords.get(value, IDENTIFIER)
+            else:
+                self._error(text, pos, line, line_start)
+            # no token but _NL spans lines
+            column = pos - line_start + 1
+            yield new(kind_name, value, pos, line, column, line, column + stop - pos, stop)
+            pos = stop
+
+    def _error(self, text:str, pos:int, line:int, line_start:int)->None:
+        raise UnexpectedCharacters(text, pos, line, pos - line_start + 1, allowed=self.allowed)
+
+
+class DayuriLexer(Lexer):
+    "`Scanner` as a lark lexer, for the `lexer` option of `Lark`"
+    scanner : Scanner
+
+    def __init__(self, lexer_conf)->None:
+        self.scanner = Scanner(lexer_conf.terminals)
+
+    def lex(self, text:str)->Iterator[Token]:
+        return self.scanner.scan(text)
+
+
+def get_scanning_parser(**options)->Lark:
+    "A parser lexing with `DayuriLexer`, options are those of `load_parser`"
+    return load_parser(lexer=DayuriLexer, **options)[0]
+
+
+def _fields(token:Token)->tuple:
+    return (token.type, token.value, token.start_pos, token.line, token.column,
+        token.end_line, token.end_column, token.end_pos)
+
+
+def main(argv:List[str])->None:
+    """Times lark's lexer against the scanner, and parsing with each of them,
+    on a file or a generated one of `--functions` functions"""
+    from bench.harness import measure
+    from .syntax import SyntaxBuilder, get_syntax_parser
+    from .profiling import get_profiling_parser
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.scanner", description=main.__doc__)
+    arg_parser.add_argument("file", nargs="?", default=None)
+    arg_parser.add_argument("--functions", type=int, default=3000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv[1:])
+
+    if args.file is not None:
+        with open(args.file, encoding="utf8") as f:
+            text = f.read()
+    else:
+        pieces = ["data nat =\n  Z\n  S nat\n\n"]
+        for i in range(args.functions):
+            pieces.append(f"f{i} : ∀ a, nat -> unit64\nf{i} S n $ P _k _1 m =\n  (let\n    a = (n, m)\n"
+                f"    b = add n $ mul_{i} m n\n  in f a [b, 3_000])\n\n")
+        text = "".join(pieces)
+
+    lark_lexer = get_profiling_parser()
+    scanner = Scanner(lark_lexer.terminals)
+    assert [_fields(t) for t in lark_lexer.lex(text)] == [_fields(t) for t in scanner.scan(text)]
+    lines = text.count("\n")
+    lexed = min(measure(lambda: list(lark_lexer.lex(text)), args.repeat))
+    scanned = min(measure(lambda: list(scanner.scan(text)), args.repeat))
+    print(f"{lines} lines, {len(text)} characters")
+    print(f"lex   lark : {lexed*1000:9.2f} ms   scanner : {scanned*1000:9.2f} ms   {lexed / scanned:5.2f}x")
+    lark_parser = get_syntax_parser()
+    scanning_parser = get_scanning_parser(transformer=SyntaxBuilder())
+    assert lark_parser.parse(text) == scanning_parser.parse(text)
+    parsed = min(measure(lambda: lark_parser.parse(text), args.repeat))
+    scanned_parsed = min(measure(lambda: scanning_parser.parse(text), args.repeat))
+    print(f"parse lark : {parsed*1000:9.2f} ms   scanner : {scanned_parsed*1000:9.2f} ms   {parsed / scanned_parsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
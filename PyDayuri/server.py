@@ -0,0 +1,379 @@
+"""Language server over stdio, publishes the errors of `parse_with_recovery`
+as diagnostics.
+
+Edits are debounced per document: a `didChange` cancels the pending check
+of its document and, if a parse of an older version is running, sets the
+flag its `CancellableIndenter` looks at every `check_every` tokens. Parses
+run in a worker thread, and their diagnostics are dropped if the document
+changed (or was closed) while they ran, so a client never sees errors of a
+version it no longer has."""
+
+import io
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from lark import Lark, Token
+
+from .parser import get_parser
+from .recovery import ParseError, RecoveringIndenter, RecoveryResult, parse_with_recovery
+from .source_map import SourceMap
+
+# LSP constants
+TEXT_DOCUMENT_SYNC_FULL = 1
+SEVERITY_ERROR = 1
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+DEFAULT_DEBOUNCE = 0.05
+DEFAULT_CHECK_EVERY = 256
+
+log = logging.getLogger(__name__)
+
+
+class ParseCancelled(Exception):
+    pass
+
+
+class CancellableIndenter(RecoveringIndenter):
+    "`RecoveringIndenter` that stops the parse once `cancelled` is set"
+    cancelled : threading.Event
+    check_every : int
+
+    def __init__(self, cancelled:threading.Event, check_every:int=DEFAULT_CHECK_EVERY)->None:
+        super().__init__()
+        self.cancelled = cancelled
+        self.check_every = check_every
+
+    def _process(self, stream:Iterator[Token])->Iterator[Token]:
+        is_set = self.cancelled.is_set
+        check_every = self.check_every
+        count = 0
+        for token in super()._process(stream):
+            count += 1
+            if count == check_every:
+                count = 0
+                if is_set():
+                    raise ParseCancelled()
+            yield token
+
+
+def encode_message(message:Dict[str, Any])->bytes:
+    body = json.dumps(message, separators=(",", ":")).encode("utf8")
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+async def read_message(reader:asyncio.StreamReader)->Optional[Dict[str, Any]]:
+    "The next message of `reader`, None at the end of the input"
+    length = None
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    if length is None:
+        return None
+    return json.loads(await reader.readexactly(length))
+
+
+def diagnostic(error:ParseError, source_map:Optional[SourceMap]=None)->Dict[str, Any]:
+    """`error` as an LSP diagnostic, characters count UTF-16 code units if
+    given the `SourceMap` of the text and code points otherwise"""
+    source = error.source
+    width = 1
+    if isinstance(source, Token):
+        width = max(len(source.value), 1)
+    else:
+        token = getattr(source, "token", None)
+        if isinstance(token, Token) and token.value:
+            width = len(token.value)
+    # errors spanning lines are shown on their first one
+    if source_map is not None:
+        start = source_map.to_lsp(error.line, error.column)
+        end = source_map.to_lsp(error.line, error.column + width)
+    else:
+        start = {"line": error.line - 1, "character": error.column - 1}
+        end = {"line": error.line - 1, "character": error.column - 1 + width}
+    return {
+        "range": {"start": start, "end": end},
+        "severity": SEVERITY_ERROR,
+        "source": "dayuri",
+        "code": error.kind,
+        "message": error.message.splitlines()[0] if error.message else error.kind,
+    }
+
+
+class Document():
+    uri : str
+    text : str
+    version : int
+    closed : bool
+    # the debounced check waiting to run and the flag of the running parse
+    pending : Optional["asyncio.Task[None]"]
+    cancelled : Optional[threading.Event]
+
+    def __init__(self, uri:str, text:str, version:int)->None:
+        self.uri = uri
+        self.text = text
+        self.version = version
+        self.closed = False
+        self.pending = None
+        self.cancelled = None
+
+
+class ServerStats():
+    parses : int
+    cancelled : int
+    stale : int
+    published : int
+    # checks that ended on an exception other than `ParseCancelled`
+    failed : int
+
+    def __init__(self)->None:
+        self.parses = 0
+        self.cancelled = 0
+        self.stale = 0
+        self.published = 0
+        self.failed = 0
+
+    def __repr__(self):
+        return (f"ServerStats(parses={self.parses}, cancelled={self.cancelled}, stale={self.stale}, "
+            f"published={self.published}, failed={self.failed})")
+
+
+class LanguageServer():
+    output : BinaryIO
+    parser : Lark
+    debounce : float
+    check_every : int
+    documents : Dict[str, Document]
+    stats : ServerStats
+    running : bool
+
+    def __init__(self, output:BinaryIO, parser:Optional[Lark]=None, debounce:float=DEFAULT_DEBOUNCE,
+            check_every:int=DEFAULT_CHECK_EVERY)->None:
+        self.output = output
+        self.parser = parser if parser is not None else get_parser()
+        self.debounce = debounce
+        self.check_every = check_every
+        self.documents = {}
+        self.stats = ServerStats()
+        self.running = True
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dayuri-parse")
+
+    def send(self, message:Dict[str, Any])->None:
+        message["jsonrpc"] = "2.0"
+        self.output.write(encode_message(message))
+        self.output.flush()
+
+    def publish_diagnostics(self, uri:str, version:Optional[int], errors:List[ParseError],
+            source_map:Optional[SourceMap]=None)->None:
+        self.stats.published += 1
+        self.send({"method": "textDocument/publishDiagnostics",
+            "params": {"uri": uri, "version": version, "diagnostics": [diagnostic(e, source_map) for e in errors]}})
+
+    async def serve(self, reader:asyncio.StreamReader)->None:
+        while self.running:
+            message = await read_message(reader)
+            if message is None:
+                break
+            self.handle(message)
+        self.close()
+
+    def close(self)->None:
+        for document in self.documents.values():
+            self._cancel(document)
+        self._executor.shutdown(wait=False)
+
+    def handle(self, message:Dict[str, Any])->None:
+        """Runs the handler of `message`, a handler raising is answered with an
+        internal error (or only logged for a notification), it doesn't stop
+        the server"""
+        method = message.get("method", "")
+        handler = getattr(self, "on_" + method.replace("/", "_").replace("$", "S"), None)
+        params = message.get("params") or {}
+        if "id" not in message:
+            if handler is not None:
+                try:
+                    handler(params)
+                except Exception:
+                    log.exception("notification %s failed", method)
+            return
+        if handler is None:
+            self.send({"id": message["id"], "error": {"code": METHOD_NOT_FOUND, "message": f"unknown method {method}"}})
+            return
+        try:
+            result = handler(params)
+        except Exception as e:
+            log.exception("request %s failed", method)
+            self.send({"id": message["id"], "error": {"code": INTERNAL_ERROR, "message": f"{type(e).__name__}: {e}"}})
+            return
+        self.send({"id": message["id"], "result": result})
+
+    def on_initialize(self, params:Dict[str, Any])->Dict[str, Any]:
+        return {
+            "capabilities": {"textDocumentSync": {"openClose": True, "change": TEXT_DOCUMENT_SYNC_FULL}},
+            "serverInfo": {"name": "pydayuri"},
+        }
+
+    def on_initialized(self, params:Dict[str, Any])->None:
+        pass
+
+    def on_shutdown(self, params:Dict[str, Any])->None:
+        return None
+
+    def on_exit(self, params:Dict[str, Any])->None:
+        self.running = False
+
+    def on_textDocument_didOpen(self, params:Dict[str, Any])->None:
+        item = params["textDocument"]
+        document = Document(item["uri"], item["text"], item.get("version", 0))
+        self.documents[document.uri] = document
+        self._schedule(document)
+
+    def on_textDocument_didChange(self, params:Dict[str, Any])->None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        changes = params.get("contentChanges") or []
+        if document is None or not changes:
+            return
+        # full synchronization, the last change holds the whole text
+        document.text = changes[-1]["text"]
+        document.version = params["textDocument"].get("version", document.version + 1)
+        self._schedule(document)
+
+    def on_textDocument_didClose(self, params:Dict[str, Any])->None:
+        document = self.documents.pop(params["textDocument"]["uri"], None)
+        if document is None:
+            return
+        document.closed = True
+        self._cancel(document)
+        self.publish_diagnostics(document.uri, None, [])
+
+    def _cancel(self, document:Document)->None:
+        if document.cancelled is not None:
+            # the parse is running, its check ends on `ParseCancelled`
+            document.cancelled.set()
+            document.cancelled = None
+        elif document.pending is not None:
+            document.pending.cancel()
+        document.pending = None
+
+    def _schedule(self, document:Document)->None:
+        self._cancel(document)
+        document.pending = asyncio.ensure_future(self._check(document, document.version))
+
+    def _parse(self, text:str, cancelled:threading.Event)->RecoveryResult:
+        if cancelled.is_set():
+            raise ParseCancelled()
+        return parse_with_recovery(text, self.parser, CancellableIndenter(cancelled, self.check_every))
+
+    async def _check(self, document:Document, version:int)->None:
+        await asyncio.sleep(self.debounce)
+        cancelled = threading.Event()
+        document.cancelled = cancelled
+        text = document.text
+        loop = asyncio.get_running_loop()
+        self.stats.parses += 1
+        try:
+            result = await loop.run_in_executor(self._executor, self._parse, text, cancelled)
+        except ParseCancelled:
+            self.stats.cancelled += 1
+            return
+        except Exception:
+            # nobody awaits the check, it would be lost as a never retrieved exception
+            self.stats.failed += 1
+            log.exception("check of %s (version %s) failed", document.uri, version)
+            if document.cancelled is cancelled:
+                document.cancelled = None
+                document.pending = None
+            return
+        if document.closed or document.version != version:
+            self.stats.stale += 1
+            return
+        document.cancelled = None
+        document.pending = None
+        # one map for all the diagnostics of the document, built only if there are any
+        self.publish_diagnostics(document.uri, version, result.errors, SourceMap(text) if result.errors else None)
+
+
+async def _stdio_reader()->asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return reader
+
+
+async def _serve_stdio(debounce:float, check_every:int)->None:
+    server = LanguageServer(sys.stdout.buffer, debounce=debounce, check_every=check_every)
+    await server.serve(await _stdio_reader())
+
+
+async def _bench_typing(declarations:int, bursts:int, keystrokes:int, interval:float,
+        debounce:float, check_every:int)->None:
+    "Types bursts of edits in a large document and times the diagnostics of each burst"
+    from bench import corpus
+
+    text = corpus.generate(corpus.CorpusConfig(declarations))
+    output = io.BytesIO()
+    server = LanguageServer(output, debounce=debounce, check_every=check_every)
+    published : Dict[int, float] = {}
+    publish = server.publish_diagnostics
+
+    def record(uri:str, version:Optional[int], errors:List[ParseError],
+            source_map:Optional[SourceMap]=None)->None:
+        if version is not None:
+            published[version] = time.perf_counter()
+        publish(uri, version, errors, source_map)
+
+    server.publish_diagnostics = record  # type: ignore
+    uri = "file:///bench.dy"
+    version = 0
+    server.handle({"method": "textDocument/didOpen",
+        "params": {"textDocument": {"uri": uri, "version": version, "text": text}}})
+    latencies = []
+    for _ in range(bursts):
+        for _ in range(keystrokes):
+            version += 1
+            text += "x" if version % 2 else "\n"
+            server.handle({"method": "textDocument/didChange",
+                "params": {"textDocument": {"uri": uri, "version": version}, "contentChanges": [{"text": text}]}})
+            last_edit = time.perf_counter()
+            await asyncio.sleep(interval)
+        while version not in published:
+            await asyncio.sleep(0.001)
+        latencies.append(published[version] - last_edit)
+    server.close()
+    print(f"{len(text)} characters, {bursts} bursts of {keystrokes} keystrokes every {interval*1000:.0f} ms")
+    print(f"latency   : " + " ".join(f"{latency*1000:.0f}" for latency in latencies) + " ms")
+    print(f"{server.stats}")
+
+
+def main(argv:List[str])->None:
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.server", description="Dayuri language server over stdio")
+    arg_parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="seconds to wait after an edit")
+    arg_parser.add_argument("--check-every", type=int, default=DEFAULT_CHECK_EVERY, help="tokens between cancellation checks")
+    arg_parser.add_argument("--bench", type=int, metavar="DECLARATIONS", default=None,
+        help="simulate typing in a generated document instead of serving")
+    arg_parser.add_argument("--bursts", type=int, default=5)
+    arg_parser.add_argument("--keystrokes", type=int, default=10)
+    arg_parser.add_argument("--interval", type=float, default=0.03, help="seconds between keystrokes")
+    args = arg_parser.parse_args(argv[1:])
+    if args.bench is not None:
+        asyncio.run(_bench_typing(args.bench, args.bursts, args.keystrokes, args.interval, args.debounce, args.check_every))
+    else:
+        asyncio.run(_serve_stdio(args.debounce, args.check_every))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
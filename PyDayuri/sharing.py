@@ -0,0 +1,210 @@
+"""Hash-consed constructor values and memoized functions.
+
+Dayuri is pure and strict: a value never changes once built and a function
+called twice with the same arguments returns the same value. So backends
+run with `hash_consing` build every constructor value through a `HashCons`
+table, which returns the value already built when an equal one exists.
+Equal values are then the same object, `Shared` compares them by identity
+and hashes them by address, and a value deep as a Peano number hashes in
+constant time instead of walking it.
+
+That makes them cheap keys for `Memo`, the bounded LRU table backends put
+in front of the functions named in `memoize`. Without hash-consing memoizing
+still works, keys are then hashed (and compared) structurally.
+
+Values holding a list can't be keys, they are built as plain tuples and
+calls with them skip the table. The table of a `HashCons` keeps its values
+alive until `clear`, Python doesn't allow weak references to tuples."""
+
+import sys
+import time
+import argparse
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .runtime import nat
+
+
+class Shared(tuple):
+    """A hash-consed constructor value, equal to another one only if it is the
+    same object. Compared with a plain tuple it compares its items, but
+    hashes differently, so don't mix both as keys of a dictionary"""
+    __slots__ = ()
+
+    def __eq__(self, other:Any)->bool:
+        if type(other) is Shared:
+            return self is other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other:Any)->bool:
+        return not self == other
+
+    __hash__ = object.__hash__
+
+
+class HashCons():
+    "The table of the constructor values built so far"
+    table : Dict[Tuple[Any, ...], Shared]
+    # values asked for, and how many of them were already in the table
+    built : int
+    shared : int
+    # bytes of the values that weren't allocated again
+    saved : int
+
+    def __init__(self)->None:
+        self.table = {}
+        self.built = 0
+        self.shared = 0
+        self.saved = 0
+
+    def cons(self, value:Tuple[Any, ...])->Tuple[Any, ...]:
+        "The shared value equal to `value`, whose fields are shared already"
+        self.built += 1
+        try:
+            shared = self.table.get(value)
+        except TypeError:
+            # a list in a field
+            return value
+        if shared is None:
+            shared = self.table[value] = Shared(value)
+            return shared
+        self.shared += 1
+        self.saved += sys.getsizeof(shared)
+        return shared
+
+    def intern(self, value:Any)->Any:
+        "`value` built from outside the program, with its constructor values shared"
+        if type(value) is list:
+            return [self.intern(item) for item in value]
+        if isinstance(value, tuple) and type(value) is not Shared:
+            items = tuple([self.intern(item) for item in value])
+            if items and type(items[0]) is str:
+                return self.cons(items)
+            return items
+        return value
+
+    def clear(self)->None:
+        self.table.clear()
+
+
+class Memo():
+    "Function `function` answering calls it has seen from a table of the last `size` of them"
+    function : Callable[..., Any]
+    size : int
+    table : "OrderedDict[Tuple[Any, ...], Any]"
+    hits : int
+    misses : int
+    # calls with an argument that can't be a key
+    skipped : int
+
+    def __init__(self, function:Callable[..., Any], size:int=1024)->None:
+        self.function = function
+        self.size = size
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def __call__(self, *args:Any)->Any:
+        table = self.table
+        try:
+            value = table[args]
+        except KeyError:
+            pass
+        except TypeError:
+            self.skipped += 1
+            return self.function(*args)
+        else:
+            self.hits += 1
+            table.move_to_end(args)
+            return value
+        self.misses += 1
+        value = self.function(*args)
+        table[args] = value
+        if len(table) > self.size:
+            table.popitem(last=False)
+        return value
+
+    @property
+    def hit_rate(self)->float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+
+WORKLOAD = """data nat =
+  Z
+  S nat
+
+data bool =
+  T
+  F
+
+add Z $ m = m
+add S n $ m = S $ add n m
+
+eq Z $ Z = T
+eq S n $ S m = eq n m
+eq n $ m = F
+
+"""
+
+
+def main(argv:List[str])->None:
+    """Runs `eq` and `add` over every pair of Peano numbers up to `-n` with
+    plain values, hash-consed values and hash-consed values with the
+    function memoized, reporting the time, the memory the results keep alive
+    and the hit rate of the table"""
+    from .syntax import get_syntax_parser
+    from .evaluator import Evaluator
+    from .codegen import CompiledModule, compile_module
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.sharing", description=main.__doc__)
+    arg_parser.add_argument("-n", type=int, default=60, help="largest operand")
+    arg_parser.add_argument("--cache-size", type=int, default=4096)
+    arg_parser.add_argument("--compiled", action="store_true",
+        help="run compiled code, where tail calls of `eq` to itself are loops the table doesn't see")
+    args = arg_parser.parse_args(argv[1:])
+
+    module = get_syntax_parser().parse(WORKLOAD)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * args.n + 1000))
+    plain = compile_module(module, peano=False)
+    shared = compile_module(module, peano=False, hash_consing=True)
+
+    def backend(hash_consing:bool, memoize:List[str])->Any:
+        if args.compiled:
+            return CompiledModule(shared if hash_consing else plain, memoize=memoize, cache_size=args.cache_size)
+        return Evaluator(module, peano=False, hash_consing=hash_consing, memoize=memoize, cache_size=args.cache_size)
+
+    for name in ("eq", "add"):
+        print(f"{name} over every pair of numbers up to {args.n}")
+        expected : Optional[List[Any]] = None
+        for label, hash_consing, memoize in (("plain", False, []), ("hash-consed", True, []), ("memoized", True, [name])):
+            # timed without tracing, then again from scratch for the memory
+            times = []
+            for trace in (False, True):
+                configuration = backend(hash_consing, memoize)
+                numbers = [configuration.intern(nat(i)) for i in range(args.n + 1)]
+                if trace:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                results = [configuration.call(name, a, b) for a in numbers for b in numbers]
+                times.append(time.perf_counter() - start)
+            kept, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if expected is None:
+                expected = results
+            assert results == expected
+            line = f"  {label:12} {times[0]*1000:9.2f} ms  results keep {kept/1024:8.1f} KiB"
+            values = configuration.values
+            if values is not None:
+                line += f"  {values.shared}/{values.built} values shared, {values.saved/1024:.1f} KiB not allocated"
+            memo = configuration.memos.get(name)
+            if memo is not None:
+                line += f"  hits {memo.hit_rate:6.1%}"
+            print(line)
+            del results
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,154 @@
+"""Positions in a document, between offsets, lines and columns.
+
+Tokens and errors have lines and columns counting code points from 1, LSP
+clients lines from 0 and characters in UTF-16 code units, and finding
+either from an offset (or the line of an error in the text) means scanning
+the text from its start. `SourceMap` splits the text once, keeping the
+offset where every line starts: an offset is turned into its line by a
+binary search over them, and a line into its text by slicing.
+
+UTF-16 columns only differ from code point columns on lines with characters
+outside the BMP, so the table of the UTF-16 column of each code point is
+built the first time a line outside ASCII is asked for, and kept."""
+
+import sys
+import time
+import argparse
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+
+class SourceMap():
+    text : str
+    # offset of the first character of each line, `starts[line - 1]`
+    starts : List[int]
+    # UTF-16 column before each code point of the lines that aren't ASCII
+    _units : Dict[int, Optional[List[int]]]
+
+    def __init__(self, text:str)->None:
+        self.text = text
+        self.starts = [0]
+        self.starts.extend(accumulate(len(line) + 1 for line in text.split("\n")[:-1]))
+        self._units = {}
+
+    @property
+    def line_count(self)->int:
+        return len(self.starts)
+
+    def line_start(self, line:int)->int:
+        return self.starts[line - 1]
+
+    def line_end(self, line:int)->int:
+        "The offset of the `\\n` ending `line`, or the end of the text"
+        return self.starts[line] - 1 if line < len(self.starts) else len(self.text)
+
+    def line_text(self, line:int)->str:
+        "The text of `line` without its line break"
+        if not 1 <= line <= len(self.starts):
+            return ""
+        text = self.text[self.starts[line - 1]:self.line_end(line)]
+        return text[:-1] if text.endswith("\r") else text
+
+    def position(self, offset:int)->Tuple[int, int]:
+        "The line and column (from 1) of `offset`"
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def offset(self, line:int, column:int)->int:
+        return self.starts[line - 1] + column - 1
+
+    def _line_units(self, line:int)->Optional[List[int]]:
+        "The UTF-16 column before each code point of `line`, None if they are the same"
+        try:
+            return self._units[line]
+        except KeyError:
+            pass
+        text = self.text[self.starts[line - 1]:self.line_end(line)]
+        units = None
+        if not text.isascii():
+            units = list(accumulate((2 if ord(c) > 0xFFFF else 1 for c in text), initial=0))
+            if units[-1] == len(text):
+                units = None
+        self._units[line] = units
+        return units
+
+    def to_lsp(self, line:int, column:int)->Dict[str, int]:
+        "The LSP position of `line` and `column`, counted from 0 and in UTF-16"
+        index = column - 1
+        if not 1 <= line <= len(self.starts):
+            return {"line": max(line - 1, 0), "character": index}
+        units = self._line_units(line)
+        if units is not None:
+            last = len(units) - 1
+            index = units[index] if index <= last else units[last] + index - last
+        return {"line": line - 1, "character": index}
+
+    def from_lsp(self, line:int, character:int)->Tuple[int, int]:
+        "The line and column (from 1) of an LSP position"
+        line += 1
+        if not 1 <= line <= len(self.starts):
+            return line, character + 1
+        units = self._line_units(line)
+        if units is None:
+            return line, character + 1
+        last = len(units) - 1
+        if character >= units[last]:
+            return line, last + character - units[last] + 1
+        return line, bisect_left(units, character) + 1
+
+    def lsp_offset(self, line:int, character:int)->int:
+        return self.offset(*self.from_lsp(line, character))
+
+    def context(self, line:int, column:int, width:int=1, before:int=0, after:int=0)->str:
+        """`line` with carets under the `width` columns from `column`, after
+        `before` lines and followed by `after` lines"""
+        lines = [self.line_text(n) for n in range(max(line - before, 1), line + 1)]
+        lines.append(" " * (column - 1) + "^" * max(width, 1))
+        lines.extend(self.line_text(n) for n in range(line + 1, min(line + after, len(self.starts)) + 1))
+        return "\n".join(lines) + "\n"
+
+
+def main(argv:List[str])->None:
+    """Times building the source map of a large document, rendering the
+    context of diagnostics spread over it and converting their positions
+    for LSP, against finding their lines by splitting the text"""
+    import random
+
+    arg_parser = argparse.ArgumentParser(prog="python -m PyDayuri.source_map", description=main.__doc__)
+    arg_parser.add_argument("--lines", type=int, default=100000)
+    arg_parser.add_argument("--diagnostics", type=int, default=500)
+    args = arg_parser.parse_args(argv[1:])
+
+    pieces = []
+    for i in range(args.lines):
+        # one line in ten has an accent, one in a hundred an emoji
+        pieces.append(f"f{i} x $ y = g (x, y) $ h [x, {i + 1}]" + (" -- é" if i % 10 == 0 else "")
+            + (" 🦆" if i % 100 == 0 else ""))
+    text = "\n".join(pieces) + "\n"
+    rng = random.Random(0)
+    positions = [(line, rng.randint(1, 20)) for line in (rng.randint(1, args.lines) for _ in range(args.diagnostics))]
+
+    start = time.perf_counter()
+    split = []
+    for line, column in positions:
+        lines = text.split("\n", line)
+        split.append(f"{lines[line - 1]}\n{' ' * (column - 1)}^\n")
+    rescanning = time.perf_counter() - start
+
+    start = time.perf_counter()
+    source_map = SourceMap(text)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    rendered = [source_map.context(line, column) for line, column in positions]
+    converted = [source_map.to_lsp(line, column) for line, column in positions]
+    used = time.perf_counter() - start
+    assert rendered == split
+    assert all(source_map.from_lsp(p["line"], p["character"]) == position for p, position in zip(converted, positions))
+    print(f"{args.lines} lines, {len(text)} characters, {args.diagnostics} diagnostics")
+    print(f"splitting the text : {rescanning*1000:9.2f} ms")
+    print(f"source map         : {built*1000:9.2f} ms to build, {used*1000:6.2f} ms to render and convert")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,165 @@
+"""Streaming parse of very large Dayuri sources.
+
+The input is read in chunks and lexed line by line, `_NL` is the only
+terminal that spans lines and it is assembled here from the line endings,
+blank lines and the indentation of the next line. Tokens go through the
+`TreeIndenter` and into a LALR parser that is restarted at every top level
+declaration, so each one is handed out as soon as it is complete and only
+one declaration is kept in memory at a time."""
+
+import sys
+import time
+from typing import Any, IO, Iterable, Iterator, List, Optional
+
+from lark import Lark, Token
+from lark.lexer import BasicLexer, LexerState, LineCounter
+from lark.utils import TextSlice
+
+from .parser import get_parser, TreeIndenter
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def read_lines(f:IO[str], chunk_size:int=DEFAULT_CHUNK_SIZE)->Iterator[str]:
+    "Lines of `f` (with their '\\n'), reading it `chunk_size` characters at a time"
+    rest = ""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer = rest + chunk if rest else chunk
+        start = 0
+        end = buffer.find("\n")
+        while end != -1:
+            yield buffer[start:end+1]
+            start = end + 1
+            end = buffer.find("\n", start)
+        rest = buffer[start:]
+    if rest:
+        yield rest
+
+
+class StreamingLexer():
+    """Lexes a stream of lines with the terminals of `parser`, producing the
+    same tokens as lexing the whole text at once"""
+    lexer : BasicLexer
+    nl_type : str
+
+    def __init__(self, parser:Lark, nl_type:str="_NL")->None:
+        self.lexer = BasicLexer(parser.lexer_conf)
+        self.nl_type = nl_type
+
+    def _lex_line(self, line:str, end:int, pos:int, line_number:int)->Iterator[Token]:
+        line_ctr = LineCounter("\n")
+        line_ctr.line = line_number
+        state = LexerState(TextSlice(line, 0, end), line_ctr)
+        next_token = self.lexer.next_token
+        try:
+            while True:
+                token = next_token(state)
+                token.start_pos += pos
+                token.end_pos += pos
+                yield token
+        except EOFError:
+            pass
+
+    def lex(self, lines:Iterable[str])->Iterator[Token]:
+        pos = 0
+        line_number = 1
+        # the `_NL` being built, it started at the end of a previous line
+        newline : Optional[List[str]] = None
+        newline_pos = newline_line = newline_column = 0
+        for line in lines:
+            if line.endswith("\r\n"):
+                content_end = len(line) - 2
+            elif line.endswith("\n"):
+                content_end = len(line) - 1
+            else:
+                content_end = len(line)
+            indent_end = 0
+            while indent_end < content_end and line[indent_end] in " \t":
+                indent_end += 1
+
+            if newline is not None:
+                if indent_end == content_end and content_end != len(line):
+                    # blank lines are part of the `_NL`
+                    newline.append(line)
+                    pos += len(line)
+                    line_number += 1
+                    continue
+                newline.append(line[:indent_end])
+                value = "".join(newline)
+                yield Token(self.nl_type, value, newline_pos, newline_line, newline_column,
+                    line_number, indent_end + 1, pos + indent_end)
+                newline = None
+
+            if indent_end < content_end:
+                yield from self._lex_line(line, content_end, pos, line_number)
+
+            if content_end != len(line):
+                newline = [line[content_end:]]
+                newline_pos = pos + content_end
+                newline_line = line_number
+                newline_column = content_end + 1
+                line_number += 1
+            pos += len(line)
+
+        if newline is not None:
+            value = "".join(newline)
+            yield Token(self.nl_type, value, newline_pos, newline_line, newline_column,
+                line_number, 1, pos)
+
+
+def parse_declarations(lines:Iterable[str], parser:Optional[Lark]=None)->Iterator[Any]:
+    """Yields the subtrees of the top level declarations of `lines`, each one
+    as soon as the token that starts the next one is seen"""
+    if parser is None:
+        parser = get_parser()
+    indenter = TreeIndenter()
+    tokens = indenter.process(StreamingLexer(parser, indenter.NL_type).lex(lines))
+    line_end_types = (indenter.NL_type, indenter.DEDENT_type)
+
+    interactive = None
+    last = None
+    for token in tokens:
+        # a token at column 1 right after a line end leaves the indenter at
+        # its bottom level, the previous declaration is complete
+        if interactive is not None and token.column == 1 and last is not None \
+                and last.type in line_end_types and token.type not in line_end_types:
+            yield from interactive.feed_eof(last).children
+            interactive = None
+        if interactive is None:
+            interactive = parser.parse_interactive()
+        interactive.feed_token(token)
+        last = token
+    if interactive is not None:
+        yield from interactive.feed_eof(last).children
+
+
+def parse_file(path:str, parser:Optional[Lark]=None, chunk_size:int=DEFAULT_CHUNK_SIZE)->Iterator[Any]:
+    with open(path, encoding="utf8") as f:
+        yield from parse_declarations(read_lines(f, chunk_size), parser)
+
+
+def main(argv:List[str])->None:
+    """Streams a file and reports declarations/s, with `--memory` it also
+    reports the peak traced memory (much slower)"""
+    import tracemalloc
+    parser = get_parser()
+    trace_memory = "--memory" in argv[2:]
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    count = 0
+    for _ in parse_file(argv[1], parser):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{count} declarations in {elapsed:.2f} s ({count/elapsed if elapsed else 0:.1f}/s)")
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"peak traced memory: {peak/1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
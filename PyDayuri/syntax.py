@@ -0,0 +1,645 @@
+"""Typed syntax tree of Dayuri.
+
+`SyntaxBuilder` has a method for every rule (and alias) of `grammar.lark`.
+Given as `transformer` to the LALR parser it builds these nodes while
+parsing, so the lark `Tree` is never created; it can also transform an
+already built `Tree`.
+
+Parentheses are kept as `ExpGroup`/`PatternGroup`/`TypeParen` nodes, rules
+that only wrap one child (`pattern_match`, a lone `type_application`...)
+return the child itself. Names are `Path` nodes and keep their tokens, so
+positions are still available."""
+
+import sys
+import time
+from typing import Any, List, Optional, Tuple, Union
+
+from lark import Lark, Token, Transformer
+
+from .parser import load_parser
+
+
+class Node():
+    "Base of all syntax nodes, `__slots__` are the fields in order"
+    __slots__ : Tuple[str, ...] = ()
+
+    def fields(self)->Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def first_token(self)->Optional[Token]:
+        "The leftmost token of the node, for positions"
+        for value in self.fields():
+            token = _first_token(value)
+            if token is not None:
+                return token
+        return None
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.fields() == other.fields()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(repr(value) for value in self.fields())})"
+
+
+def _first_token(value:Any)->Optional[Token]:
+    if isinstance(value, Token):
+        return value
+    if isinstance(value, Node):
+        return value.first_token()
+    if isinstance(value, tuple):
+        for item in value:
+            token = _first_token(item)
+            if token is not None:
+                return token
+    return None
+
+
+class Path(Node):
+    "A possibly qualified name, `a.b.c`"
+    __slots__ = ("parts",)
+    parts : Tuple[Token, ...]
+
+    def __init__(self, parts:Tuple[Token, ...])->None:
+        self.parts = parts
+
+    @property
+    def name(self)->str:
+        return ".".join(self.parts)
+
+
+class Import(Node):
+    __slots__ = ("path", "alias")
+    path : Path
+    alias : Optional[Token]
+
+    def __init__(self, path:Path, alias:Optional[Token])->None:
+        self.path = path
+        self.alias = alias
+
+
+# Patterns
+
+class PatternHole(Node):
+    "`_`, `_1` or `_name`, the token type tells which"
+    __slots__ = ("token",)
+    token : Token
+
+    def __init__(self, token:Token)->None:
+        self.token = token
+
+
+class PatternList(Node):
+    __slots__ = ("items",)
+    items : Tuple["Pattern", ...]
+
+    def __init__(self, items:Tuple["Pattern", ...])->None:
+        self.items = items
+
+
+class PatternTuple(Node):
+    "`()` is the empty tuple"
+    __slots__ = ("items",)
+    items : Tuple["Pattern", ...]
+
+    def __init__(self, items:Tuple["Pattern", ...])->None:
+        self.items = items
+
+
+class PatternGroup(Node):
+    __slots__ = ("pattern",)
+    pattern : "Pattern"
+
+    def __init__(self, pattern:"Pattern")->None:
+        self.pattern = pattern
+
+
+class PatternApplication(Node):
+    "A constructor and its arguments, `S (S n)`"
+    __slots__ = ("head", "args")
+    head : Path
+    args : Tuple["Pattern", ...]
+
+    def __init__(self, head:Path, args:Tuple["Pattern", ...])->None:
+        self.head = head
+        self.args = args
+
+
+class PatternBind(Node):
+    "`name@pattern`"
+    __slots__ = ("name", "pattern")
+    name : Path
+    pattern : "Pattern"
+
+    def __init__(self, name:Path, pattern:"Pattern")->None:
+        self.name = name
+        self.pattern = pattern
+
+
+Pattern = Union[Path, PatternHole, PatternList, PatternTuple, PatternGroup, PatternApplication, PatternBind]
+
+
+# Types
+
+class TypeBasic(Node):
+    "`unit8`, `unit32`, `unit64` or `string`"
+    __slots__ = ("token",)
+    token : Token
+
+    def __init__(self, token:Token)->None:
+        self.token = token
+
+
+class TypeParen(Node):
+    __slots__ = ("type",)
+    type : "Type"
+
+    def __init__(self, type:"Type")->None:
+        self.type = type
+
+
+class TypeApplication(Node):
+    "`f a b`, application of types is left associative so it is kept flat"
+    __slots__ = ("head", "args")
+    head : "Type"
+    args : Tuple["Type", ...]
+
+    def __init__(self, head:"Type", args:Tuple["Type", ...])->None:
+        self.head = head
+        self.args = args
+
+
+class TypeTuple(Node):
+    "`a * b * c`"
+    __slots__ = ("items",)
+    items : Tuple["Type", ...]
+
+    def __init__(self, items:Tuple["Type", ...])->None:
+        self.items = items
+
+
+class TypeArrow(Node):
+    "`argument -> result`, right associative"
+    __slots__ = ("argument", "result")
+    argument : "Type"
+    result : "Type"
+
+    def __init__(self, argument:"Type", result:"Type")->None:
+        self.argument = argument
+        self.result = result
+
+
+Type = Union[Path, TypeBasic, TypeParen, TypeApplication, TypeTuple, TypeArrow]
+
+
+class TypeScheme(Node):
+    "A type with its `forall` variables, None when there is no `forall`"
+    __slots__ = ("variables", "type")
+    variables : Optional[Tuple[Token, ...]]
+    type : Type
+
+    def __init__(self, variables:Optional[Tuple[Token, ...]], type:Type)->None:
+        self.variables = variables
+        self.type = type
+
+
+# Expressions
+
+class Number(Node):
+    __slots__ = ("token",)
+    token : Token
+
+    def __init__(self, token:Token)->None:
+        self.token = token
+
+    @property
+    def value(self)->int:
+        return int(self.token.replace("_", ""))
+
+
+class ExpTuple(Node):
+    "`()` is the empty tuple"
+    __slots__ = ("items",)
+    items : Tuple["Exp", ...]
+
+    def __init__(self, items:Tuple["Exp", ...])->None:
+        self.items = items
+
+
+class ExpGroup(Node):
+    __slots__ = ("exp",)
+    exp : "Exp"
+
+    def __init__(self, exp:"Exp")->None:
+        self.exp = exp
+
+
+class ExpList(Node):
+    __slots__ = ("items",)
+    items : Tuple["Exp", ...]
+
+    def __init__(self, items:Tuple["Exp", ...])->None:
+        self.items = items
+
+
+class Annotated(Node):
+    "`(exp : type)`"
+    __slots__ = ("exp", "type")
+    exp : "Exp"
+    type : TypeScheme
+
+    def __init__(self, exp:"Exp", type:TypeScheme)->None:
+        self.exp = exp
+        self.type = type
+
+
+class LetBinding(Node):
+    __slots__ = ("pattern", "value")
+    pattern : Pattern
+    value : "Exp"
+
+    def __init__(self, pattern:Pattern, value:"Exp")->None:
+        self.pattern = pattern
+        self.value = value
+
+
+class Let(Node):
+    __slots__ = ("bindings", "body")
+    bindings : Tuple[LetBinding, ...]
+    body : "Exp"
+
+    def __init__(self, bindings:Tuple[LetBinding, ...], body:"Exp")->None:
+        self.bindings = bindings
+        self.body = body
+
+
+class MatchCase(Node):
+    __slots__ = ("pattern", "body")
+    pattern : Pattern
+    body : "Exp"
+
+    def __init__(self, pattern:Pattern, body:"Exp")->None:
+        self.pattern = pattern
+        self.body = body
+
+
+class Match(Node):
+    __slots__ = ("scrutinee", "cases")
+    scrutinee : "Exp"
+    cases : Tuple[MatchCase, ...]
+
+    def __init__(self, scrutinee:"Exp", cases:Tuple[MatchCase, ...])->None:
+        self.scrutinee = scrutinee
+        self.cases = cases
+
+
+class Application(Node):
+    """`function argument` or `function $ argument` (`dollar`), as in the
+    grammar `f a b` is `f` applied to `a b`, see `application_spine`"""
+    __slots__ = ("function", "argument", "dollar")
+    function : "Exp"
+    argument : "Exp"
+    dollar : bool
+
+    def __init__(self, function:"Exp", argument:"Exp", dollar:bool=False)->None:
+        self.function = function
+        self.argument = argument
+        self.dollar = dollar
+
+
+Exp = Union[Path, Number, ExpTuple, ExpGroup, ExpList, Annotated, Let, Match, Application]
+
+
+def application_spine(exp:Application)->Tuple["Exp", Tuple["Exp", ...]]:
+    """The function and arguments of an application chain: juxtaposition
+    applies to the next atom and `$` to everything after it, so
+    `add m $ mul n m` is `add` applied to `m` and `mul n m`"""
+    arguments = []
+    node = exp
+    while True:
+        argument = node.argument
+        if node.dollar or type(argument) is not Application:
+            arguments.append(argument)
+            return exp.function, tuple(arguments)
+        arguments.append(argument.function)
+        node = argument
+
+
+# Declarations
+
+class ConstructorArg(Node):
+    "`T` (`name` is None) or `(name : type)`"
+    __slots__ = ("name", "type")
+    name : Optional[Token]
+    type : Union[Token, TypeScheme]
+
+    def __init__(self, name:Optional[Token], type:Union[Token, TypeScheme])->None:
+        self.name = name
+        self.type = type
+
+
+class DataConstructor(Node):
+    __slots__ = ("name", "args")
+    name : Token
+    args : Tuple[ConstructorArg, ...]
+
+    def __init__(self, name:Token, args:Tuple[ConstructorArg, ...])->None:
+        self.name = name
+        self.args = args
+
+
+class DataType(Node):
+    __slots__ = ("name", "variables", "constructors")
+    name : Token
+    variables : Optional[Tuple[Token, ...]]
+    constructors : Tuple[DataConstructor, ...]
+
+    def __init__(self, name:Token, variables:Optional[Tuple[Token, ...]], constructors:Tuple[DataConstructor, ...])->None:
+        self.name = name
+        self.variables = variables
+        self.constructors = constructors
+
+
+class FunctionDeclaration(Node):
+    __slots__ = ("name", "type")
+    name : Token
+    type : TypeScheme
+
+    def __init__(self, name:Token, type:TypeScheme)->None:
+        self.name = name
+        self.type = type
+
+
+class FunctionDefinition(Node):
+    "`name p1 $ p2 = body`, the parameters are the patterns between `$`"
+    __slots__ = ("name", "parameters", "body")
+    name : Token
+    parameters : Tuple[Pattern, ...]
+    body : Exp
+
+    def __init__(self, name:Token, parameters:Tuple[Pattern, ...], body:Exp)->None:
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+
+
+Declaration = Union[DataType, FunctionDeclaration, FunctionDefinition]
+
+
+class Module(Node):
+    __slots__ = ("imports", "declarations")
+    imports : Tuple[Import, ...]
+    declarations : Tuple[Declaration, ...]
+
+    def __init__(self, imports:Tuple[Import, ...], declarations:Tuple[Declaration, ...])->None:
+        self.imports = imports
+        self.declarations = declarations
+
+
+def _expressions(children:List[Any])->List[Any]:
+    """`_exp` is inlined by the grammar, so an annotation arrives as an
+    expression followed by its `TypeScheme` and a number as a bare token"""
+    out : List[Any] = []
+    for child in children:
+        if type(child) is TypeScheme:
+            out[-1] = Annotated(out[-1], child)
+        elif isinstance(child, Token):
+            out.append(Number(child))
+        else:
+            out.append(child)
+    return out
+
+
+class SyntaxBuilder(Transformer):
+    "Builds the nodes of this module from the children of each rule"
+
+    def path(self, children):
+        return Path(tuple(children))
+
+    def import_(self, children):
+        return Import(children[0], children[1] if len(children) > 1 else None)
+
+    def pattern_hole(self, children):
+        return PatternHole(children[0])
+
+    def pattern_list(self, children):
+        return PatternList(tuple(children))
+
+    def patter_list_singleton(self, children):
+        return PatternList(tuple(children))
+
+    def pattern_list_empty(self, children):
+        return PatternList(())
+
+    def pattern_empty(self, children):
+        return PatternTuple(())
+
+    def pattern_group(self, children):
+        return PatternGroup(children[0])
+
+    def pattern_tuple(self, children):
+        return PatternTuple(tuple(children))
+
+    def pattern_application_recursive(self, children):
+        return tuple(children)
+
+    def pattern_application(self, children):
+        return PatternApplication(children[0], children[1])
+
+    def pattern_path(self, children):
+        return children[0]
+
+    def pattern_bind(self, children):
+        return PatternBind(children[0], children[1])
+
+    def pattern_match(self, children):
+        return children[0]
+
+    def exp_empty(self, children):
+        return ExpTuple(())
+
+    def exp_tuple(self, children):
+        return ExpTuple(tuple(_expressions(children)))
+
+    def exp_group(self, children):
+        return ExpGroup(_expressions(children)[0])
+
+    def exp_list_empty(self, children):
+        return ExpList(())
+
+    def exp_list(self, children):
+        return ExpList(tuple(_expressions(children)))
+
+    def exp_list_singleton(self, children):
+        return ExpList(tuple(_expressions(children)))
+
+    def exp_let_eq(self, children):
+        return LetBinding(children[0], _expressions(children[1:])[0])
+
+    def exp_let(self, children):
+        items = _expressions(children)
+        return Let(tuple(items[:-1]), items[-1])
+
+    def exp_match_case(self, children):
+        return MatchCase(children[0], _expressions(children[1:])[0])
+
+    def exp_match(self, children):
+        items = _expressions(children)
+        return Match(items[0], tuple(items[1:]))
+
+    def exp_application(self, children):
+        items = _expressions(children)
+        return Application(items[0], items[1])
+
+    def exp_application_dollar(self, children):
+        items = _expressions(children)
+        return Application(items[0], items[1], True)
+
+    def prenex_prefix(self, children):
+        return tuple(children)
+
+    def type_basic(self, children):
+        return TypeBasic(children[0])
+
+    def type_paren(self, children):
+        return TypeParen(children[0])
+
+    def type_var(self, children):
+        return children[0]
+
+    def type_application(self, children):
+        if len(children) == 1:
+            return children[0]
+        head, argument = children
+        if type(head) is TypeApplication:
+            return TypeApplication(head.head, head.args + (argument,))
+        return TypeApplication(head, (argument,))
+
+    def type_tuple(self, children):
+        if len(children) == 1:
+            return children[0]
+        first, item = children
+        if type(first) is TypeTuple:
+            return TypeTuple(first.items + (item,))
+        return TypeTuple((first, item))
+
+    def type_arrow(self, children):
+        if len(children) == 1:
+            return children[0]
+        return TypeArrow(children[0], children[1])
+
+    def type_exp(self, children):
+        return TypeScheme(children[0], children[1])
+
+    def data_type_constructor_arg(self, children):
+        if len(children) == 2:
+            return ConstructorArg(children[0], children[1])
+        child = children[0]
+        if isinstance(child, Token):
+            return ConstructorArg(None, child)
+        return child
+
+    def data_type_prefix(self, children):
+        return (children[0], children[1])
+
+    def data_type(self, children):
+        name, variables = children[0]
+        constructors = []
+        constructor_name = None
+        args : List[ConstructorArg] = []
+        for child in children[1:]:
+            if isinstance(child, Token):
+                if constructor_name is not None:
+                    constructors.append(DataConstructor(constructor_name, tuple(args)))
+                constructor_name = child
+                args = []
+            else:
+                args.append(child)
+        if constructor_name is not None:
+            constructors.append(DataConstructor(constructor_name, tuple(args)))
+        return DataType(name, variables, tuple(constructors))
+
+    def function_declaration(self, children):
+        return FunctionDeclaration(children[0], children[1])
+
+    def function_definition_prefix(self, children):
+        return tuple(children)
+
+    def function_definition(self, children):
+        parameters = children[1] if children[1] is not None else ()
+        return FunctionDefinition(children[0], parameters, _expressions(children[2:])[0])
+
+    def start(self, children):
+        imports = tuple(child for child in children if type(child) is Import)
+        declarations = tuple(child for child in children if type(child) is not Import)
+        return Module(imports, declarations)
+
+
+# `import` is a Python keyword, lark looks the method up by rule name
+setattr(SyntaxBuilder, "import", SyntaxBuilder.import_)
+
+
+def get_syntax_parser(**options)->Lark:
+    "A parser whose `parse` returns a `Module`"
+    return load_parser(transformer=SyntaxBuilder(), **options)[0]
+
+
+def parse(text:str, parser:Optional[Lark]=None)->Module:
+    if parser is None:
+        parser = get_syntax_parser()
+    return parser.parse(text)
+
+
+def main(argv:List[str])->None:
+    """Compares parsing to a `Tree` and transforming it against building the
+    nodes inline, in time and in memory kept per source line"""
+    import gc
+    import tracemalloc
+    from .parser import get_parser
+
+    if len(argv) > 1:
+        with open(argv[1], encoding="utf8") as f:
+            text = f.read()
+    else:
+        pieces = ["data nat =\n  Z\n  S nat\n\n"]
+        for i in range(2000):
+            pieces.append(f"f{i} : nat -> nat\nf{i} S n $ m =\n  let\n    a = (n, m)\n    b = add n $ mul m n\n  in f a [b, 3]\n\n")
+        text = "".join(pieces)
+    lines = text.count("\n") + 1
+
+    tree_parser = get_parser()
+    inline_parser = get_syntax_parser()
+    builder = SyntaxBuilder()
+
+    def measure(function):
+        best = None
+        for _ in range(3):
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        gc.collect()
+        tracemalloc.start()
+        result = function()
+        gc.collect()
+        kept, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        return best, kept
+
+    tree_time, tree_memory = measure(lambda: tree_parser.parse(text))
+    convert_time, _ = measure(lambda: builder.transform(tree_parser.parse(text)))
+    inline_time, inline_memory = measure(lambda: inline_parser.parse(text))
+
+    print(f"{lines} lines, {len(text)} characters")
+    print(f"Tree             : {tree_time*1000:9.2f} ms {tree_memory/lines:8.1f} bytes/line")
+    print(f"Tree + transform : {convert_time*1000:9.2f} ms")
+    print(f"inline nodes     : {inline_time*1000:9.2f} ms {inline_memory/lines:8.1f} bytes/line")
+    print(f"speedup          : {convert_time/inline_time:.2f}x, memory {tree_memory/inline_memory:.2f}x smaller")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
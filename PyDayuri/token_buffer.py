@@ -0,0 +1,296 @@
+"""Tokens kept as parallel arrays instead of lark `Token` objects.
+
+A `TokenBuffer` stores, for every token, a type id, its start and end
+offsets in the text and the indentation level of its line. Values, lines
+and columns are computed on demand from the text and a table of line
+starts. `lex_buffer` fills one with the terminals of the parser,
+`indent_buffer` adds the `_INDENT`/`_DEDENT` tokens the `TreeIndenter`
+would and `parse_buffer` feeds it to the LALR parser, building a `Token`
+only when the parser asks for the next one."""
+
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lark import Lark, Token
+from lark.exceptions import UnexpectedCharacters
+from lark.indenter import DedentError
+from lark.lexer import BasicLexer, UnlessCallback
+from lark.parsers.lalr_parser_state import ParseConf, ParserState
+from lark.utils import TextSlice
+
+from .parser import get_parser, TreeIndenter
+
+
+def line_table(text:str)->"array[int]":
+    "Offsets where each line of `text` starts"
+    starts = array("I", [0])
+    find = text.find
+    pos = find("\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = find("\n", pos + 1)
+    return starts
+
+
+class TokenBuffer():
+    """The tokens of `text`, `levels` holds the indentation of the line a
+    token ends on, for `_INDENT`/`_DEDENT` the level they open or go back to"""
+    text : str
+    type_names : List[str]
+    type_ids : Dict[str, int]
+    types : "array[int]"
+    starts : "array[int]"
+    ends : "array[int]"
+    levels : "array[int]"
+    line_starts : "array[int]"
+
+    def __init__(self, text:str, type_names:Optional[List[str]]=None, line_starts:Optional["array[int]"]=None)->None:
+        self.text = text
+        self.type_names = list(type_names) if type_names is not None else []
+        self.type_ids = {name: i for i, name in enumerate(self.type_names)}
+        self.types = array("H")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.levels = array("H")
+        self.line_starts = line_starts if line_starts is not None else line_table(text)
+
+    def type_id(self, name:str)->int:
+        type_id = self.type_ids.get(name)
+        if type_id is None:
+            type_id = len(self.type_names)
+            self.type_ids[name] = type_id
+            self.type_names.append(name)
+        return type_id
+
+    def append(self, type_id:int, start:int, end:int, level:int)->None:
+        self.types.append(type_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.levels.append(level)
+
+    def __len__(self)->int:
+        return len(self.types)
+
+    @property
+    def nbytes(self)->int:
+        "Memory taken by the arrays, the text is shared with the caller"
+        arrays = (self.types, self.starts, self.ends, self.levels, self.line_starts)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def type(self, i:int)->str:
+        return self.type_names[self.types[i]]
+
+    def value(self, i:int)->str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def line_column(self, pos:int)->Tuple[int, int]:
+        "1 based line and column of the offset `pos`, as lark counts them"
+        line = bisect_right(self.line_starts, pos) - 1
+        return line + 1, pos - self.line_starts[line] + 1
+
+    def token(self, i:int)->Token:
+        start = self.starts[i]
+        end = self.ends[i]
+        line, column = self.line_column(start)
+        end_line, end_column = self.line_column(end)
+        return Token(self.type(i), self.text[start:end], start, line, column, end_line, end_column, end)
+
+    def __iter__(self)->Iterator[Token]:
+        "The tokens in order, lines are followed with a cursor instead of a search"
+        text = self.text
+        names = self.type_names
+        types = self.types
+        starts = self.starts
+        ends = self.ends
+        line_starts = self.line_starts
+        last_line = len(line_starts) - 1
+        line = 0
+        for i in range(len(types)):
+            start = starts[i]
+            end = ends[i]
+            while line < last_line and line_starts[line + 1] <= start:
+                line += 1
+            end_line = line
+            while end_line < last_line and line_starts[end_line + 1] <= end:
+                end_line += 1
+            yield Token(names[types[i]], text[start:end], start, line + 1, start - line_starts[line] + 1,
+                end_line + 1, end - line_starts[end_line] + 1, end)
+
+
+def _indentation(text:str, start:int, end:int, tab_len:int)->int:
+    "Width of the spaces and tabs after the last newline of text[start:end]"
+    indent_start = text.rfind("\n", start, end) + 1
+    if indent_start == 0:
+        indent_start = start
+    indent = text[indent_start:end]
+    return indent.count(" ") + indent.count("\t") * tab_len
+
+
+def lex_buffer(parser:Lark, text:str, tab_len:int=TreeIndenter.tab_len, nl_type:str="_NL")->TokenBuffer:
+    """Lexes `text` with the terminals of `parser` into a buffer, as a
+    `BasicLexer` would (a keyword is always a keyword, there is no parser
+    state to tell it apart from a name)"""
+    lexer = BasicLexer(parser.lexer_conf)
+    scanner = lexer.scanner
+    callbacks = lexer.callback
+    ignore_types = lexer.ignore_types
+    buffer = TokenBuffer(text)
+    type_id = buffer.type_id
+    type_ids = buffer.type_ids
+    nl_id = type_id(nl_type)
+    append = buffer.append
+    match = scanner.match
+    source = TextSlice.cast_from(text)
+    end = len(text)
+
+    pos = 0
+    first_indent = 0
+    while first_indent < end and text[first_indent] in " \t":
+        first_indent += 1
+    level = _indentation(text, 0, first_indent, tab_len)
+    while pos < end:
+        result = match(source, pos)
+        if not result:
+            line, column = buffer.line_column(pos)
+            raise UnexpectedCharacters(text, pos, line, column,
+                allowed=scanner.allowed_types - ignore_types, terminals_by_name=lexer.terminals_by_name)
+        value, type_name = result
+        token_end = pos + len(value)
+        if type_name in callbacks:
+            callback = callbacks[type_name]
+            if isinstance(callback, UnlessCallback):
+                type_name = callback.scanner.fullmatch(value) or type_name
+            else:
+                type_name = callback(Token(type_name, value, pos)).type
+        if type_name not in ignore_types:
+            token_type = type_ids.get(type_name)
+            if token_type is None:
+                token_type = type_id(type_name)
+            if token_type == nl_id:
+                level = _indentation(text, pos, token_end, tab_len)
+            append(token_type, pos, token_end, level)
+        pos = token_end
+    return buffer
+
+
+def indent_buffer(buffer:TokenBuffer, indenter:Optional[TreeIndenter]=None)->TokenBuffer:
+    """A new buffer with the tokens of `indenter` added, in the same order
+    lark's `Indenter` yields them. They are empty and placed at the end of
+    the `_NL` that caused them, that is before the first token of the line
+    they belong to; the ones that close the input are at its end."""
+    if indenter is None:
+        indenter = TreeIndenter()
+    out = TokenBuffer(buffer.text, buffer.type_names, buffer.line_starts)
+    nl_id = out.type_id(indenter.NL_type)
+    indent_id = out.type_id(indenter.INDENT_type)
+    dedent_id = out.type_id(indenter.DEDENT_type)
+    open_ids = {out.type_id(name) for name in indenter.OPEN_PAREN_types}
+    close_ids = {out.type_id(name) for name in indenter.CLOSE_PAREN_types}
+
+    types = buffer.types
+    starts = buffer.starts
+    ends = buffer.ends
+    levels = buffer.levels
+    append = out.append
+    stack = [0]
+    paren_level = 0
+    for i in range(len(types)):
+        token_type = types[i]
+        if token_type == nl_id:
+            if paren_level > 0:
+                continue
+            end = ends[i]
+            level = levels[i]
+            append(token_type, starts[i], end, level)
+            if level > stack[-1]:
+                stack.append(level)
+                append(indent_id, end, end, level)
+            else:
+                while level < stack[-1]:
+                    stack.pop()
+                    append(dedent_id, end, end, stack[-1])
+                if level != stack[-1]:
+                    raise DedentError('Unexpected dedent to column %s. Expected dedent to %s' % (level, stack[-1]))
+            continue
+        append(token_type, starts[i], ends[i], levels[i])
+        if token_type in open_ids:
+            paren_level += 1
+        elif token_type in close_ids:
+            paren_level -= 1
+            assert paren_level >= 0
+
+    end = len(buffer.text)
+    while len(stack) > 1:
+        stack.pop()
+        append(dedent_id, end, end, stack[-1])
+    return out
+
+
+def parse_buffer(buffer:TokenBuffer, parser:Optional[Lark]=None, start:str="start")->Any:
+    """Runs the LALR parser of `parser` (with its callbacks or transformer)
+    over an indented buffer"""
+    if parser is None:
+        parser = get_parser()
+    lalr = parser.parser.parser.parser
+    state = ParserState(ParseConf(lalr.parse_table, lalr.callbacks, start), None)
+    feed_token = state.feed_token
+    for token in buffer:
+        feed_token(token)
+    end = len(buffer.text)
+    line, column = buffer.line_column(end)
+    return feed_token(Token("$END", "", end, line, column, line, column, end), True)
+
+
+def tokenize(text:str, parser:Optional[Lark]=None)->TokenBuffer:
+    "Lexes and indents `text`, ready for `parse_buffer`"
+    if parser is None:
+        parser = get_parser()
+    return indent_buffer(lex_buffer(parser, text))
+
+
+def main(argv:List[str])->None:
+    "Compares the memory kept by lark tokens against a buffer, and parses from the buffer"
+    import gc
+    import tracemalloc
+
+    if len(argv) > 1:
+        with open(argv[1], encoding="utf8") as f:
+            text = f.read()
+    else:
+        pieces = ["data nat =\n  Z\n  S nat\n\n"]
+        for i in range(5000):
+            pieces.append(f"f{i} : nat -> nat\nf{i} S n $ m =\n  let\n    a = (n, m)\n    b = add n $ mul m n\n  in f a [b, 3]\n\n")
+        text = "".join(pieces)
+    parser = get_parser()
+
+    def kept(function):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, memory, elapsed
+
+    tokens, token_memory, token_time = kept(lambda: list(parser.lex(text)))
+    buffer, buffer_memory, buffer_time = kept(lambda: tokenize(text, parser))
+    del tokens
+
+    start = time.perf_counter()
+    parse_buffer(buffer, parser)
+    parse_time = time.perf_counter() - start
+
+    print(f"{len(buffer)} tokens, {len(text)} characters")
+    print(f"lark tokens  : {token_memory/1024:10.1f} KiB  {token_time*1000:8.2f} ms")
+    print(f"token buffer : {buffer_memory/1024:10.1f} KiB  {buffer_time*1000:8.2f} ms ({buffer.nbytes/1024:.1f} KiB of arrays)")
+    print(f"memory       : {buffer_memory/token_memory:.1%} of the lark tokens")
+    print(f"parse buffer : {parse_time*1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
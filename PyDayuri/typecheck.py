@@ -0,0 +1,822 @@
+"""Type checking of Dayuri modules, one declaration group at a time.
+
+Every function is checked as a unit made of its signature and all its
+clauses, every `data` declaration as another. The result of a unit is
+memoized by the text of its declarations and the text of the signatures
+and `data` declarations it names, so after an edit only the units whose
+text changed, or that use a signature or data type that changed, are
+checked again. `TypeChecker` gets the declarations and their texts from an
+`IncrementalParser`, which also re-parses only what an edit touched.
+
+The checker is bidirectional with unification: the `forall` variables of a
+signature are rigid inside its clauses and instantiated with fresh
+variables where the function is used. Numbers are `unit64`, lists have no
+type yet and names brought by `import` aren't known, they are reported."""
+
+import sys
+import time
+from itertools import count
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from lark import Lark, Token
+
+from .incremental import Declaration, IncrementalParser
+from .syntax import (SyntaxBuilder, Node, Path, PatternHole, PatternList, PatternTuple, PatternGroup,
+    PatternApplication, PatternBind, TypeBasic, TypeParen, TypeApplication, TypeTuple, TypeArrow,
+    TypeScheme, Number, ExpTuple, ExpGroup, ExpList, Annotated, Let, Match, Application,
+    ConstructorArg, DataType, FunctionDeclaration, FunctionDefinition, application_spine)
+
+ARROW = "->"
+TUPLE = "*"
+
+
+# Types
+
+class TypeVariable():
+    "A `forall` variable, rigid: it is only equal to itself"
+    __slots__ = ("name",)
+    name : str
+
+    def __init__(self, name:str)->None:
+        self.name = name
+
+
+class MetaVariable():
+    "An unknown type, `value` is set when unification finds it"
+    __slots__ = ("id", "value")
+    id : int
+    value : Optional["CheckType"]
+
+    def __init__(self, id:int)->None:
+        self.id = id
+        self.value = None
+
+
+class TypeConstructor():
+    "A data type, a basic type, `->` or `*` applied to `args`"
+    __slots__ = ("name", "args")
+    name : str
+    args : Tuple["CheckType", ...]
+
+    def __init__(self, name:str, args:Tuple["CheckType", ...]=())->None:
+        self.name = name
+        self.args = args
+
+
+CheckType = Union[TypeVariable, MetaVariable, TypeConstructor]
+
+NUMBER_TYPE = TypeConstructor("unit64")
+
+
+def arrow(argument:CheckType, result:CheckType)->TypeConstructor:
+    return TypeConstructor(ARROW, (argument, result))
+
+
+def resolve(t:CheckType)->CheckType:
+    while type(t) is MetaVariable and t.value is not None:
+        t = t.value
+    return t
+
+
+def show(t:CheckType, precedence:int=0)->str:
+    "`t` in Dayuri syntax, unknown types are `?n`"
+    t = resolve(t)
+    if type(t) is TypeVariable:
+        return t.name
+    if type(t) is MetaVariable:
+        return f"?{t.id}"
+    assert type(t) is TypeConstructor
+    if t.name == ARROW:
+        text = f"{show(t.args[0], 2)} -> {show(t.args[1], 1)}"
+        return f"({text})" if precedence > 1 else text
+    if t.name == TUPLE:
+        if not t.args:
+            return "()"
+        text = " * ".join(show(arg, 3) for arg in t.args)
+        return f"({text})" if precedence > 2 else text
+    if not t.args:
+        return t.name
+    text = " ".join([t.name] + [show(arg, 4) for arg in t.args])
+    return f"({text})" if precedence > 3 else text
+
+
+class Scheme():
+    "A type with its `forall` variables"
+    variables : Tuple[str, ...]
+    type : CheckType
+
+    def __init__(self, variables:Tuple[str, ...], type:CheckType)->None:
+        self.variables = variables
+        self.type = type
+
+    def instantiate(self, fresh:"count[int]")->CheckType:
+        if not self.variables:
+            return self.type
+        return _substitute(self.type, {name: MetaVariable(next(fresh)) for name in self.variables})
+
+
+def _substitute(t:CheckType, mapping:Dict[str, CheckType])->CheckType:
+    if type(t) is TypeVariable:
+        return mapping.get(t.name, t)
+    if type(t) is TypeConstructor and t.args:
+        return TypeConstructor(t.name, tuple(_substitute(arg, mapping) for arg in t.args))
+    return t
+
+
+def convert_type(node:Any, variables:Iterable[str])->CheckType:
+    """The checker type of a syntax type, names that aren't `variables`
+    are data types, whether they exist is checked by `_validate_type`"""
+    variables = set(variables)
+
+    def convert(node:Any)->CheckType:
+        kind = type(node)
+        if kind is Path:
+            name = node.name
+            return TypeVariable(name) if name in variables else TypeConstructor(name)
+        if kind is TypeBasic:
+            return TypeConstructor(str(node.token))
+        if kind is TypeParen:
+            return convert(node.type)
+        if kind is TypeApplication:
+            if type(node.head) is not Path or node.head.name in variables:
+                raise CheckError(node.first_token(), "only data types can be applied to types")
+            return TypeConstructor(node.head.name, tuple(convert(arg) for arg in node.args))
+        if kind is TypeTuple:
+            return TypeConstructor(TUPLE, tuple(convert(item) for item in node.items))
+        if kind is TypeArrow:
+            return arrow(convert(node.argument), convert(node.result))
+        if kind is TypeScheme:
+            return convert(node.type)
+        raise TypeError(f"not a type: {node!r}")
+
+    return convert(node)
+
+
+def scheme_of(node:TypeScheme, extra:Tuple[str, ...]=())->Scheme:
+    variables = extra + tuple(str(v) for v in node.variables or ())
+    return Scheme(variables, convert_type(node.type, variables))
+
+
+# Errors
+
+class CheckError(Exception):
+    "Stops the check of a clause, `token` is where the error is"
+    token : Optional[Token]
+    message : str
+
+    def __init__(self, token:Optional[Token], message:str)->None:
+        super().__init__(message)
+        self.token = token
+        self.message = message
+
+
+class TypeCheckError():
+    "A type error, `name` is the function or data type it is in"
+    name : str
+    line : int
+    column : int
+    message : str
+
+    def __init__(self, name:str, line:int, column:int, message:str)->None:
+        self.name = name
+        self.line = line
+        self.column = column
+        self.message = message
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: type error in `{self.name}`: {self.message}"
+
+    def __repr__(self):
+        return f"TypeCheckError({self.name}, line={self.line}, column={self.column})"
+
+
+# Unification
+
+class _Mismatch(Exception):
+    pass
+
+
+def _occurs(meta:MetaVariable, t:CheckType)->bool:
+    t = resolve(t)
+    if t is meta:
+        return True
+    return type(t) is TypeConstructor and any(_occurs(meta, arg) for arg in t.args)
+
+
+def _unify(a:CheckType, b:CheckType)->None:
+    a = resolve(a)
+    b = resolve(b)
+    if a is b:
+        return
+    if type(a) is MetaVariable:
+        if _occurs(a, b):
+            raise _Mismatch()
+        a.value = b
+    elif type(b) is MetaVariable:
+        _unify(b, a)
+    elif type(a) is TypeVariable:
+        if type(b) is not TypeVariable or a.name != b.name:
+            raise _Mismatch()
+    elif type(a) is TypeConstructor and type(b) is TypeConstructor \
+            and a.name == b.name and len(a.args) == len(b.args):
+        for x, y in zip(a.args, b.args):
+            _unify(x, y)
+    else:
+        raise _Mismatch()
+
+
+def unify(found:CheckType, expected:CheckType, token:Optional[Token])->None:
+    try:
+        _unify(found, expected)
+    except _Mismatch:
+        raise CheckError(token, f"expected `{show(expected)}`, found `{show(found)}`") from None
+
+
+# Environment
+
+class DataInfo():
+    "What other declarations see of a `data` declaration"
+    name : str
+    variables : Tuple[str, ...]
+    # constructor name -> (number of arguments, type)
+    constructors : Dict[str, Tuple[int, Scheme]]
+
+    def __init__(self, node:DataType)->None:
+        self.name = str(node.name)
+        self.variables = tuple(str(v) for v in node.variables or ())
+        result = TypeConstructor(self.name, tuple(TypeVariable(v) for v in self.variables))
+        self.constructors = {}
+        for constructor in node.constructors:
+            t : CheckType = result
+            for arg in reversed(constructor.args):
+                t = arrow(_constructor_arg_type(arg, self.variables), t)
+            self.constructors[str(constructor.name)] = (len(constructor.args), Scheme(self.variables, t))
+
+
+def _constructor_arg_type(arg:ConstructorArg, variables:Tuple[str, ...])->CheckType:
+    if isinstance(arg.type, Token):
+        name = str(arg.type)
+        return TypeVariable(name) if name in variables else TypeConstructor(name)
+    return convert_type(arg.type, variables + tuple(str(v) for v in arg.type.variables or ()))
+
+
+class Environment():
+    "The data types, constructors and signatures a unit can refer to"
+    data : Dict[str, DataInfo]
+    constructors : Dict[str, Tuple[int, Scheme]]
+    # None when the signature itself doesn't convert
+    functions : Dict[str, Optional[Scheme]]
+
+    def __init__(self)->None:
+        self.data = {}
+        self.constructors = {}
+        self.functions = {}
+
+
+def _validate_type(node:Any, variables:Set[str], env:Environment)->None:
+    "Every name of a syntax type is a variable or a data type with the right number of arguments"
+    kind = type(node)
+    if kind is Path:
+        name = node.name
+        if name in variables:
+            return
+        info = env.data.get(name)
+        if info is None:
+            raise CheckError(node.first_token(), f"unknown type `{name}`")
+        if info.variables:
+            raise CheckError(node.first_token(), f"`{name}` takes {len(info.variables)} type arguments")
+    elif kind is TypeApplication:
+        head = node.head
+        if type(head) is not Path or head.name in variables:
+            raise CheckError(node.first_token(), "only data types can be applied to types")
+        info = env.data.get(head.name)
+        if info is None:
+            raise CheckError(head.first_token(), f"unknown type `{head.name}`")
+        if len(info.variables) != len(node.args):
+            raise CheckError(head.first_token(),
+                f"`{head.name}` takes {len(info.variables)} type arguments, given {len(node.args)}")
+        for arg in node.args:
+            _validate_type(arg, variables, env)
+    elif kind is TypeParen:
+        _validate_type(node.type, variables, env)
+    elif kind is TypeTuple:
+        for item in node.items:
+            _validate_type(item, variables, env)
+    elif kind is TypeArrow:
+        _validate_type(node.argument, variables, env)
+        _validate_type(node.result, variables, env)
+    elif kind is TypeScheme:
+        _validate_type(node.type, variables | {str(v) for v in node.variables or ()}, env)
+
+
+# Checking
+
+class _ClauseChecker():
+    "Inference and checking of the expressions and patterns of one clause"
+    env : Environment
+    fresh : "count[int]"
+
+    def __init__(self, env:Environment)->None:
+        self.env = env
+        self.fresh = count()
+
+    def meta(self)->MetaVariable:
+        return MetaVariable(next(self.fresh))
+
+    def constructor(self, path:Path)->Tuple[int, CheckType]:
+        found = self.env.constructors.get(path.name)
+        if found is None:
+            raise CheckError(path.first_token(), f"unknown constructor `{path.name}`")
+        arity, scheme = found
+        return arity, scheme.instantiate(self.fresh)
+
+    def pattern(self, node:Any, expected:CheckType, bindings:Dict[str, CheckType])->None:
+        kind = type(node)
+        if kind is Path:
+            if node.name in self.env.constructors:
+                arity, t = self.constructor(node)
+                if arity:
+                    raise CheckError(node.first_token(), f"`{node.name}` takes {arity} arguments, given 0")
+                unify(t, expected, node.first_token())
+            elif len(node.parts) == 1:
+                self.bind(node, expected, bindings)
+            else:
+                raise CheckError(node.first_token(), f"unknown constructor `{node.name}`")
+        elif kind is PatternHole:
+            pass
+        elif kind is PatternGroup:
+            self.pattern(node.pattern, expected, bindings)
+        elif kind is PatternBind:
+            self.bind(node.name, expected, bindings)
+            self.pattern(node.pattern, expected, bindings)
+        elif kind is PatternTuple:
+            items = tuple(self.meta() for _ in node.items)
+            unify(TypeConstructor(TUPLE, items), expected, node.first_token())
+            for item, t in zip(node.items, items):
+                self.pattern(item, t, bindings)
+        elif kind is PatternApplication:
+            arity, t = self.constructor(node.head)
+            if arity != len(node.args):
+                raise CheckError(node.first_token(), f"`{node.head.name}` takes {arity} arguments, given {len(node.args)}")
+            for arg in node.args:
+                t = resolve(t)
+                assert type(t) is TypeConstructor and t.name == ARROW
+                self.pattern(arg, t.args[0], bindings)
+                t = t.args[1]
+            unify(t, expected, node.first_token())
+        elif kind is PatternList:
+            raise CheckError(node.first_token(), "list patterns have no type yet")
+        else:
+            raise TypeError(f"not a pattern: {node!r}")
+
+    def bind(self, path:Path, t:CheckType, bindings:Dict[str, CheckType])->None:
+        if path.name in bindings:
+            raise CheckError(path.first_token(), f"`{path.name}` is bound twice")
+        bindings[path.name] = t
+
+    def infer(self, node:Any, scope:Dict[str, CheckType])->CheckType:
+        kind = type(node)
+        if kind is Path:
+            name = node.name
+            if name in scope:
+                return scope[name]
+            if name in self.env.constructors:
+                return self.constructor(node)[1]
+            if name in self.env.functions:
+                scheme = self.env.functions[name]
+                # a broken signature is reported with its own function
+                return scheme.instantiate(self.fresh) if scheme is not None else self.meta()
+            raise CheckError(node.first_token(), f"unknown name `{name}`")
+        if kind is Application:
+            head, args = application_spine(node)
+            t = self.infer(head, scope)
+            for arg in args:
+                function = resolve(t)
+                if type(function) is MetaVariable:
+                    function.value = arrow(self.meta(), self.meta())
+                    function = function.value
+                if type(function) is not TypeConstructor or function.name != ARROW:
+                    raise CheckError(arg.first_token(), f"too many arguments, `{show(t)}` isn't a function")
+                self.check(arg, function.args[0], scope)
+                t = function.args[1]
+            return t
+        if kind is Number:
+            return NUMBER_TYPE
+        if kind is ExpGroup:
+            return self.infer(node.exp, scope)
+        if kind is ExpTuple:
+            return TypeConstructor(TUPLE, tuple(self.infer(item, scope) for item in node.items))
+        if kind is Annotated:
+            variables = {str(v) for v in node.type.variables or ()}
+            _validate_type(node.type.type, variables, self.env)
+            t = convert_type(node.type.type, variables)
+            self.check(node.exp, t, scope)
+            return t
+        if kind is Let:
+            for binding in node.bindings:
+                value = self.infer(binding.value, scope)
+                bindings : Dict[str, CheckType] = {}
+                self.pattern(binding.pattern, value, bindings)
+                scope = {**scope, **bindings}
+            return self.infer(node.body, scope)
+        if kind is Match:
+            scrutinee = self.infer(node.scrutinee, scope)
+            result = self.meta()
+            for case in node.cases:
+                bindings = {}
+                self.pattern(case.pattern, scrutinee, bindings)
+                self.check(case.body, result, {**scope, **bindings})
+            return result
+        if kind is ExpList:
+            raise CheckError(node.first_token(), "list expressions have no type yet")
+        raise TypeError(f"not an expression: {node!r}")
+
+    def check(self, node:Any, expected:CheckType, scope:Dict[str, CheckType])->None:
+        unify(self.infer(node, scope), expected, node.first_token())
+
+    def clause(self, clause:FunctionDefinition, scheme:Scheme)->None:
+        t = scheme.type
+        bindings : Dict[str, CheckType] = {}
+        for parameter in clause.parameters:
+            function = resolve(t)
+            if type(function) is not TypeConstructor or function.name != ARROW:
+                raise CheckError(parameter.first_token(),
+                    f"`{clause.name}` has {len(clause.parameters)} parameters, its type `{show(scheme.type)}` fewer")
+            self.pattern(parameter, function.args[0], bindings)
+            t = function.args[1]
+        self.check(clause.body, t, bindings)
+
+
+# (index of the part, line and column relative to the part, message)
+UnitError = Tuple[int, int, int, str]
+
+
+def _error(part:int, e:CheckError)->UnitError:
+    token = e.token
+    if token is None or token.line is None:
+        return (part, 1, 1, e.message)
+    return (part, token.line, token.column, e.message)
+
+
+def check_function(name:str, parts:List[Node], env:Environment)->List[UnitError]:
+    "Errors of the signature and clauses of function `name`, in the order of `parts`"
+    errors : List[UnitError] = []
+    signatures = [i for i, node in enumerate(parts) if type(node) is FunctionDeclaration]
+    scheme = None
+    if not signatures:
+        errors.append(_error(0, CheckError(parts[0].first_token(), f"`{name}` has no type signature")))
+    else:
+        for index in signatures[1:]:
+            errors.append(_error(index, CheckError(parts[index].first_token(), f"`{name}` has a second type signature")))
+        signature = parts[signatures[0]]
+        try:
+            _validate_type(signature.type, set(), env)
+            scheme = scheme_of(signature.type)
+        except CheckError as e:
+            errors.append(_error(signatures[0], e))
+    if scheme is None:
+        return errors
+    for index, node in enumerate(parts):
+        if type(node) is not FunctionDefinition:
+            continue
+        try:
+            _ClauseChecker(env).clause(node, scheme)
+        except CheckError as e:
+            errors.append(_error(index, e))
+    return errors
+
+
+def check_data(node:DataType, env:Environment)->List[UnitError]:
+    errors : List[UnitError] = []
+    variables = {str(v) for v in node.variables or ()}
+    seen : Set[str] = set()
+    for constructor in node.constructors:
+        if constructor.name in seen:
+            errors.append(_error(0, CheckError(constructor.name, f"constructor `{constructor.name}` is defined twice")))
+        seen.add(str(constructor.name))
+        for arg in constructor.args:
+            try:
+                if isinstance(arg.type, Token):
+                    _validate_type(Path((arg.type,)), variables, env)
+                else:
+                    _validate_type(arg.type, variables, env)
+            except CheckError as e:
+                errors.append(_error(0, e))
+    return errors
+
+
+def _referenced(value:Any, names:Set[str])->None:
+    "Adds every name used in `value`, local ones included"
+    if type(value) is Path:
+        names.add(value.name)
+    elif type(value) is ConstructorArg and isinstance(value.type, Token):
+        names.add(str(value.type))
+    elif isinstance(value, Node):
+        for field in value.fields():
+            _referenced(field, names)
+    elif type(value) is tuple:
+        for item in value:
+            _referenced(item, names)
+
+
+class Unit():
+    "A function (signature and clauses) or a data type, with the declarations it comes from"
+    name : str
+    parts : List[Tuple[Declaration, Node]]
+    # names the unit uses and the key of its `errors`, set when it is checked
+    names : Tuple[str, ...]
+    key : Optional[Tuple[Tuple[str, ...], Tuple[Optional[str], ...]]]
+    errors : List[UnitError]
+    # what a data unit defines
+    info : Optional[DataInfo]
+
+    def __init__(self, name:str)->None:
+        self.name = name
+        self.parts = []
+        self.names = ()
+        self.key = None
+        self.errors = []
+        self.info = None
+
+    @property
+    def texts(self)->Tuple[str, ...]:
+        return tuple([declaration.text for declaration, _ in self.parts])
+
+    def first(self, kind:type)->Optional[Tuple[Declaration, Node]]:
+        for part in self.parts:
+            if type(part[1]) is kind:
+                return part
+        return None
+
+
+def _position(part:Tuple[Declaration, Node])->int:
+    return part[0].start_pos
+
+
+class TypeChecker():
+    """Parses and checks a buffer, `edit` checks again only the units the
+    edit could change. `checked` is the number of units checked by the
+    last `check`/`edit`.
+
+    The units, the environment and the index of which units use a name
+    are updated from the declarations the `IncrementalParser` removed and
+    added, so an edit costs what it touches and not the size of the buffer."""
+    parser : IncrementalParser
+    checked : int
+    env : Environment
+
+    def __init__(self, parser:Optional[Lark]=None)->None:
+        self.parser = IncrementalParser(parser)
+        self.checked = 0
+        self._builder = SyntaxBuilder()
+        self._reset()
+
+    def _reset(self)->None:
+        self.env = Environment()
+        self._nodes : Dict[Declaration, List[Node]] = {}
+        self._functions : Dict[str, Unit] = {}
+        # data units by declaration, and by the type and constructor names they define
+        self._data_units : Dict[Declaration, Unit] = {}
+        self._types : Dict[str, List[Unit]] = {}
+        self._constructors : Dict[str, List[Unit]] = {}
+        # the declaration text each name of the environment comes from
+        self._providers : Dict[str, str] = {}
+        self._dependents : Dict[str, Set[Unit]] = {}
+        self._with_errors : Set[Unit] = set()
+        # results by unit key, shared by units with the same text and dependencies
+        self._results : Dict[Tuple[Tuple[str, ...], Tuple[Optional[str], ...]], List[UnitError]] = {}
+
+    def check(self, text:str)->List[TypeCheckError]:
+        self.parser.parse(text)
+        self._reset()
+        return self._update()
+
+    def edit(self, start:int, end:int, new_text:str)->List[TypeCheckError]:
+        self.parser.edit(start, end, new_text)
+        return self._update()
+
+    @property
+    def errors(self)->List[TypeCheckError]:
+        errors = [self._located(unit, error) for unit in self._with_errors for error in unit.errors]
+        for name, units in self._types.items():
+            for unit in units[1:]:
+                errors.append(self._located(unit, (0, *self._name_position(unit), f"data type `{name}` is defined twice")))
+        for name, units in self._constructors.items():
+            for unit in units[1:]:
+                errors.append(self._located(unit, (0, *self._name_position(unit), f"constructor `{name}` is already defined")))
+        errors.sort(key=lambda error: (error.line, error.column))
+        return errors
+
+    def _name_position(self, unit:Unit)->Tuple[int, int]:
+        token = unit.parts[0][1].name
+        return token.line, token.column
+
+    def _located(self, unit:Unit, error:UnitError)->TypeCheckError:
+        part, line, column, message = error
+        declaration = unit.parts[part][0]
+        return TypeCheckError(unit.name, declaration.line + line - 1, column, message)
+
+    def _update(self)->List[TypeCheckError]:
+        dirty : Set[Unit] = set()
+        functions : Set[str] = set()
+        names : Set[str] = set()
+
+        for declaration in self.parser.removed:
+            for node in self._nodes.pop(declaration, ()):
+                if type(node) is DataType:
+                    unit = self._data_units.pop(declaration)
+                    self._forget(unit)
+                    self._with_errors.discard(unit)
+                    self._types[unit.name].remove(unit)
+                    names.add(unit.name)
+                    for constructor in unit.info.constructors:
+                        self._constructors[constructor].remove(unit)
+                        names.add(constructor)
+                else:
+                    name = str(node.name)
+                    unit = self._functions[name]
+                    unit.parts = [part for part in unit.parts if part[0] is not declaration]
+                    functions.add(name)
+
+        for declaration in self.parser.added:
+            nodes = self._nodes[declaration] = [self._builder.transform(child) for child in declaration.children]
+            for node in nodes:
+                if type(node) is DataType:
+                    unit = Unit(str(node.name))
+                    unit.parts.append((declaration, node))
+                    unit.info = DataInfo(node)
+                    self._data_units[declaration] = unit
+                    self._types.setdefault(unit.name, []).append(unit)
+                    names.add(unit.name)
+                    for constructor in unit.info.constructors:
+                        self._constructors.setdefault(constructor, []).append(unit)
+                        names.add(constructor)
+                    dirty.add(unit)
+                else:
+                    name = str(node.name)
+                    unit = self._functions.get(name)
+                    if unit is None:
+                        unit = self._functions[name] = Unit(name)
+                    unit.parts.append((declaration, node))
+                    functions.add(name)
+
+        env = self.env
+        for name in functions:
+            unit = self._functions[name]
+            if not unit.parts:
+                del self._functions[name]
+                self._forget(unit)
+                self._with_errors.discard(unit)
+                dirty.discard(unit)
+                signature = None
+            else:
+                unit.parts.sort(key=_position)
+                signature = unit.first(FunctionDeclaration)
+                dirty.add(unit)
+            if signature is None:
+                env.functions.pop(name, None)
+                provider = None
+            else:
+                try:
+                    env.functions[name] = scheme_of(signature[1].type)
+                except CheckError:
+                    env.functions[name] = None
+                provider = signature[0].text
+            self._provide(name, provider, dirty)
+
+        for name in names:
+            defined = self._types.get(name)
+            if defined is not None:
+                if defined:
+                    defined.sort(key=lambda unit: unit.parts[0][0].start_pos)
+                    env.data[name] = defined[0].info
+                    self._provide(name, defined[0].parts[0][0].text, dirty)
+                else:
+                    del self._types[name]
+                    env.data.pop(name, None)
+                    self._provide(name, None, dirty)
+            defined = self._constructors.get(name)
+            if defined is not None:
+                if defined:
+                    defined.sort(key=lambda unit: unit.parts[0][0].start_pos)
+                    env.constructors[name] = defined[0].info.constructors[name]
+                    self._provide(name, defined[0].parts[0][0].text, dirty)
+                else:
+                    del self._constructors[name]
+                    env.constructors.pop(name, None)
+                    self._provide(name, None, dirty)
+
+        checked = 0
+        for unit in dirty:
+            if unit.parts and (unit.name in self._functions or unit.parts[0][0] in self._data_units):
+                checked += self._check_unit(unit)
+        self.checked = checked
+
+        alive = len(self._functions) + len(self._data_units)
+        if len(self._results) > 4 * alive + 1024:
+            units = list(self._functions.values()) + list(self._data_units.values())
+            self._results = {unit.key: unit.errors for unit in units if unit.key is not None}
+        return self.errors
+
+    def _provide(self, name:str, text:Optional[str], dirty:Set[Unit])->None:
+        "Records where `name` comes from, the units using it are checked again if that changed"
+        if self._providers.get(name) == text:
+            return
+        if text is None:
+            del self._providers[name]
+        else:
+            self._providers[name] = text
+        dirty.update(self._dependents.get(name, ()))
+
+    def _forget(self, unit:Unit)->None:
+        for name in unit.names:
+            users = self._dependents.get(name)
+            if users is not None:
+                users.discard(unit)
+                if not users:
+                    del self._dependents[name]
+        unit.names = ()
+
+    def _check_unit(self, unit:Unit)->int:
+        "Checks `unit` unless its key has a result, returns whether it was checked"
+        texts = unit.texts
+        if unit.key is None or unit.key[0] != texts:
+            found : Set[str] = set()
+            for _, node in unit.parts:
+                _referenced(node, found)
+            self._forget(unit)
+            unit.names = tuple(sorted(found))
+            for name in unit.names:
+                self._dependents.setdefault(name, set()).add(unit)
+        providers = self._providers
+        key = (texts, tuple([providers.get(name) for name in unit.names]))
+        unit.key = key
+        errors = self._results.get(key)
+        checked = errors is None
+        if errors is None:
+            nodes = [node for _, node in unit.parts]
+            if type(nodes[0]) is DataType:
+                errors = check_data(nodes[0], self.env)
+            else:
+                errors = check_function(unit.name, nodes, self.env)
+            self._results[key] = errors
+        unit.errors = errors
+        if errors:
+            self._with_errors.add(unit)
+        else:
+            self._with_errors.discard(unit)
+        return checked
+
+
+def check_text(text:str, parser:Optional[Lark]=None)->List[TypeCheckError]:
+    return TypeChecker(parser).check(text)
+
+
+def main(argv:List[str])->None:
+    """Checks a file, or with no file times a full check of a generated
+    module against re-checks after editing a body and a signature"""
+    if len(argv) > 1:
+        with open(argv[1], encoding="utf8") as f:
+            errors = check_text(f.read())
+        for error in errors:
+            print(f"{argv[1]}:{error}")
+        print(f"{len(errors)} type errors")
+        return
+
+    functions = 1666
+    pieces = ["data nat =\n  Z\n  S nat\n\n"]
+    for i in range(functions):
+        previous = f"f{i-1}" if i else "g"
+        pieces.append(f"f{i} : nat -> nat -> nat\nf{i} Z $ m = m\nf{i} S n $ m = S $ {previous} n m\n\n")
+    pieces.append("g : nat -> nat -> nat\ng n $ m = n\n")
+    text = "".join(pieces)
+    declarations = text.count("\n\n") + functions * 2 + 2
+
+    checker = TypeChecker()
+    start = time.perf_counter()
+    errors = checker.check(text)
+    full = time.perf_counter() - start
+    assert not errors, errors[:3]
+
+    middle = functions // 2
+    body = text.index(f"f{middle} S n $ m = S $ ")
+    target = text.index("n m\n", body)
+    start = time.perf_counter()
+    checker.edit(target, target + 3, "m n")
+    body_edit = time.perf_counter() - start
+    body_checked = checker.checked
+
+    signature = text.index(f"f{middle} : nat -> nat -> nat")
+    target = signature + len(f"f{middle} : ")
+    start = time.perf_counter()
+    errors = checker.edit(target, target + 3, "nat -> nat")
+    signature_edit = time.perf_counter() - start
+
+    print(f"{declarations} declarations, {len(text)} characters")
+    print(f"full check     : {full*1000:9.2f} ms")
+    print(f"body edit      : {body_edit*1000:9.2f} ms ({body_checked} units checked)")
+    print(f"signature edit : {signature_edit*1000:9.2f} ms ({checker.checked} units checked, {len(errors)} errors)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
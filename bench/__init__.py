@@ -0,0 +1,5 @@
+"""Benchmarks of the Dayuri front end.
+
+`python -m bench` generates a corpus (see `bench.corpus`) and times each
+phase of the parse (see `bench.harness`), `--json` keeps the report and
+`--compare` checks a run against a previous one."""
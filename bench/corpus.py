@@ -0,0 +1,161 @@
+"""Synthetic Dayuri programs for benchmarks.
+
+The programs only use shapes the grammar accepts: nested blocks are wrapped
+in parentheses and closed (`in ...)` or `)`) at the indentation of the line
+they started on, so every block gets its own `_NL _DEDENT` from the
+indenter."""
+
+import sys
+import random
+import argparse
+from typing import Any, Dict, List
+
+VARIABLES = ["x", "y", "n", "a", "b", "c"]
+FUNCTIONS = ["add", "mul", "pair", "fst", "snd", "map"]
+PATTERNS = ["Z", "S n", "P (a, b)", "c", "S (S m)", "Cons h [t]"]
+
+
+class CorpusConfig():
+    "The knobs of the generator, the same config and seed give the same text"
+    declarations : int
+    depth : int
+    width : int
+    chain : int
+    seed : int
+
+    def __init__(self, declarations:int=1000, depth:int=4, width:int=4, chain:int=3, seed:int=0)->None:
+        self.declarations = declarations
+        self.depth = depth
+        self.width = width
+        self.chain = chain
+        self.seed = seed
+
+    def as_dict(self)->Dict[str, Any]:
+        return {"declarations": self.declarations, "depth": self.depth, "width": self.width,
+            "chain": self.chain, "seed": self.seed}
+
+    def __repr__(self):
+        return "CorpusConfig(" + ", ".join(f"{k}={v}" for k, v in self.as_dict().items()) + ")"
+
+
+class CorpusGenerator():
+    config : CorpusConfig
+    rng : random.Random
+
+    def __init__(self, config:CorpusConfig)->None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    def _argument(self, last:bool)->str:
+        "Only the last argument of a chain can be a number or a list, applications nest to the right"
+        rng = self.rng
+        roll = rng.random()
+        if roll < 0.6:
+            return rng.choice(VARIABLES)
+        if roll < 0.75:
+            return f"({rng.choice(VARIABLES)}, {rng.randint(1, 99)})"
+        if roll < 0.85 or not last:
+            return f"({rng.choice(FUNCTIONS)} {rng.choice(VARIABLES)})"
+        if roll < 0.93:
+            return str(rng.randint(1, 999))
+        return f"[{rng.choice(VARIABLES)}, {rng.choice(VARIABLES)}]"
+
+    def application(self)->str:
+        "A chain of `chain` arguments, sometimes split by `$`"
+        rng = self.rng
+        chain = self.config.chain
+        if chain == 0:
+            return rng.choice(VARIABLES)
+        parts = [rng.choice(FUNCTIONS)]
+        for i in range(chain):
+            last = i == chain - 1
+            if i > 0 and parts[-1][-1] not in "0123456789]" and rng.random() < 0.2:
+                parts.append("$")
+            parts.append(self._argument(last))
+        return " ".join(parts)
+
+    def expression(self, depth:int, level:int)->List[str]:
+        """The lines of an expression `depth` blocks deep, the first one is
+        to be appended to a line indented by `level`"""
+        if depth <= 0:
+            return [self.application()]
+        rng = self.rng
+        inner = " " * (level + 2)
+        nested = self.expression(depth - 1, level + 2)
+        if rng.random() < 0.5:
+            lines = ["(let", f"{inner}{rng.choice(VARIABLES)} = {nested[0]}"]
+            lines.extend(nested[1:])
+            lines.append(f"{inner}{rng.choice(VARIABLES)} = {self.application()}")
+            lines.append(f"{' ' * level}in {self.application()})")
+        else:
+            lines = [f"(match {rng.choice(VARIABLES)} of", f"{inner}{rng.choice(PATTERNS)} -> {nested[0]}"]
+            lines.extend(nested[1:])
+            lines.append(f"{inner}{rng.choice(PATTERNS)} -> {self.application()}")
+            lines.append(f"{' ' * level})")
+        return lines
+
+    def data_type(self, index:int)->str:
+        name = f"T{index}"
+        lines = [f"data {name} ="]
+        for j in range(self.config.width):
+            args = ("", f" {name}", f" (x : {name})", f" nat {name}")[j % 4]
+            lines.append(f"  C{index}_{j}{args}")
+        return "\n".join(lines) + "\n"
+
+    def function(self, index:int, data_index:int)->str:
+        name = f"f{index}"
+        header = f"{name} : T{data_index} -> nat -> nat\n"
+        depth = self.config.depth
+        if depth <= 0:
+            if self.rng.random() < 0.3:
+                return header + f"{name} x y = let a = x in {self.application()}\n"
+            return header + f"{name} x y = {self.application()}\n"
+        body = self.expression(depth, 2)
+        return header + f"{name} x $ y =\n  " + "\n".join(body) + "\n"
+
+    def generate(self)->str:
+        """`declarations` functions, with a data type before every eight of
+        them unless `width` is 0"""
+        pieces = []
+        data_index = 0
+        for i in range(self.config.declarations):
+            if i % 8 == 0 and self.config.width > 0:
+                data_index = i // 8
+                pieces.append(self.data_type(data_index))
+            pieces.append(self.function(i, data_index))
+        return "\n".join(pieces)
+
+
+def generate(config:CorpusConfig)->str:
+    return CorpusGenerator(config).generate()
+
+
+def add_arguments(arg_parser:argparse.ArgumentParser)->None:
+    "The options that build a `CorpusConfig`, shared with the harness"
+    defaults = CorpusConfig()
+    arg_parser.add_argument("--declarations", type=int, default=defaults.declarations, help="number of functions")
+    arg_parser.add_argument("--depth", type=int, default=defaults.depth, help="let/match nesting depth")
+    arg_parser.add_argument("--width", type=int, default=defaults.width, help="constructors per data type")
+    arg_parser.add_argument("--chain", type=int, default=defaults.chain, help="arguments per application")
+    arg_parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args:argparse.Namespace)->CorpusConfig:
+    return CorpusConfig(args.declarations, args.depth, args.width, args.chain, args.seed)
+
+
+def main(argv:List[str])->None:
+    arg_parser = argparse.ArgumentParser(prog="python -m bench.corpus", description="Writes a synthetic .dy program")
+    add_arguments(arg_parser)
+    arg_parser.add_argument("-o", "--output", default=None, help="output file, default stdout")
+    args = arg_parser.parse_args(argv[1:])
+    text = generate(config_from_args(args))
+    if args.output is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.output, "w", encoding="utf8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
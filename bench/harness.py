@@ -0,0 +1,198 @@
+"""Times the phases of a Dayuri parse on a synthetic corpus.
+
+Phases are run one after the other on the output of the previous one:
+
+- lex: the terminals of the grammar with a `BasicLexer`
+- postlex: the `TreeIndenter` over those tokens
+- parse: the LALR automaton over the indented tokens without callbacks
+- build: the same automaton with the tree building callbacks
+
+`tree` is `build - parse`, `total` is a plain `Lark.parse` of the text (it
+uses the contextual lexer, so it isn't exactly the sum of the others)."""
+
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import statistics
+from typing import Any, Callable, Dict, List, Optional
+
+import lark
+from lark import Lark, Token
+from lark.lexer import BasicLexer, LexerState
+from lark.parsers.lalr_parser_state import ParseConf, ParserState
+from lark.utils import TextSlice
+
+from PyDayuri.parser import get_parser, TreeIndenter
+
+from . import corpus
+
+PHASES = ("lex", "postlex", "parse", "build", "total")
+
+
+class PhaseTiming():
+    "The seconds of every run of a phase"
+    name : str
+    runs : List[float]
+
+    def __init__(self, name:str, runs:List[float])->None:
+        self.name = name
+        self.runs = runs
+
+    @property
+    def min(self)->float:
+        return min(self.runs)
+
+    @property
+    def median(self)->float:
+        return statistics.median(self.runs)
+
+    def as_dict(self)->Dict[str, Any]:
+        return {"min": self.min, "median": self.median, "runs": self.runs}
+
+
+def measure(function:Callable[[], Any], repeat:int, disable_gc:bool=False)->List[float]:
+    """Seconds taken by `repeat` calls of `function`, a full collection is
+    done before each one so garbage of a run isn't paid by the next"""
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        if disable_gc:
+            gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - start)
+        finally:
+            if disable_gc:
+                gc.enable()
+    return runs
+
+
+def lex(parser:Lark, text:str)->List[Token]:
+    lexer = BasicLexer(parser.lexer_conf)
+    return list(lexer.lex(LexerState(TextSlice.cast_from(text)), None))
+
+
+def postlex(tokens:List[Token])->List[Token]:
+    return list(TreeIndenter().process(iter(tokens)))
+
+
+def run_automaton(parser:Lark, tokens:List[Token], build:bool, start:str="start")->Any:
+    """Feeds `tokens` to the LALR automaton of `parser`, with `build` false
+    no callback is called and reductions only keep plain lists"""
+    lalr = parser.parser.parser.parser
+    callbacks = lalr.callbacks if build else {}
+    state = ParserState(ParseConf(lalr.parse_table, callbacks, start), None)
+    feed_token = state.feed_token
+    for token in tokens:
+        feed_token(token)
+    last = tokens[-1] if tokens else None
+    end = Token.new_borrow_pos("$END", "", last) if last is not None else Token("$END", "")
+    return feed_token(end, True)
+
+
+def git_commit()->Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def run(config:corpus.CorpusConfig, repeat:int=5, parser:Optional[Lark]=None,
+        disable_gc:bool=False)->Dict[str, Any]:
+    "Generates the corpus of `config`, times every phase and returns the JSON report"
+    if parser is None:
+        parser = get_parser()
+    text = corpus.generate(config)
+    tokens = lex(parser, text)
+    indented = postlex(tokens)
+
+    timings = [
+        PhaseTiming("lex", measure(lambda: lex(parser, text), repeat, disable_gc)),
+        PhaseTiming("postlex", measure(lambda: postlex(tokens), repeat, disable_gc)),
+        PhaseTiming("parse", measure(lambda: run_automaton(parser, indented, False), repeat, disable_gc)),
+        PhaseTiming("build", measure(lambda: run_automaton(parser, indented, True), repeat, disable_gc)),
+        PhaseTiming("total", measure(lambda: parser.parse(text), repeat, disable_gc)),
+    ]
+    phases = {timing.name: timing.as_dict() for timing in timings}
+    phases["tree"] = {"min": phases["build"]["min"] - phases["parse"]["min"],
+        "median": phases["build"]["median"] - phases["parse"]["median"]}
+    return {
+        "config": config.as_dict(),
+        "repeat": repeat,
+        "disable_gc": disable_gc,
+        "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "lark": lark.__version__, "commit": git_commit()},
+        "input": {"bytes": len(text.encode("utf8")), "lines": text.count("\n") + 1,
+            "tokens": len(tokens), "indented_tokens": len(indented)},
+        "phases": phases,
+    }
+
+
+def compare(old:Dict[str, Any], new:Dict[str, Any], threshold:float)->List[str]:
+    """Phases whose `min` went up by more than `threshold` (1.1 is 10%)
+    from `old` to `new`"""
+    regressions = []
+    for name, timing in new["phases"].items():
+        before = old["phases"].get(name)
+        if before is None or before["min"] <= 0:
+            continue
+        if timing["min"] / before["min"] > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def format_report(report:Dict[str, Any], baseline:Optional[Dict[str, Any]]=None)->str:
+    source = report["input"]
+    lines = [f"{source['bytes']} bytes, {source['lines']} lines, {source['tokens']} tokens "
+        f"({source['indented_tokens']} after postlex), {report['repeat']} runs"]
+    for name, timing in report["phases"].items():
+        line = f"  {name:<8} min {timing['min']*1000:9.2f} ms  median {timing['median']*1000:9.2f} ms"
+        if baseline is not None and name in baseline["phases"] and baseline["phases"][name]["min"] > 0:
+            line += f"  {timing['min']/baseline['phases'][name]['min']:.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv:List[str])->None:
+    arg_parser = argparse.ArgumentParser(prog="python -m bench", description="Times lexing, postlex, parsing and tree building")
+    corpus.add_arguments(arg_parser)
+    arg_parser.add_argument("-r", "--repeat", type=int, default=5)
+    arg_parser.add_argument("--no-gc", action="store_true", help="disable the garbage collector inside the timed runs")
+    arg_parser.add_argument("--json", default=None, help="write the report to this file ('-' for stdout)")
+    arg_parser.add_argument("--compare", default=None, help="a previous JSON report, ratios are printed against it")
+    arg_parser.add_argument("--threshold", type=float, default=1.10,
+        help="with --compare, exit with 1 when a phase is slower than this ratio")
+    args = arg_parser.parse_args(argv[1:])
+
+    report = run(corpus.config_from_args(args), args.repeat, disable_gc=args.no_gc)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, encoding="utf8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            print("warning: the baseline was run with another corpus config", file=sys.stderr)
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report, baseline))
+        if args.json is not None:
+            with open(args.json, "w", encoding="utf8") as f:
+                json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"slower than {args.threshold:.2f}x the baseline: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
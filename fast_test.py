@@ -1,40 +1,25 @@
 import sys 
-from typing import List
 import logging
 
 
-from lark import Lark, logger, Token
-from lark.exceptions import UnexpectedToken, UnexpectedCharacters
-from lark.indenter import Indenter
+from lark import logger
+
+from PyDayuri.parser import load_parser
+from PyDayuri.recovery import parse_with_recovery
 
 logger.setLevel(logging.DEBUG)
 #logger.setLevel(logging.INFO)
 
-class TreeIndenter(Indenter):
-    NL_type = '_NL'
-    OPEN_PAREN_types : List[str]= []
-    CLOSE_PAREN_types : List[str] = []
-    INDENT_type = '_INDENT'
-    DEDENT_type = '_DEDENT'
-    tab_len = 4
-
-with open("PyDayuri/grammar.lark") as grammar:
-  p = Lark(grammar,parser="lalr", postlex=TreeIndenter(), debug=True, maybe_placeholders=True, cache=False)
-
-def ignore_errors(e):
-    return False
-
+p, report = load_parser(debug=True)
+print(report, file=sys.stderr)
 
 with open(sys.argv[1]) as f :
   f2 = f.read()
-  try :
-    parsed = p.parse(f2, on_error= ignore_errors)
-    print(f2)
-    print()
-    print(parsed.pretty())
-  except UnexpectedToken as e:
-      print(e.get_context(f2))
-      print(e)
-  except UnexpectedCharacters as e:
-      print(e)
-
+  result = parse_with_recovery(f2, p)
+  print(f2)
+  print()
+  print(result.tree.pretty())
+  for error in result.errors:
+      print(error.get_context(f2))
+      print(error.message)
+      print()
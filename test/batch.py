@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest 
+
+from PyDayuri.batch import parse_tree, find_sources, BatchSummary
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+class Batch(unittest.TestCase):
+  def test_parse_examples(self):
+    results = list(parse_tree(examples, workers=2))
+    self.assertEqual(sorted(r.path for r in results), find_sources(examples))
+    for result in results:
+      self.assertTrue(result.ok, result.error)
+      self.assertEqual(result.tree.data, "start")
+
+  def test_errors_are_reported(self):
+    with tempfile.TemporaryDirectory() as root:
+      with open(os.path.join(root, "bad.dy"), "w") as f:
+        f.write("add : nat ->\n")
+      with open(os.path.join(root, "good.dy"), "w") as f:
+        f.write("zero : nat\n")
+      results = {os.path.basename(r.path): r for r in parse_tree(root, workers=1, keep_trees=False)}
+      self.assertTrue(results["good.dy"].ok)
+      self.assertIsNone(results["good.dy"].tree)
+      error = results["bad.dy"].error
+      self.assertEqual(error.kind, "UnexpectedToken")
+      self.assertEqual(error.line, 1)
+      summary = BatchSummary(list(results.values()), 1.0, slowest=1)
+      self.assertEqual((summary.files, summary.failed, len(summary.slowest)), (2, 1, 1))
+
+if __name__ == '__main__':
+ unittest.main()
@@ -0,0 +1,42 @@
+import json
+import unittest
+
+from bench import corpus, harness
+from PyDayuri.parser import get_parser
+
+class Corpus(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def test_generated_programs_parse(self):
+    for depth in [0, 1, 3, 6]:
+      for width in [0, 1, 5]:
+        for chain in [0, 1, 4]:
+          config = corpus.CorpusConfig(12, depth, width, chain, seed=depth + width + chain)
+          self.parser.parse(corpus.generate(config))
+
+  def test_same_seed_same_text(self):
+    config = corpus.CorpusConfig(20, 3, 3, 3, seed=7)
+    self.assertEqual(corpus.generate(config), corpus.generate(config))
+    other = corpus.CorpusConfig(20, 3, 3, 3, seed=8)
+    self.assertNotEqual(corpus.generate(config), corpus.generate(other))
+
+class Harness(unittest.TestCase):
+  def test_automaton_builds_same_tree(self):
+    parser = get_parser()
+    text = corpus.generate(corpus.CorpusConfig(10, 3, 2, 2))
+    indented = harness.postlex(harness.lex(parser, text))
+    self.assertEqual(harness.run_automaton(parser, indented, True), parser.parse(text))
+    self.assertIsInstance(harness.run_automaton(parser, indented, False), list)
+
+  def test_report(self):
+    report = harness.run(corpus.CorpusConfig(5, 2, 2, 2), repeat=2)
+    json.dumps(report)
+    for phase in harness.PHASES + ("tree",):
+      self.assertIn(phase, report["phases"])
+    self.assertEqual(len(report["phases"]["lex"]["runs"]), 2)
+    self.assertEqual(harness.compare(report, report, 1.0), [])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.interpreter import Interpreter
+from PyDayuri.runtime import MatchError, show, nat, nat_value
+from PyDayuri.codegen import load_source, load_file, cache_path
+
+program = """data nat =
+  Z
+  S nat
+
+data pair forall a b, =
+  P a b
+
+data box forall a, =
+  Box a
+
+add Z $ m = m
+add S n $ m = S $ add n m
+
+plus Z $ m = m
+plus S n $ m = plus n $ S m
+
+twice f $ x = f $ f x
+
+swap p =
+  (match p of
+    P x y -> P y x
+  )
+
+sum3 Box (a, b, c) = add a $ add b c
+
+pred n =
+  (let
+    S m = n
+  in m)
+
+first t = let Box [x, y] = t in x
+
+three = twice (add (S Z)) $ S Z
+
+size n =
+  (match n of
+    Z -> 7
+    S _ -> let m = 1 in m
+  )
+
+"""
+
+class Codegen(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_syntax_parser()
+    cls.compiled = load_source(program, parser=cls.parser, peano=False)
+    cls.interpreter = Interpreter(cls.parser.parse(program))
+
+  def both(self, name, *args):
+    compiled = self.compiled.call(name, *args)
+    self.assertEqual(compiled, self.interpreter.call(name, *args))
+    return compiled
+
+  def test_arithmetic(self):
+    self.assertEqual(nat_value(self.both("add", nat(3), nat(4))), 7)
+    self.assertEqual(nat_value(self.both("three")), 3)
+    self.assertEqual(show(self.both("pred", nat(2))), "S Z")
+
+  def test_patterns(self):
+    self.assertEqual(show(self.both("swap", ("P", nat(1), nat(0)))), "P Z (S Z)")
+    self.assertEqual(nat_value(self.both("sum3", ("Box", (nat(1), nat(2), nat(3))))), 6)
+    self.assertEqual(self.both("first", ("Box", [nat(1), nat(0)])), nat(1))
+    self.assertEqual(self.both("size", nat(0)), 7)
+    self.assertEqual(self.both("size", nat(5)), 1)
+    with self.assertRaises(MatchError):
+      self.compiled.call("pred", nat(0))
+
+  def test_partial_application(self):
+    add_two = self.compiled.call("add", nat(2))
+    self.assertEqual(nat_value(add_two(nat(1))), 3)
+
+  def test_tail_calls_loop(self):
+    # deeper than the Python stack
+    self.assertEqual(nat_value(self.compiled.call("plus", nat(5000), nat(1))), 5001)
+
+  def test_cache(self):
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, "Nat.dy")
+      with open(path, "w", encoding="utf8") as f:
+        f.write(program)
+      first = load_file(path, self.parser)
+      self.assertFalse(first.cached)
+      self.assertTrue(os.path.exists(cache_path(path)))
+      second = load_file(path, self.parser)
+      self.assertTrue(second.cached)
+      # nat is a Peano type, its values are ints
+      self.assertEqual(second.call("add", 1, 1), 2)
+      with open(path, "a", encoding="utf8") as f:
+        f.write("one = S Z\n")
+      third = load_file(path, self.parser)
+      self.assertFalse(third.cached)
+      self.assertEqual(third.call("one"), 1)
+      literal = load_file(path, self.parser, peano=False)
+      self.assertFalse(literal.cached)
+      self.assertEqual(literal.call("one"), nat(1))
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.interpreter import Interpreter
+from PyDayuri.evaluator import Evaluator
+from PyDayuri.codegen import CompiledModule, compile_module
+from PyDayuri.decision import MatchCompiler, Leaf, Switch, Fail, CONSTRUCTOR, generate, size
+from PyDayuri.runtime import MatchError, Program, nat
+
+program = """data nat =
+  Z
+  S nat
+
+data color =
+  R
+  G
+  B
+
+data box forall a, =
+  Box a
+
+data pair forall a b, =
+  P a b
+
+name R = 1
+name G = 2
+name B = 3
+
+mix R $ R = R
+mix G $ c = G
+mix c $ B = B
+mix c $ d = d
+
+second Box [x, y] = y
+second Box [x] = x
+
+first Box (x, y) = x
+
+deep S (S (S n)) = n
+deep n = Z
+
+keep P (k@S m) _ = k
+keep P _ m = m
+
+other p =
+  (match p of
+    P R c -> c
+    P c G -> c
+  )
+
+"""
+
+def paths_tested(node, seen=()):
+  "The occurrences tested on each path to a leaf"
+  if type(node) is Switch:
+    paths = []
+    children = [child for _, child in node.cases]
+    if node.default is not None:
+      children.append(node.default)
+    for child in children:
+      paths.extend(paths_tested(child, seen + (node.occurrence,)))
+    return paths
+  return [seen]
+
+class DecisionTree(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_syntax_parser()
+    cls.module = cls.parser.parse(program)
+    cls.program = Program(cls.module)
+    cls.interpreter = Interpreter(cls.module)
+    cls.backends = []
+    for trees in (False, True):
+      cls.backends.append(Evaluator(cls.module, peano=False, decision_trees=trees))
+      cls.backends.append(CompiledModule(compile_module(cls.module, peano=False, decision_trees=trees)))
+
+  def tree(self, name, program=None):
+    program = program or self.program
+    return MatchCompiler(program).compile([clause.parameters for clause in program.functions[name]])
+
+  def test_tested_once(self):
+    for name in ("mix", "deep", "keep", "second"):
+      for path in paths_tested(self.tree(name)):
+        self.assertEqual(len(path), len(set(path)), name)
+
+  def test_shape(self):
+    tree = self.tree("name")
+    self.assertEqual([head.name for head, _ in tree.cases], ["R", "G", "B"])
+    self.assertIsNone(tree.default)
+    self.assertEqual([child.action for _, child in tree.cases], [0, 1, 2])
+    # `deep` only knows of S, the rest goes to the catch all
+    tree = self.tree("deep")
+    self.assertEqual(tree.cases[0][0].kind, CONSTRUCTOR)
+    self.assertIsInstance(tree.default, Leaf)
+    self.assertEqual(tree.default.action, 1)
+    # lists of other lengths match no clause
+    tree = self.tree("second")
+    self.assertIsInstance(tree.cases[0][1].default, Fail)
+
+  def test_many_clauses(self):
+    module = self.parser.parse(generate(8, 40))
+    program = Program(module)
+    tree = self.tree("pick", program)
+    # every clause is a pair of constructors, the pair and both of them are tested once
+    self.assertTrue(all(len(path) <= 3 for path in paths_tested(tree)))
+    self.assertLessEqual(size(tree), 2 * 40 + 8)
+    interpreter = Interpreter(module)
+    backends = [Evaluator(module), CompiledModule(compile_module(module))]
+    for i in range(8):
+      for j in range(8):
+        value = ("P", (f"C{i}",), (f"C{j}",))
+        for backend in backends:
+          self.assertEqual(backend.call("pick", value), interpreter.call("pick", value))
+
+  def test_same_meaning(self):
+    colors = [("R",), ("G",), ("B",)]
+    calls = [("name", c) for c in colors]
+    calls += [("mix", c, d) for c in colors for d in colors]
+    calls += [("other", ("P", c, ("G",))) for c in colors]
+    calls += [("second", ("Box", [nat(1), nat(2)])), ("second", ("Box", [nat(3)]))]
+    calls += [("first", ("Box", (nat(1), nat(2))))]
+    calls += [("deep", nat(n)) for n in range(5)]
+    calls += [("keep", ("P", nat(n), nat(4))) for n in range(3)]
+    for name, *args in calls:
+      expected = self.interpreter.call(name, *args)
+      for backend in self.backends:
+        self.assertEqual(backend.call(name, *args), expected, (name, args))
+
+  def test_no_match(self):
+    for backend in self.backends:
+      with self.assertRaises(MatchError):
+        backend.call("second", ("Box", []))
+      with self.assertRaises(MatchError):
+        backend.call("other", ("P", ("B",), ("R",)))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from PyDayuri.docs import extract_source, extract_tree, get_scanner, split_comments, to_json, to_markdown
+
+source = """-- | Peano numbers
+data nat =
+  -- | zero
+  Z
+  S nat
+  -- | after the last constructor
+
+-- not a doc
+-- | Adds @arg:n and @arg:m, see @arg:k
+add : n@nat -> m@nat -> nat
+add Z $ w = w -- trailing
+add S k $ r = S $ add k r
+
+-- | not before a signature
+f x = x
+
+-- | Chooses
+-- | between two
+if : forall e, bool -> a@e -> (e -> e) -> e
+-- | at the end
+"""
+
+class Docs(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.scanner = get_scanner()
+
+  def test_comments_are_cut_in_place(self):
+    code, docs = split_comments(source)
+    self.assertEqual(code.count("\n"), source.count("\n"))
+    self.assertNotIn("--", code)
+    self.assertIn("add Z $ w = w \n", code)
+    self.assertEqual(docs[0], (1, "Peano numbers"))
+    self.assertEqual(len(docs), 8)
+
+  def test_pairs_docs_with_headers(self):
+    result = extract_source(source, self.scanner)
+    self.assertTrue(result.ok)
+    data, add, choose = result.entries
+    self.assertEqual((data.kind, data.name, data.header, data.doc), ("data", "nat", "data nat =", "Peano numbers"))
+    self.assertEqual([(c.name, c.args, c.doc) for c in data.constructors], [("Z", "", "zero"), ("S", "nat", None)])
+    self.assertEqual((add.name, add.line, add.doc), ("add", 10, "Adds @arg:n and @arg:m, see @arg:k"))
+    self.assertEqual(choose.doc, "Chooses\nbetween two")
+    self.assertEqual([line for line, _ in result.unattached], [6, 14, 20])
+
+  def test_signatures_and_references(self):
+    _, add, choose = extract_source(source, self.scanner).entries
+    self.assertEqual([(p.name, p.type) for p in add.parameters], [("n", "nat"), ("m", "nat")])
+    self.assertEqual(add.result, "nat")
+    self.assertEqual([(r.name, r.line, r.parameter) for r in add.references], [("n", 9, 0), ("m", 9, 1), ("k", 9, None)])
+    self.assertEqual([r.name for r in add.unresolved], ["k"])
+    self.assertEqual([(p.name, p.type) for p in choose.parameters], [(None, "bool"), ("a", "e"), (None, "(e -> e)")])
+
+  def test_lex_errors(self):
+    result = extract_source("-- | fine\nf : nat\ng ? x\nh : nat\n", self.scanner)
+    self.assertFalse(result.ok)
+    self.assertEqual(result.error.line, 3)
+    self.assertEqual([entry.name for entry in result.entries], ["f"])
+
+  def test_outputs(self):
+    results = [extract_source(source, self.scanner, "a.dy")]
+    data = json.loads(to_json(results))
+    self.assertEqual([entry["name"] for entry in data["files"][0]["entries"]], ["nat", "add", "if"])
+    markdown = to_markdown(results)
+    self.assertIn("## `add`\n\n```\nadd : n@nat -> m@nat -> nat\n```\n\nAdds `n` and `m`, see `k`\n", markdown)
+    self.assertIn("- `Z` — zero\n", markdown)
+
+  def test_tree_in_parallel(self):
+    directory = tempfile.mkdtemp()
+    try:
+      for i in range(4):
+        with open(os.path.join(directory, f"m{i}.dy"), "w", encoding="utf8") as f:
+          f.write(source.replace("add", f"add{i}"))
+      parallel = extract_tree(directory, workers=2)
+      sequential = extract_tree(directory, workers=1)
+      self.assertEqual(to_json(parallel), to_json(sequential))
+      self.assertEqual([result.entries[1].name for result in parallel], [f"add{i}" for i in range(4)])
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+  unittest.main()
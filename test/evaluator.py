@@ -0,0 +1,72 @@
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.interpreter import Interpreter
+from PyDayuri.evaluator import Evaluator
+from PyDayuri.runtime import MatchError, ProgramError, show, nat, nat_value
+
+program = """data nat =
+  Z
+  S nat
+
+data pair forall a b, =
+  P a b
+
+add Z $ m = m
+add S n $ m = S $ add n m
+
+mul Z $ m = Z
+mul S n $ m = add m $ mul n m
+
+twice f $ x = f $ f x
+
+swap p =
+  (match p of
+    P x y -> P y x
+  )
+
+pred n =
+  (let
+    S m = n
+    k = m
+  in k)
+
+both n = (n, [n, pred n])
+
+four = twice (add (S Z)) $ S (S Z)
+
+"""
+
+class Evaluate(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_syntax_parser()
+    module = cls.parser.parse(program)
+    cls.evaluator = Evaluator(module, peano=False)
+    cls.interpreter = Interpreter(module)
+
+  def both(self, name, *args):
+    value = self.evaluator.call(name, *args)
+    self.assertEqual(value, self.interpreter.call(name, *args))
+    return value
+
+  def test_arithmetic(self):
+    self.assertEqual(nat_value(self.both("add", nat(3), nat(4))), 7)
+    self.assertEqual(nat_value(self.both("mul", nat(3), nat(4))), 12)
+    self.assertEqual(nat_value(self.both("four")), 4)
+
+  def test_let_match(self):
+    self.assertEqual(show(self.both("swap", ("P", nat(1), nat(0)))), "P Z (S Z)")
+    self.assertEqual(show(self.both("both", nat(1))), "(S Z, [S Z, Z])")
+    with self.assertRaises(MatchError):
+      self.evaluator.call("pred", nat(0))
+
+  def test_partial_application(self):
+    self.assertEqual(nat_value(self.evaluator.call("mul", nat(2))(nat(3))), 6)
+
+  def test_unknown_name(self):
+    with self.assertRaises(ProgramError):
+      Evaluator(self.parser.parse("f x = g x\n"))
+
+if __name__ == '__main__':
+  unittest.main()
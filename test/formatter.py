@@ -0,0 +1,95 @@
+import io
+import os
+import unittest
+
+from bench import corpus
+from PyDayuri.parser import get_parser
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.formatter import (Printer, LINE, HARDLINE, GROUP, END_GROUP, NEST, ANCHOR, DEDENT,
+  format_source, check_source)
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+# shapes where the token after a `match` has to go on its own line
+sources = [
+  "import a.b as c\nimport d\n\nf x = let a = x in b\n",
+  "f x =\n  (match x of\n    A -> b\n  , c)\n",
+  "f x =\n  (let a = match x of\n    A -> b\n  in c)\n",
+  "f x =\n  (g $ match x of\n    A -> b\n  )\n",
+  "f x =\n  (match x of\n    A -> b\n  : nat)\n",
+  "f x =\n  (match match y of\n    A -> b\n  of\n    C -> d\n  )\n",
+  "f x =\n  [match x of\n    A -> b\n  ]\n",
+  "f x =\n  (let\n    a = b\n    c = (match d of\n      E -> e\n    )\n  in let z = a in (match z of\n"
+    "    A -> let q = w in q\n    B -> c\n  ))\n",
+  "data list forall a, =\n  Nil\n  Cons a (x : list a)\n\ng : forall a b, (a -> b) -> a * b -> list a\n"
+    "g k@S m $ a $ S (c, d) $ P [a, b] _x = (k : nat)\n",
+]
+
+class PrinterTest(unittest.TestCase):
+  def layout(self, document, width):
+    output = io.StringIO()
+    printer = Printer(output, width)
+    printer.feed(document)
+    printer.flush()
+    return output.getvalue()
+
+  def test_groups_break_when_they_overflow(self):
+    document = [GROUP, "let", NEST, LINE, "a = b", DEDENT, LINE, "in ", END_GROUP, "c"]
+    self.assertEqual(self.layout(document, 14), "let a = b in c")
+    # the group ends before `c`
+    self.assertEqual(self.layout(document, 13), "let a = b in c")
+    self.assertEqual(self.layout(document, 12), "let\n  a = b\nin c")
+
+  def test_hardline_breaks_enclosing_groups(self):
+    document = [GROUP, "f =", NEST, LINE, GROUP, "a", LINE, "b", END_GROUP, HARDLINE, "c", DEDENT, END_GROUP]
+    self.assertEqual(self.layout(document, 80), "f =\n  a b\n  c")
+
+  def test_anchor_indents_from_the_line(self):
+    document = ["x = ", ANCHOR, "(", NEST, HARDLINE, "a", DEDENT, HARDLINE, ")", DEDENT]
+    self.assertEqual(self.layout(document, 80), "x = (\n  a\n)")
+
+class FormatterTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_syntax_parser()
+    cls.tree_parser = get_parser()
+
+  def assertFormats(self, source, width=80):
+    formatted = format_source(source, self.parser, width)
+    self.assertEqual(self.parser.parse(formatted), self.parser.parse(source))
+    self.assertEqual(format_source(formatted, self.parser, width), formatted)
+    self.assertIsNone(check_source(formatted, self.tree_parser, width))
+    return formatted
+
+  def test_examples(self):
+    for name in sorted(os.listdir(examples)):
+      with open(os.path.join(examples, name)) as f:
+        self.assertFormats(f.read())
+
+  def test_blocks_keep_their_meaning(self):
+    for source in sources:
+      for width in (80, 30, 10):
+        self.assertFormats(source, width)
+      self.assertEqual(format_source(source, self.parser), source)
+
+  def test_corpus_is_formatted(self):
+    text = corpus.generate(corpus.CorpusConfig(40))
+    self.assertEqual(format_source(text, self.parser), text)
+    self.assertFormats(text, 40)
+
+  def test_width(self):
+    source = "f x = let a = add x x in mul a a\n"
+    self.assertEqual(self.assertFormats(source, 32), source)
+    self.assertEqual(self.assertFormats(source, 31), "f x =\n  let a = add x x in mul a a\n")
+    self.assertEqual(self.assertFormats(source, 20), "f x =\n  let\n    a = add x x\n  in mul a a\n")
+
+  def test_check_stops_at_first_difference(self):
+    text = "add : nat -> nat\nadd Z $ m = m\n\nmul : nat\n"
+    self.assertIsNone(check_source(text, self.tree_parser))
+    self.assertEqual(check_source(text.replace("Z $", "Z  $"), self.tree_parser), (2, 7))
+    self.assertEqual(check_source(text + "\n", self.tree_parser), (5, 1))
+    # what follows the difference isn't parsed
+    self.assertEqual(check_source(text.replace("mul", "mul ") + "mul ?? =", self.tree_parser), (4, 5))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,63 @@
+import os
+import unittest 
+
+from PyDayuri.parser import get_parser
+from PyDayuri.incremental import IncrementalParser
+
+with open(os.path.join(os.path.dirname(__file__), "..", "examples", "Nat.dy")) as f:
+  nat_source = f.read()
+
+class Incremental(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def assertSameAsFull(self, incremental):
+    self.assertEqual(incremental.errors, [])
+    self.assertEqual(incremental.tree, self.parser.parse(incremental.text))
+
+  def test_full_parse(self):
+    incremental = IncrementalParser(self.parser)
+    incremental.parse(nat_source)
+    self.assertSameAsFull(incremental)
+
+  def test_edit_body(self):
+    incremental = IncrementalParser(self.parser)
+    incremental.parse(nat_source)
+    start = nat_source.index("add m $ mul n m")
+    incremental.edit(start, start + 3, "mul")
+    self.assertEqual(incremental.reparsed, 1)
+    self.assertIn("mul m $ mul n m", incremental.text)
+    self.assertSameAsFull(incremental)
+
+  def test_edit_keeps_positions(self):
+    incremental = IncrementalParser(self.parser)
+    incremental.parse(nat_source)
+    start = nat_source.index("mul : nat")
+    incremental.edit(0, 0, "\n\n")
+    declaration = [d for d in incremental.declarations if d.text.startswith("mul :")][0]
+    token = declaration.children[0].children[0]
+    self.assertEqual(declaration.absolute(token)[0], start + 2)
+    self.assertEqual(incremental.text[declaration.start_pos:].split()[0], "mul")
+
+  def test_join_and_split_declarations(self):
+    incremental = IncrementalParser(self.parser)
+    incremental.parse(nat_source)
+    start = nat_source.index("add : nat")
+    # indenting a declaration header joins it to the previous declaration
+    incremental.edit(start, start, "  ")
+    self.assertNotEqual(incremental.errors, [])
+    incremental.edit(start, start + 2, "")
+    self.assertEqual(incremental.text, nat_source)
+    self.assertSameAsFull(incremental)
+
+  def test_new_declaration(self):
+    incremental = IncrementalParser(self.parser)
+    incremental.parse(nat_source)
+    start = nat_source.index("mul : nat")
+    incremental.edit(start, start, "one : nat\none = S Z\n\n")
+    self.assertEqual(incremental.reparsed, 3)
+    self.assertSameAsFull(incremental)
+
+if __name__ == '__main__':
+ unittest.main()
@@ -0,0 +1,108 @@
+import os
+import unittest 
+from typing import Dict
+
+from lark import Lark
+
+from PyDayuri.old.indenter import Indenter, IndentType, IndenterError, TraceAction
+from PyDayuri.old.compiled_indenter import CompiledIndenter
+
+grammar_path = os.path.join(os.path.dirname(__file__), "..", "PyDayuri", "old", "examples", "indenter.lark")
+with open(grammar_path) as f :
+  grammar_file = f.read()
+
+class LetIndenter(Indenter):
+  REGULAR_INDENT = ("_INDENT", "_DEDENT", "_NL")
+  INDENT_BLOCKS = {"LET":(IndentType.at_next, "IN", "_LET_SEPARATOR")}
+  PRODUCE_INDENT:Dict[str, IndentType] = {"IN":IndentType.at_next}
+
+class CompiledLetIndenter(CompiledIndenter):
+  REGULAR_INDENT = LetIndenter.REGULAR_INDENT
+  INDENT_BLOCKS = LetIndenter.INDENT_BLOCKS
+  PRODUCE_INDENT = LetIndenter.PRODUCE_INDENT
+
+def lex(source, **args):
+  parser = Lark(grammar_file, parser="lalr", lexer="basic", postlex=LetIndenter(**args))
+  return [(token.type, token.value) for token in parser.lex(source)]
+
+def lex_positions(source, indenter):
+  parser = Lark(grammar_file, parser="lalr", lexer="basic", postlex=indenter)
+  return [(token.type, token.value, token.column, token.end_column, token.start_pos)
+    for token in parser.lex(source)]
+
+good_source = "  let \n      some = as\n      ros = fds \n    in\n    dos \n"
+bad_source = "let\n    a = b\n  c = d\n in\n  x\n"
+
+class Tracing(unittest.TestCase):
+  def test_same_tokens(self):
+    self.assertEqual(lex(good_source), lex(good_source, trace=True))
+
+  def test_no_trace_by_default(self):
+    with self.assertRaises(IndenterError) as cm:
+      lex(bad_source)
+    self.assertIsNone(cm.exception.trace)
+
+  def test_trace_attached_to_error(self):
+    with self.assertRaises(IndenterError) as cm:
+      lex(bad_source, trace=True, trace_size=2)
+    trace = cm.exception.trace
+    self.assertEqual(len(trace), 2)
+    action, token, depth = trace[-1]
+    self.assertEqual(action, TraceAction.token)
+    self.assertEqual(token.value, "c")
+    self.assertEqual(depth, 1)
+
+def offset(source, line, column):
+  return sum(len(l) + 1 for l in source.split("\n")[:line - 1]) + column - 1
+
+class Positions(unittest.TestCase):
+  def test_synthetic_tokens_positions(self):
+    nested = "let\n    a = b\n    c = let\n            d = e\n          in\n            f\n  in\n    g\n"
+    for source in [good_source, nested]:
+      for indenter in [LetIndenter(), CompiledLetIndenter()]:
+        parser = Lark(grammar_file, parser="lalr", lexer="basic", postlex=indenter)
+        for token in parser.lex(source):
+          if token.value == "":
+            self.assertIsInstance(token.line, int)
+            self.assertIsInstance(token.end_line, int)
+            self.assertEqual(token.start_pos, offset(source, token.line, token.column))
+
+class Compiled(unittest.TestCase):
+  def test_same_tokens(self):
+    nested = "let\n    a = b\n    c = let\n            d = e\n          in\n            f\n  in\n    g\n"
+    for source in [good_source, nested]:
+      self.assertEqual(lex_positions(source, LetIndenter()),
+        lex_positions(source, CompiledLetIndenter()))
+
+  def test_same_error(self):
+    with self.assertRaises(IndenterError) as expected:
+      lex_positions(bad_source, LetIndenter())
+    with self.assertRaises(IndenterError) as found:
+      lex_positions(bad_source, CompiledLetIndenter())
+    self.assertEqual(type(found.exception), type(expected.exception))
+    self.assertEqual(str(found.exception), str(expected.exception))
+
+  def test_same_trace(self):
+    nested = "let\n    a = b\n    c = let\n            d = e\n          in\n            f\n  in\n    g\n"
+    expected, found = LetIndenter(trace=True), CompiledLetIndenter(trace=True)
+    lex_positions(nested, expected)
+    lex_positions(nested, found)
+    events = lambda indenter: [(action, token.type, token.line, token.column, depth)
+      for action, token, depth in indenter.trace.events]
+    self.assertEqual(events(found), events(expected))
+    with self.assertRaises(IndenterError) as cm:
+      lex_positions(bad_source, CompiledLetIndenter(trace=True, trace_size=2))
+    self.assertEqual(len(cm.exception.trace), 2)
+
+  def test_stack_state(self):
+    indenter = CompiledLetIndenter()
+    parser = Lark(grammar_file, parser="lalr", lexer="basic", postlex=indenter)
+    tokens = parser.lex("let\n    a = b\n")
+    for token in tokens:
+      if token.value == "b":
+        break
+    self.assertEqual([repr(item) for item in indenter.stack_state],
+      ["BlockStart(token=LET, end=IN, level=5, separator=_LET_SEPARATOR)"])
+
+if __name__ == '__main__':
+ unittest.main()
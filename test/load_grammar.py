@@ -1,9 +1,35 @@
-from lark import Lark
+"""The parser of the rules under test in `test/grammar`.
 
-with open("src/grammar.lark") as f :
-  grammar_file = f.read()
+One LALR parser with every tested rule as a start symbol, loaded from the
+parse table cache of `PyDayuri.parser`, so tables are built at most once
+per process (and once overall while the grammar doesn't change). Test
+modules can run in parallel processes, the cache is written atomically."""
 
-def get_parser(**args):
-  parser = Lark(grammar_file, parser="lalr", debug=True, **args)
-  return parser.parse
+import os
 
+from PyDayuri.parser import load_parser
+
+# the rules are those of the grammar before the current one
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PyDayuri", "old", "grammar_old.lark")
+
+RULES = [
+  "test_identifier_head", "test_identifier_body", "test_identifier",
+  "test_uint_head", "test_uint_body", "test_uint",
+  "test_keywords", "test_keywords_over_identifier",
+  "path", "import", "pattern_match",
+]
+
+_parser = None
+
+def get_rules_parser():
+  global _parser
+  if _parser is None:
+    _parser, _ = load_parser(GRAMMAR_PATH, postlex=None, start=RULES)
+  return _parser
+
+def get_parser(start, **args):
+  "A function parsing a text from rule `start`"
+  if args:
+    raise TypeError(f"the shared parser takes no options, given {sorted(args)}")
+  parser = get_rules_parser()
+  return lambda text: parser.parse(text, start=start)
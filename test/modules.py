@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from PyDayuri.modules import ModuleGraph, ImportCycle, UnresolvedImports, scan_imports, build
+
+def write(root, name, text):
+  path = os.path.join(root, *name.split(".")) + ".dy"
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, "w") as f:
+    f.write(text)
+
+class Modules(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.root = self.directory.name
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_scan_stops_at_first_declaration(self):
+    write(self.root, "main", "\nimport lib.list as L\nimport nat\n\nf : nat\nimport other\n")
+    self.assertEqual(scan_imports(os.path.join(self.root, "main.dy")), ["lib.list", "nat"])
+
+  def test_levels(self):
+    write(self.root, "main", "import lib.list\nimport nat\nmain : nat\n")
+    write(self.root, "lib.list", "import nat\ndata list a =\n  Nil\n  Cons a\n")
+    write(self.root, "nat", "data nat =\n  Z\n  S nat\n")
+    write(self.root, "unused", "u : nat\n")
+    graph = ModuleGraph([self.root])
+    graph.add(["main"])
+    self.assertEqual(graph.levels(), [["nat"], ["lib.list"], ["main"]])
+    graph.add_all()
+    self.assertEqual(graph.levels(), [["nat", "unused"], ["lib.list"], ["main"]])
+    path, seconds = graph.critical_path({"nat": 1.0, "unused": 5.0, "lib.list": 1.0, "main": 1.0})
+    self.assertEqual((path, seconds), (["unused"], 5.0))
+    path, seconds = graph.critical_path({name: 1.0 for name in graph.modules})
+    self.assertEqual((path, seconds), (["nat", "lib.list", "main"], 3.0))
+
+  def test_cycles(self):
+    write(self.root, "a", "import b\na : nat\n")
+    write(self.root, "b", "import c\nb : nat\n")
+    write(self.root, "c", "import a\nc : nat\n")
+    write(self.root, "d", "import d\nimport a\nd : nat\n")
+    graph = ModuleGraph([self.root])
+    graph.add(["d"])
+    with self.assertRaises(ImportCycle) as context:
+      graph.levels()
+    cycles = sorted(sorted(cycle) for cycle in context.exception.cycles)
+    self.assertEqual(cycles, [["a", "b", "c"], ["d"]])
+
+  def test_missing_import(self):
+    write(self.root, "a", "import b.c\na : nat\n")
+    graph = ModuleGraph([self.root])
+    graph.add(["a"])
+    with self.assertRaises(UnresolvedImports) as context:
+      graph.check()
+    self.assertEqual(context.exception.missing, {"a": ["b.c"]})
+
+  def test_search_path_order(self):
+    other = os.path.join(self.root, "other")
+    write(self.root, "a", "a : nat\n")
+    write(other, "a", "a : nat\n")
+    graph = ModuleGraph([other, self.root])
+    self.assertEqual(graph.resolve("a"), os.path.join(other, "a.dy"))
+
+  def test_build_skips_dependents_of_failures(self):
+    write(self.root, "base", "base : nat\n")
+    write(self.root, "broken", "import base\nbroken : nat ->\n")
+    write(self.root, "top", "import broken\ntop : nat\n")
+    write(self.root, "side", "import base\nside : nat\n")
+    graph = ModuleGraph([self.root])
+    graph.add_all()
+    result = build(graph, workers=2)
+    self.assertEqual(sorted(result.results), ["base", "broken", "side"])
+    self.assertEqual(result.failed, ["broken"])
+    self.assertEqual(result.skipped, ["top"])
+    self.assertFalse(result.ok)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,109 @@
+import os
+import random
+import tempfile
+import unittest
+
+from bench import corpus
+from PyDayuri.parse_cache import ParseCache, encode_tree, decode_tree
+from PyDayuri.batch import parse_tree
+
+nat_path = os.path.join(os.path.dirname(__file__), "..", "examples", "Nat.dy")
+
+class ParseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.cache = ParseCache(self.directory.name)
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_round_trip(self):
+    text = corpus.generate(corpus.CorpusConfig(20, 4, 3, 3, seed=3))
+    tree = self.cache.parser.parse(text)
+    decoded = decode_tree(text, *encode_tree(tree))
+    self.assertEqual(decoded, tree)
+    tokens = list(tree.scan_values(lambda v: True))
+    decoded_tokens = list(decoded.scan_values(lambda v: True))
+    for token, other in zip(tokens, decoded_tokens):
+      if token is None:
+        self.assertIsNone(other)
+        continue
+      self.assertEqual((token.type, token.start_pos, token.line, token.column, token.end_line, token.end_column),
+        (other.type, other.start_pos, other.line, other.column, other.end_line, other.end_column))
+
+  def test_hits_and_misses(self):
+    text = "f : nat -> nat\nf x = add x 1\n"
+    first = self.cache.parse(text)
+    second = self.cache.parse(text)
+    self.assertEqual(first, second)
+    self.cache.parse(text + "g : nat\n")
+    stats = self.cache.stats
+    self.assertEqual((stats.hits, stats.misses, stats.stores), (1, 2, 2))
+    self.assertIn("pydayuri_parse_cache_hits_total 1", stats.metrics())
+
+  def test_parse_errors_are_not_stored(self):
+    with self.assertRaises(Exception):
+      self.cache.parse("f : nat ->\n")
+    self.assertEqual(self.cache.stats.stores, 0)
+
+  def test_corrupt_entry_is_a_miss(self):
+    text = "zero : nat\n"
+    self.cache.parse(text)
+    with open(self.cache.path(self.cache.key(text)), "wb") as f:
+      f.write(b"garbage")
+    self.assertEqual(self.cache.parse(text), self.cache.parser.parse(text))
+    self.assertEqual(self.cache.stats.errors, 1)
+
+  def test_flipped_bytes_never_give_another_tree(self):
+    with open(nat_path) as f:
+      text = f.read()
+    tree = self.cache.parse(text)
+    path = self.cache.path(self.cache.key(text))
+    with open(path, "rb") as f:
+      stored = f.read()
+    rng = random.Random(0)
+    for _ in range(200):
+      corrupted = bytearray(stored)
+      corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+      with open(path, "wb") as f:
+        f.write(corrupted)
+      self.assertIsNone(self.cache.load(text))
+    self.assertEqual(self.cache.stats.errors, 200)
+    self.assertEqual(self.cache.parse(text), tree)
+
+  def test_bad_code_is_rejected(self):
+    text = "zero : nat\n"
+    names, code = encode_tree(self.cache.parser.parse(text))
+    for bad in ([], code[:1], code[:-1], code + code):
+      with self.assertRaises((ValueError, IndexError, StopIteration)):
+        decode_tree(text, names, bad)
+
+  def test_least_recently_used_are_evicted(self):
+    texts = [f"f{i} : nat\n" for i in range(6)]
+    for i, text in enumerate(texts):
+      self.cache.parse(text)
+      os.utime(self.cache.path(self.cache.key(text)), (i, i))
+    os.utime(self.cache.path(self.cache.key(texts[0])), (100, 100))
+    entry = os.path.getsize(self.cache.path(self.cache.key(texts[0])))
+    self.assertEqual(self.cache.prune(entry * 3), 3)
+    kept = [os.path.exists(self.cache.path(self.cache.key(text))) for text in texts]
+    self.assertEqual(kept, [True, False, False, False, True, True])
+
+  def test_bound_is_kept_on_store(self):
+    self.cache.max_bytes = 1
+    for i in range(3):
+      self.cache.parse(f"f{i} : nat\n")
+    self.assertEqual(self.cache.size(), 0)
+    self.assertEqual(self.cache.stats.evictions, 3)
+
+  def test_batch_uses_cache(self):
+    with tempfile.TemporaryDirectory() as root:
+      with open(os.path.join(root, "a.dy"), "w") as f:
+        f.write("zero : nat\n")
+      first = list(parse_tree(root, workers=1, cache_dir=self.directory.name, tree_cache=True))
+      second = list(parse_tree(root, workers=1, cache_dir=self.directory.name, tree_cache=True))
+      self.assertEqual([r.cached for r in first + second], [False, True])
+      self.assertEqual(first[0].tree, second[0].tree)
+
+if __name__ == '__main__':
+  unittest.main()
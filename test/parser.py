@@ -0,0 +1,68 @@
+import os
+import random
+import tempfile
+import unittest
+
+from PyDayuri.parser import load_parser, GRAMMAR_PATH
+
+with open(os.path.join(os.path.dirname(__file__), "..", "examples", "Nat.dy")) as f:
+  nat_source = f.read()
+
+class ParserCache(unittest.TestCase):
+  def test_warm_load_parses_like_cold(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cold_parser, cold = load_parser(cache_dir=cache_dir)
+      warm_parser, warm = load_parser(cache_dir=cache_dir)
+      self.assertFalse(cold.from_cache)
+      self.assertTrue(warm.from_cache)
+      self.assertEqual(cold.path, warm.path)
+      self.assertEqual(cold_parser.parse(nat_source), warm_parser.parse(nat_source))
+
+  def test_options_change_key(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      _, first = load_parser(cache_dir=cache_dir)
+      _, other = load_parser(cache_dir=cache_dir, maybe_placeholders=False)
+      self.assertFalse(other.from_cache)
+      self.assertNotEqual(first.key, other.key)
+
+  def test_grammar_change_rebuilds(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      grammar_path = os.path.join(cache_dir, "grammar.lark")
+      with open(GRAMMAR_PATH) as source, open(grammar_path, "w") as target:
+        target.write(source.read())
+      _, first = load_parser(grammar_path=grammar_path, cache_dir=cache_dir)
+      with open(grammar_path, "a") as target:
+        target.write("\n// changed\n")
+      _, second = load_parser(grammar_path=grammar_path, cache_dir=cache_dir)
+      self.assertFalse(second.from_cache)
+      self.assertNotEqual(first.key, second.key)
+
+  def test_corrupt_cache_rebuilds(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      _, first = load_parser(cache_dir=cache_dir)
+      with open(first.path, "wb") as f:
+        f.write(b"not a pickle")
+      parser, second = load_parser(cache_dir=cache_dir)
+      self.assertFalse(second.from_cache)
+      parser.parse(nat_source)
+
+  def test_flipped_bytes_rebuild(self):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as cache_dir:
+      _, first = load_parser(cache_dir=cache_dir)
+      with open(first.path, "rb") as f:
+        stored = f.read()
+      for _ in range(20):
+        corrupted = bytearray(stored)
+        corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+        with open(first.path, "wb") as f:
+          f.write(corrupted)
+        parser, report = load_parser(cache_dir=cache_dir)
+        self.assertFalse(report.from_cache)
+        parser.parse(nat_source)
+        # the rebuilt tables replace the bad file
+        _, again = load_parser(cache_dir=cache_dir)
+        self.assertTrue(again.from_cache)
+
+if __name__ == '__main__':
+ unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.interpreter import Interpreter
+from PyDayuri.evaluator import Evaluator
+from PyDayuri.codegen import CompiledModule, compile_module
+from PyDayuri.peano import Peano, ADD, MUL
+from PyDayuri.runtime import MatchError, Program, nat, nat_value
+
+program = """data nat =
+  Z
+  S nat
+
+data pair forall a, =
+  P a a
+
+data other =
+  O
+  N pair
+
+add Z $ m = m
+add n $ Z = n
+add S n $ m = S $ add n m
+
+plus n $ Z = n
+plus n $ S m = plus (S n) m
+
+mul Z $ m = Z
+mul S n $ m = add m $ mul n m
+
+times n $ Z = Z
+times n $ S m = plus (times n m) n
+
+wrong Z $ m = m
+wrong S n $ m = S $ S $ wrong n m
+
+partial S n $ m = S $ add n m
+
+loops Z $ m = m
+loops n $ Z = n
+loops S n $ m = loops n $ S m
+loops n $ S m = loops (S n) m
+
+double Z = Z
+double S n = S $ S $ double n
+
+minus2 S (S n) = n
+
+half n =
+  (match n of
+    S (S m) -> S $ half m
+    k -> Z
+  )
+
+both n = P (double n) $ half n
+
+"""
+
+class PeanoTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.module = get_syntax_parser().parse(program)
+    cls.peano = Peano(Program(cls.module))
+    cls.interpreter = Interpreter(cls.module)
+    cls.backends = [Evaluator(cls.module), CompiledModule(compile_module(cls.module))]
+
+  def test_types(self):
+    self.assertEqual([(t.name, t.zero, t.successor) for t in self.peano.types], [("nat", "Z", "S")])
+
+  def test_arithmetic(self):
+    self.assertEqual(self.peano.arithmetic, {"add": ADD, "plus": ADD, "mul": MUL, "times": MUL})
+
+  def test_same_meaning(self):
+    for backend in self.backends:
+      for name in ("double", "half", "minus2"):
+        for n in range(2, 7):
+          self.assertEqual(backend.call(name, n), nat_value(self.interpreter.call(name, nat(n))))
+      self.assertEqual(backend.call("both", 3), ("P", 6, 1))
+      self.assertEqual(backend.call("partial", 2, 3), 5)
+      self.assertEqual(backend.call("wrong", 2, 3), 7)
+      with self.assertRaises(MatchError):
+        backend.call("minus2", 1)
+      with self.assertRaises(MatchError):
+        backend.call("partial", 0, 3)
+
+  def test_large_numbers(self):
+    n = 10**6
+    for backend in self.backends:
+      self.assertEqual(backend.call("mul", n, n), n * n)
+      self.assertEqual(backend.call("times", n, 3), 3 * n)
+      self.assertEqual(backend.call("add", n)(1), n + 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,53 @@
+import os
+import json
+import pstats
+import tempfile
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.profiling import get_profiling_parser, profile_source, write_profile, output_path
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+program = """data nat =
+  Z
+  S nat
+
+pred n =
+  (let
+    S m = n
+  in m)
+
+"""
+
+class Profiling(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_profiling_parser()
+
+  def test_counters(self):
+    profile, module = profile_source(program, self.parser)
+    self.assertEqual(module, get_syntax_parser().parse(program))
+    self.assertEqual(list(profile.phases), ["lex", "indent", "parse", "syntax"])
+    self.assertTrue(all(seconds >= 0 for seconds in profile.phases.values()))
+    self.assertEqual((profile.indents, profile.dedents, profile.max_indent_depth), (3, 3, 2))
+    self.assertEqual(profile.newlines, 7)
+    self.assertGreater(profile.tokens, 20)
+    self.assertGreater(profile.tree_nodes, 10)
+
+  def test_outputs(self):
+    path = os.path.join(examples, "Nat.dy")
+    with tempfile.TemporaryDirectory() as directory:
+      output = output_path(path, "json", directory)
+      profile = write_profile(path, output, "json", self.parser)
+      with open(output, encoding="utf8") as f:
+        stored = json.load(f)
+      self.assertEqual(stored["counters"]["tokens"], profile.tokens)
+      self.assertEqual(set(stored["phases"]), {"lex", "indent", "parse", "syntax"})
+      output = output_path(path, "cprofile", directory)
+      self.assertTrue(output.endswith("Nat.dy.prof"))
+      write_profile(path, output, "cprofile", self.parser)
+      self.assertGreater(pstats.Stats(output).total_calls, 0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+from PyDayuri.parser import get_parser
+from PyDayuri.recovery import (parse_with_recovery, LEXER, INDENTATION, SYNTAX,
+  ErrorToken, LexErrorToken, IndentErrorToken)
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+broken = """f : nat ->
+g x = add x ?? 3
+h x =
+    a
+  b
+k x = y
+data N =
+  Z
+  S N
+
+m = (
+"""
+
+class Recovery(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def test_same_tree_without_errors(self):
+    for name in sorted(os.listdir(examples)):
+      with open(os.path.join(examples, name)) as f:
+        source = f.read()
+      result = parse_with_recovery(source, self.parser)
+      self.assertTrue(result.ok)
+      self.assertEqual(result.tree, self.parser.parse(source))
+
+  def test_every_error_in_one_pass(self):
+    result = parse_with_recovery(broken, self.parser)
+    found = [(error.kind, error.line, error.column) for error in result.errors]
+    self.assertEqual(found, [(SYNTAX, 1, 11), (LEXER, 2, 13), (INDENTATION, 5, 3), (SYNTAX, 11, 6)])
+    self.assertEqual(result.errors[1].source.value, "??")
+    self.assertIsInstance(result.errors[1].source, LexErrorToken)
+    self.assertIsInstance(result.errors[2].source, IndentErrorToken)
+    self.assertEqual(result.errors[2].source.expected, (0, 4))
+
+  def test_resynchronises_at_declarations(self):
+    result = parse_with_recovery(broken, self.parser)
+    self.assertEqual([child.data for child in result.tree.children], ["function_definition", "data_type"])
+    self.assertEqual(result.tree.children[0].children[0], "k")
+
+  def test_messages(self):
+    result = parse_with_recovery(broken, self.parser)
+    self.assertIn("'??'", result.errors[1].message)
+    self.assertIn("column 2", result.errors[2].message)
+    self.assertTrue(str(result.errors[0]).startswith("1:11: syntax error:"))
+    self.assertEqual(result.errors[1].get_context(broken), "g x = add x ?? 3\n            ^\n")
+    self.assertIsNone(result.errors[0].source.state)
+    self.assertEqual(ErrorToken("ERROR", "$").message(), "unknown error at '$'")
+
+if __name__ == '__main__':
+  unittest.main()
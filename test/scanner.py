@@ -0,0 +1,64 @@
+import os
+import unittest
+
+from lark.exceptions import UnexpectedCharacters
+
+from PyDayuri.syntax import SyntaxBuilder, get_syntax_parser
+from PyDayuri.profiling import get_profiling_parser
+from PyDayuri.scanner import Scanner, get_scanning_parser
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+texts = [
+  "data nat =\n  Z\n  S nat\n",
+  "f : ∀ a b, unit8 -> unit32 * unit64 -> string\n",
+  "unit8x dataset in inx import as of ofs let letter match matches forall foralls\n",
+  "_ _a _1 _12a __ _a_b __x _ñ\n",
+  "1 12_000 1_ 7abc 100\n",
+  "ñandú größe ü1 x² αβγ a.b.c\n",
+  "f x $ y = [x, (y : nat)] -> @ * : $\n",
+  "a\r\n\t b\n\n    \n  c\r\n",
+  "  \t leading\n",
+  "",
+  "trailing   ",
+]
+
+def fields(token):
+  return (token.type, token.value, token.start_pos, token.line, token.column,
+    token.end_line, token.end_column, token.end_pos)
+
+class ScannerTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.lark = get_profiling_parser()
+    cls.scanner = Scanner(cls.lark.terminals)
+
+  def same(self, text):
+    expected = [fields(token) for token in self.lark.lex(text)]
+    self.assertEqual([fields(token) for token in self.scanner.scan(text)], expected, text)
+
+  def test_same_tokens(self):
+    for text in texts:
+      self.same(text)
+    for name in sorted(os.listdir(examples)):
+      with open(os.path.join(examples, name), encoding="utf8") as f:
+        self.same(f.read())
+
+  def test_errors(self):
+    for text in ("a = 0\n", "_0", "a ; b", "x -y", "f\rg", "é€"):
+      with self.assertRaises(UnexpectedCharacters) as expected:
+        list(self.lark.lex(text))
+      with self.assertRaises(UnexpectedCharacters) as found:
+        list(self.scanner.scan(text))
+      self.assertEqual((found.exception.line, found.exception.column, found.exception.pos_in_stream),
+        (expected.exception.line, expected.exception.column, expected.exception.pos_in_stream), text)
+
+  def test_parse(self):
+    parser = get_scanning_parser(transformer=SyntaxBuilder())
+    for name in sorted(os.listdir(examples)):
+      with open(os.path.join(examples, name), encoding="utf8") as f:
+        text = f.read()
+      self.assertEqual(parser.parse(text), get_syntax_parser().parse(text))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,128 @@
+import io
+import json
+import asyncio
+import threading
+import unittest
+
+from PyDayuri.parser import get_parser
+from PyDayuri.recovery import parse_with_recovery
+from PyDayuri.server import (LanguageServer, CancellableIndenter, ParseCancelled,
+  encode_message, read_message)
+
+def messages(output):
+  data = output.getvalue()
+  found = []
+  while data:
+    header, _, rest = data.partition(b"\r\n\r\n")
+    length = int(header.split(b":")[1])
+    found.append(json.loads(rest[:length]))
+    data = rest[length:]
+  return found
+
+def diagnostics(output):
+  return [m["params"] for m in messages(output) if m.get("method") == "textDocument/publishDiagnostics"]
+
+class Server(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def run_server(self, body, debounce=0.01):
+    output = io.BytesIO()
+    async def run():
+      server = LanguageServer(output, self.parser, debounce=debounce, check_every=1)
+      await body(server)
+      server.close()
+      return server
+    return asyncio.run(run()), output
+
+  def test_framing(self):
+    async def roundtrip():
+      reader = asyncio.StreamReader()
+      reader.feed_data(encode_message({"id": 1, "method": "initialize"}) + encode_message({"method": "exit"}))
+      reader.feed_eof()
+      return [await read_message(reader), await read_message(reader), await read_message(reader)]
+    self.assertEqual(asyncio.run(roundtrip()), [{"id": 1, "method": "initialize"}, {"method": "exit"}, None])
+
+  def test_requests(self):
+    async def body(server):
+      server.handle({"id": 1, "method": "initialize", "params": {}})
+      server.handle({"id": 2, "method": "textDocument/hover", "params": {}})
+      server.handle({"method": "exit"})
+      self.assertFalse(server.running)
+    _, output = self.run_server(body)
+    replies = messages(output)
+    self.assertEqual(replies[0]["result"]["capabilities"]["textDocumentSync"]["change"], 1)
+    self.assertEqual(replies[1]["error"]["code"], -32601)
+
+  def test_diagnostics_of_open_document(self):
+    async def body(server):
+      server.handle({"method": "textDocument/didOpen",
+        "params": {"textDocument": {"uri": "a.dy", "version": 3, "text": "f : nat\ng x = add x ? 3\n"}}})
+      await asyncio.sleep(0.5)
+      server.handle({"method": "textDocument/didClose", "params": {"textDocument": {"uri": "a.dy"}}})
+    _, output = self.run_server(body)
+    published = diagnostics(output)
+    self.assertEqual([p["version"] for p in published], [3, None])
+    [error] = published[0]["diagnostics"]
+    self.assertEqual(error["range"]["start"], {"line": 1, "character": 12})
+    self.assertEqual(error["code"], "lexer")
+    self.assertEqual(published[1]["diagnostics"], [])
+
+  def test_only_latest_version_is_published(self):
+    text = "".join(f"f{i} : nat -> nat\nf{i} x = add x {i + 1}\n" for i in range(300))
+    async def body(server):
+      server.handle({"method": "textDocument/didOpen",
+        "params": {"textDocument": {"uri": "a.dy", "version": 0, "text": text}}})
+      for version in range(1, 6):
+        await asyncio.sleep(0.02)
+        changed = text + ("" if version % 2 else "g :\n")
+        server.handle({"method": "textDocument/didChange",
+          "params": {"textDocument": {"uri": "a.dy", "version": version}, "contentChanges": [{"text": changed}]}})
+      while not diagnostics(server.output):
+        await asyncio.sleep(0.01)
+    server, output = self.run_server(body)
+    [published] = diagnostics(output)
+    self.assertEqual(published["version"], 5)
+    self.assertEqual(published["diagnostics"], [])
+    self.assertGreater(server.stats.cancelled, 0)
+    self.assertEqual(server.stats.parses, server.stats.cancelled + server.stats.stale + 1)
+
+  def test_bad_messages_dont_stop_the_server(self):
+    async def body(server):
+      reader = asyncio.StreamReader()
+      reader.feed_data(encode_message({"method": "textDocument/didOpen", "params": {"textDocument": {"uri": "a.dy"}}})
+        + encode_message({"id": 1, "method": "textDocument/didChange", "params": {}})
+        + encode_message({"id": 2, "method": "shutdown"}))
+      reader.feed_eof()
+      with self.assertLogs("PyDayuri.server", "ERROR") as logs:
+        await server.serve(reader)
+      self.assertEqual(len(logs.records), 2)
+    _, output = self.run_server(body)
+    failed, shutdown = messages(output)
+    self.assertEqual((failed["id"], failed["error"]["code"]), (1, -32603))
+    self.assertEqual(shutdown, {"id": 2, "result": None, "jsonrpc": "2.0"})
+
+  def test_failed_checks_are_counted(self):
+    async def body(server):
+      def fail(text, cancelled):
+        raise RuntimeError("boom")
+      server._parse = fail
+      with self.assertLogs("PyDayuri.server", "ERROR"):
+        server.handle({"method": "textDocument/didOpen",
+          "params": {"textDocument": {"uri": "a.dy", "version": 0, "text": "f : nat\n"}}})
+        await asyncio.sleep(0.1)
+    server, output = self.run_server(body)
+    self.assertEqual((server.stats.parses, server.stats.failed), (1, 1))
+    self.assertEqual(diagnostics(output), [])
+
+  def test_cancelled_indenter_stops(self):
+    cancelled = threading.Event()
+    text = "f : nat\n" * 100
+    self.assertTrue(parse_with_recovery(text, self.parser, CancellableIndenter(cancelled, 10)).ok)
+    cancelled.set()
+    with self.assertRaises(ParseCancelled):
+      parse_with_recovery(text, self.parser, CancellableIndenter(cancelled, 10))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.interpreter import Interpreter
+from PyDayuri.evaluator import Evaluator
+from PyDayuri.codegen import CompiledModule, compile_module
+from PyDayuri.sharing import HashCons, Memo, Shared, WORKLOAD
+from PyDayuri.runtime import nat, nat_value
+
+program = WORKLOAD + """data box forall a, =
+  Box a
+
+fib Z = Z
+fib S Z = S Z
+fib S (S n) = add (fib $ S n) $ fib n
+
+boxed n = Box [n, S n]
+
+"""
+
+class HashConsing(unittest.TestCase):
+  def test_identity(self):
+    values = HashCons()
+    a = values.intern(nat(5))
+    b = values.intern(nat(5))
+    self.assertIs(a, b)
+    self.assertIs(type(a), Shared)
+    self.assertIs(values.cons(("S", a)), values.intern(nat(6)))
+    self.assertEqual(a, nat(5))
+    self.assertNotEqual(a, values.intern(nat(4)))
+    self.assertEqual(len(values.table), 7)
+
+  def test_lists_not_shared(self):
+    values = HashCons()
+    a = values.intern(("Box", [nat(1)]))
+    self.assertIsNot(type(a), Shared)
+    self.assertIs(type(a[1][0]), Shared)
+    self.assertEqual(a, ("Box", [nat(1)]))
+
+class Memoize(unittest.TestCase):
+  def test_lru(self):
+    calls = []
+    memo = Memo(lambda n: calls.append(n) or n * 2, size=2)
+    for n in (1, 2, 1, 3, 2, 1):
+      self.assertEqual(memo(n), n * 2)
+    # 2 was evicted by 3, then 1 by 2
+    self.assertEqual(calls, [1, 2, 3, 2, 1])
+    self.assertEqual((memo.hits, memo.misses), (1, 5))
+    self.assertEqual(len(memo.table), 2)
+
+  def test_unhashable(self):
+    memo = Memo(len)
+    self.assertEqual(memo([1, 2]), 2)
+    self.assertEqual((memo.skipped, memo.misses), (1, 0))
+
+class Backends(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.module = get_syntax_parser().parse(program)
+    cls.interpreter = Interpreter(cls.module)
+    code = compile_module(cls.module, peano=False, hash_consing=True)
+    cls.backends = [
+      Evaluator(cls.module, peano=False, hash_consing=True, memoize=["fib", "eq"], cache_size=64),
+      CompiledModule(code, memoize=["fib", "eq"], cache_size=64)]
+
+  def test_same_meaning(self):
+    for backend in self.backends:
+      for n in range(8):
+        self.assertEqual(backend.call("fib", nat(n)), self.interpreter.call("fib", nat(n)))
+        self.assertEqual(backend.call("eq", nat(n), nat(3)), self.interpreter.call("eq", nat(n), nat(3)))
+      self.assertEqual(backend.call("boxed", nat(2)), self.interpreter.call("boxed", nat(2)))
+
+  def test_shared_results(self):
+    for backend in self.backends:
+      self.assertIs(backend.call("add", nat(2), nat(3)), backend.call("add", nat(4), nat(1)))
+      self.assertIs(backend.call("eq", nat(2), nat(2)), backend.intern(("T",)))
+
+  def test_memoized(self):
+    for backend in self.backends:
+      self.assertEqual(nat_value(backend.call("fib", nat(12))), 144)
+      memo = backend.memos["fib"]
+      self.assertGreater(memo.hits, 0)
+      self.assertLessEqual(len(memo.table), 64)
+
+if __name__ == '__main__':
+  unittest.main()
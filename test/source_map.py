@@ -0,0 +1,83 @@
+import unittest
+
+from PyDayuri.parser import get_parser
+from PyDayuri.recovery import parse_with_recovery
+from PyDayuri.server import diagnostic
+from PyDayuri.source_map import SourceMap
+
+texts = [
+  "",
+  "a",
+  "a\n",
+  "\n\n",
+  "f x = x\r\ng y = y\n",
+  "größe = ñandú\n🦆 x = 🦆🦆 y\nplain\n",
+  "𝔸\n\n𝔹𝔹 c",
+]
+
+def utf16(text):
+  return len(text.encode("utf-16-le")) // 2
+
+broken = "f : nat -> 🦆\ng x = add x ?? 3\nh 🦆 x = add 𝔸 ?? 3\n"
+
+class SourceMapTest(unittest.TestCase):
+  def test_positions_of_every_offset(self):
+    for text in texts:
+      source_map = SourceMap(text)
+      line, column = 1, 1
+      for offset in range(len(text) + 1):
+        self.assertEqual(source_map.position(offset), (line, column), (text, offset))
+        self.assertEqual(source_map.offset(line, column), offset)
+        if offset < len(text) and text[offset] == "\n":
+          line, column = line + 1, 1
+        else:
+          column += 1
+      self.assertEqual(source_map.line_count, text.count("\n") + 1)
+
+  def test_line_text(self):
+    for text in texts:
+      source_map = SourceMap(text)
+      lines = [line.rstrip("\r") for line in text.split("\n")]
+      self.assertEqual([source_map.line_text(n) for n in range(1, len(lines) + 1)], lines)
+      self.assertEqual(source_map.line_text(len(lines) + 1), "")
+
+  def test_lsp_positions(self):
+    for text in texts:
+      source_map = SourceMap(text)
+      for offset in range(len(text) + 1):
+        line, column = source_map.position(offset)
+        start = source_map.line_start(line)
+        lsp = source_map.to_lsp(line, column)
+        self.assertEqual(lsp, {"line": line - 1, "character": utf16(text[start:offset])})
+        self.assertEqual(source_map.from_lsp(lsp["line"], lsp["character"]), (line, column))
+        self.assertEqual(source_map.lsp_offset(lsp["line"], lsp["character"]), offset)
+
+  def test_only_lines_outside_ascii_get_tables(self):
+    source_map = SourceMap(texts[5])
+    for line in (1, 2, 3):
+      source_map.to_lsp(line, 1)
+    self.assertIsNone(source_map._units[1])
+    self.assertEqual(source_map._units[2][:3], [0, 2, 3])
+    self.assertIsNone(source_map._units[3])
+    # past the end of a line count one unit per column
+    self.assertEqual(source_map.to_lsp(2, 20), {"line": 1, "character": 22})
+    self.assertEqual(source_map.from_lsp(1, 22), (2, 20))
+
+  def test_context(self):
+    source_map = SourceMap("a = b\r\nc = d\ne = f\n")
+    self.assertEqual(source_map.context(2, 3), "c = d\n  ^\n")
+    self.assertEqual(source_map.context(2, 1, width=2, before=1, after=5), "a = b\nc = d\n^^\ne = f\n\n")
+
+  def test_errors(self):
+    result = parse_with_recovery(broken, get_parser())
+    source_map = SourceMap(broken)
+    self.assertTrue(result.errors)
+    for error in result.errors:
+      self.assertEqual(error.get_context(source_map), error.get_context(broken))
+    [error] = [e for e in result.errors if e.line == 3 and getattr(e.source, "value", None) == "??"]
+    self.assertEqual(diagnostic(error)["range"]["start"], {"line": 2, "character": 14})
+    self.assertEqual(diagnostic(error, source_map)["range"],
+      {"start": {"line": 2, "character": 16}, "end": {"line": 2, "character": 18}})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,44 @@
+import io
+import os
+import unittest 
+
+from lark.lexer import BasicLexer, LexerThread
+
+from PyDayuri.parser import get_parser
+from PyDayuri.streaming import StreamingLexer, read_lines, parse_declarations
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+def sources():
+  for name in sorted(os.listdir(examples)):
+    with open(os.path.join(examples, name)) as f:
+      yield f.read()
+  yield "  \n\n  a b  \n \t\n   c\r\n\r\n  d"
+  yield "\n\nzero : nat\n  \n"
+  yield "x\n  \n  "
+  yield ""
+
+def positions(tokens):
+  return [(t.type, t.value, t.start_pos, t.line, t.column, t.end_line, t.end_column, t.end_pos)
+    for t in tokens]
+
+class Streaming(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def test_same_tokens_as_whole_text(self):
+    for source in sources():
+      expected = positions(LexerThread.from_text(BasicLexer(self.parser.lexer_conf), source).lex(None))
+      for chunk_size in [1, 7, 1 << 16]:
+        lines = read_lines(io.StringIO(source, newline=""), chunk_size)
+        self.assertEqual(positions(StreamingLexer(self.parser).lex(lines)), expected)
+
+  def test_declarations(self):
+    with open(os.path.join(examples, "Nat.dy")) as f:
+      source = f.read()
+    declarations = list(parse_declarations(read_lines(io.StringIO(source), 5), self.parser))
+    self.assertEqual(declarations, self.parser.parse(source).children)
+
+if __name__ == '__main__':
+ unittest.main()
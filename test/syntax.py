@@ -0,0 +1,112 @@
+import os
+import unittest
+
+from lark import Tree
+
+from PyDayuri.parser import get_parser
+from PyDayuri.syntax import (get_syntax_parser, SyntaxBuilder, Module, Path, Number,
+  Application, ExpGroup, Let, Match, Annotated, TypeArrow, TypeTuple, TypeParen,
+  TypeApplication, TypeBasic, DataType, FunctionDefinition, PatternApplication, application_spine)
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+source = """import a.b as c
+data L forall a, =
+  Nil
+  Cons (h : a) ((t : L a))
+  P (x : unit8 * string * (a * b) -> F a $ b c)
+f : forall a b, a -> b
+f y _ $ x@S _1 $ P [n, c] (d) () [] _n = (x : nat)
+g = (f, [1, 2], (), (let a = 3 in a))
+h x =
+  (match x of
+    Z -> add (1) $ x
+    S n -> n
+  )
+"""
+
+def names(path):
+  return path.name
+
+class Syntax(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.tree_parser = get_parser()
+    cls.parser = get_syntax_parser()
+
+  def test_same_as_transformed_tree(self):
+    sources = [source]
+    for name in sorted(os.listdir(examples)):
+      with open(os.path.join(examples, name)) as f:
+        sources.append(f.read())
+    for text in sources:
+      self.assertEqual(self.parser.parse(text), SyntaxBuilder().transform(self.tree_parser.parse(text)))
+
+  def test_no_trees_left(self):
+    def walk(value):
+      self.assertNotIsInstance(value, Tree)
+      if isinstance(value, tuple):
+        for item in value:
+          walk(item)
+      elif hasattr(value, "__slots__") and not isinstance(value, str):
+        self.assertFalse(hasattr(value, "__dict__"))
+        for item in value.fields():
+          walk(item)
+    walk(self.parser.parse(source))
+
+  def test_nodes(self):
+    module = self.parser.parse(source)
+    self.assertIsInstance(module, Module)
+    self.assertEqual(names(module.imports[0].path), "a.b")
+    self.assertEqual(module.imports[0].alias, "c")
+
+    data, declaration, f, g, h = module.declarations
+    self.assertIsInstance(data, DataType)
+    self.assertEqual(data.variables, ("a",))
+    self.assertEqual([c.name for c in data.constructors], ["Nil", "Cons", "P"])
+    self.assertEqual([arg.name for arg in data.constructors[1].args], ["h", "t"])
+    arrow = data.constructors[2].args[0].type.type
+    self.assertIsInstance(arrow, TypeArrow)
+    self.assertIsInstance(arrow.argument, TypeTuple)
+    basic, string, paren = arrow.argument.items
+    self.assertEqual((basic.token, string.token), ("unit8", "string"))
+    self.assertIsInstance(paren, TypeParen)
+    self.assertIsInstance(arrow.result, TypeApplication)
+    self.assertEqual([names(p) for p in arrow.result.args], ["a", "b", "c"])
+
+    self.assertEqual(declaration.type.variables, ("a", "b"))
+    self.assertIsInstance(f, FunctionDefinition)
+    self.assertEqual(len(f.parameters), 3)
+    self.assertIsInstance(f.body, Annotated)
+
+    self.assertEqual(g.parameters, ())
+    self.assertIsInstance(g.body.items[3], ExpGroup)
+    self.assertIsInstance(g.body.items[3].exp, Let)
+    self.assertEqual(g.body.items[1].items[0].value, 1)
+
+    self.assertIsInstance(h.parameters[0], Path)
+    self.assertIsInstance(h.body, ExpGroup)
+    match = h.body.exp
+    self.assertIsInstance(match, Match)
+    first, second = match.cases
+    self.assertEqual(names(first.pattern), "Z")
+    self.assertIsInstance(second.pattern, PatternApplication)
+    self.assertIsInstance(first.body, Application)
+    self.assertIsInstance(first.body.argument, Application)
+    self.assertIsInstance(first.body.argument.function.exp, Number)
+    self.assertEqual(match.first_token().line, 10)
+
+  def test_application_spine(self):
+    module = self.parser.parse("f = add m $ mul n m\ng = S $ add n m\nh = k a (b c) d\n")
+    def show(exp):
+      if isinstance(exp, Path):
+        return exp.name
+      if isinstance(exp, ExpGroup):
+        return show(exp.exp)
+      head, args = application_spine(exp)
+      return "(" + " ".join([show(head)] + [show(arg) for arg in args]) + ")"
+    self.assertEqual([show(d.body) for d in module.declarations],
+      ["(add m (mul n m))", "(S (add n m))", "(k a (b c) d)"])
+
+if __name__ == '__main__':
+  unittest.main()
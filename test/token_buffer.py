@@ -0,0 +1,82 @@
+import os
+import unittest
+
+from lark.indenter import DedentError
+from lark.lexer import BasicLexer, LexerThread
+
+from bench.corpus import CorpusConfig, generate
+from PyDayuri.parser import get_parser
+from PyDayuri.syntax import get_syntax_parser
+from PyDayuri.token_buffer import lex_buffer, indent_buffer, parse_buffer, tokenize, line_table
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+def sources():
+  for name in sorted(os.listdir(examples)):
+    with open(os.path.join(examples, name)) as f:
+      yield f.read()
+  for depth in [0, 2, 5]:
+    yield generate(CorpusConfig(15, depth, 3, 3, seed=depth))
+  yield "  f = x\n\n"
+  yield ""
+
+def positions(tokens):
+  return [(t.type, t.value, t.start_pos, t.line, t.column, t.end_line, t.end_column, t.end_pos)
+    for t in tokens]
+
+class TokenBuffer(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def test_line_table(self):
+    self.assertEqual(list(line_table("a\nbc\n\nd")), [0, 2, 5, 6])
+    self.assertEqual(list(line_table("")), [0])
+
+  def test_same_tokens_as_lark_lexer(self):
+    for source in sources():
+      expected = positions(LexerThread.from_text(BasicLexer(self.parser.lexer_conf), source).lex(None))
+      buffer = lex_buffer(self.parser, source)
+      self.assertEqual(positions(buffer), expected)
+      self.assertEqual(positions(buffer.token(i) for i in range(len(buffer))), expected)
+
+  def test_same_types_as_indenter(self):
+    for source in sources():
+      expected = [t.type for t in self.parser.lex(source)]
+      self.assertEqual([t.type for t in tokenize(source, self.parser)], expected)
+
+  def test_synthetic_tokens_before_their_line(self):
+    source = "f x =\n  let\n    a = x\n  in a\ng = y\n"
+    tokens = list(tokenize(source, self.parser))
+    for i, token in enumerate(tokens):
+      if token.type in ("_INDENT", "_DEDENT"):
+        self.assertEqual(token.value, "")
+        self.assertEqual(token.start_pos, token.end_pos)
+        following = next((t for t in tokens[i:] if t.value.strip()), None)
+        if following is None:
+          self.assertEqual(token.start_pos, len(source))
+        else:
+          self.assertEqual((token.line, token.column, token.start_pos),
+            (following.line, following.column, following.start_pos))
+
+  def test_levels(self):
+    buffer = tokenize("f x =\n  let\n    a = x\n  in a\n", self.parser)
+    levels = {}
+    for i in range(len(buffer)):
+      if buffer.value(i) in ("f", "let", "a"):
+        levels.setdefault(buffer.value(i), buffer.levels[i])
+    self.assertEqual(levels, {"f": 0, "let": 2, "a": 4})
+
+  def test_bad_dedent(self):
+    with self.assertRaises(DedentError):
+      tokenize("f x =\n    a\n  b\n", self.parser)
+
+  def test_parse(self):
+    syntax_parser = get_syntax_parser()
+    for source in sources():
+      buffer = tokenize(source, self.parser)
+      self.assertEqual(parse_buffer(buffer, self.parser), self.parser.parse(source))
+      self.assertEqual(parse_buffer(buffer, syntax_parser), syntax_parser.parse(source))
+
+if __name__ == '__main__':
+  unittest.main()
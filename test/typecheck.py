@@ -0,0 +1,139 @@
+import unittest
+
+from PyDayuri.parser import get_parser
+from PyDayuri.typecheck import TypeChecker, check_text
+
+nat = """data nat =
+  Z
+  S nat
+
+add : nat -> nat -> nat
+add Z $ m = m
+add S n $ m = S $ add n m
+
+"""
+
+class Check(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = get_parser()
+
+  def messages(self, text):
+    return [(e.name, e.line, e.message) for e in check_text(text, self.parser)]
+
+  def test_well_typed(self):
+    text = nat + """data pair forall a b, =
+  P a b
+
+data box forall a, =
+  Box (f : a -> nat)
+
+swap : forall a b, pair a b -> pair b a
+swap P x y = P y x
+
+first : forall a b, pair a b -> a
+first p = match p of
+    P x _ -> x
+
+two : nat
+two = let
+    p = P (S Z) (Z, Z)
+  in add (first p) $ first $ swap $ P Z $ S Z
+
+open : box nat -> nat
+open Box f = f two
+
+pick : nat * nat -> nat
+pick (a, b) = (a : nat)
+"""
+    self.assertEqual(self.messages(text), [])
+
+  def test_errors(self):
+    text = nat + """wrong : forall a, a -> nat
+wrong x = x
+
+many : nat -> nat
+many x $ y = x
+
+missing = Z
+
+unknown : nat -> nat
+unknown x = mul x x
+
+arity : nat -> nat
+arity S = Z
+
+kind : list nat -> nat
+kind x = Z
+
+twice : nat -> nat -> nat
+twice x $ x = x
+"""
+    self.assertEqual(self.messages(text), [
+      ("wrong", 10, "expected `nat`, found `a`"),
+      ("many", 13, "`many` has 2 parameters, its type `nat -> nat` fewer"),
+      ("missing", 15, "`missing` has no type signature"),
+      ("unknown", 18, "unknown name `mul`"),
+      ("arity", 21, "`S` takes 1 arguments, given 0"),
+      ("kind", 23, "unknown type `list`"),
+      ("twice", 27, "`x` is bound twice"),
+    ])
+
+  def test_duplicates(self):
+    text = nat + "data nat =\n  Z\n\nadd : nat\n"
+    self.assertEqual(self.messages(text), [
+      ("nat", 9, "data type `nat` is defined twice"),
+      ("nat", 9, "constructor `Z` is already defined"),
+      ("add", 12, "`add` has a second type signature"),
+    ])
+
+class Incremental(unittest.TestCase):
+  def setUp(self):
+    self.functions = 30
+    pieces = [nat]
+    for i in range(self.functions):
+      previous = f"f{i-1}" if i else "add"
+      pieces.append(f"f{i} : nat -> nat -> nat\nf{i} Z $ m = m\nf{i} S n $ m = {previous} n m\n\n")
+    self.text = "".join(pieces)
+    self.checker = TypeChecker(get_parser())
+    self.assertEqual(self.checker.check(self.text), [])
+    self.assertEqual(self.checker.checked, self.functions + 2)
+
+  def edit(self, old, new, after=None):
+    start = self.text.index(old, self.text.index(after) if after else 0)
+    self.text = self.text[:start] + new + self.text[start + len(old):]
+    errors = self.checker.edit(start, start + len(old), new)
+    fresh = check_text(self.text)
+    self.assertEqual([str(e) for e in errors], [str(e) for e in fresh])
+    return errors
+
+  def test_body_edit_checks_one_function(self):
+    errors = self.edit("f9 n m", "f9 n Z", "f10 S")
+    self.assertEqual((errors, self.checker.checked), ([], 1))
+    errors = self.edit("f9 n Z", "f9 Z", "f10 S")
+    self.assertEqual(self.checker.checked, 1)
+    self.assertEqual([e.name for e in errors], ["f10"])
+
+  def test_signature_edit_checks_dependents(self):
+    errors = self.edit("f5 : nat -> nat -> nat", "f5 : nat -> nat")
+    self.assertEqual(self.checker.checked, 2)
+    self.assertEqual(sorted({e.name for e in errors}), ["f5", "f6"])
+    self.assertEqual(self.edit("f5 : nat -> nat", "f5 : nat -> nat -> nat"), [])
+    # both units had been checked with these texts, their results are reused
+    self.assertEqual(self.checker.checked, 0)
+
+  def test_data_edit_checks_users(self):
+    errors = self.edit("  S nat\n", "  S nat nat\n")
+    self.assertEqual(self.checker.checked, self.functions + 2)
+    self.assertEqual(len(errors), self.functions + 1)
+    self.assertEqual(self.edit("  S nat nat\n", "  S nat\n"), [])
+
+  def test_definitions_appear_and_go(self):
+    self.edit("f3 S n $ m = f2 n m", "f3 S n $ m = g n m")
+    self.assertEqual([e.message for e in self.checker.errors], ["unknown name `g`"])
+    self.assertEqual(self.edit("\nf0 :", "\ng : nat -> nat -> nat\ng n $ m = m\n\nf0 :"), [])
+    self.assertEqual(self.checker.checked, 2)
+    self.assertEqual(len(self.edit("g : nat -> nat -> nat\n", "")), 2)
+
+if __name__ == '__main__':
+  unittest.main()